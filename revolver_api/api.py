@@ -1,19 +1,44 @@
-from calendar import c
 import datetime
 from functools import wraps
-import json
+import hashlib
+import inspect
+import logging
 from os import environ
-import os
-import re
+import tempfile
 from typing import Any, Iterable
-from django.http import HttpRequest, HttpResponse, JsonResponse
-from .model import SerializerModel
+from django.http import FileResponse, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from .cache import ResponseCache, normalized_query, related_models
+from .conditional import ConditionalStamp
+from .export import iter_csv, write_csv, write_xls, write_xlsx
+from .filters import DEFAULT_LOOKUPS, build_filter_index, needs_distinct, parse_filters
+from .jobs import DONE, ExportJob, ExportJobManager
+from .model import FieldSet, SerializerModel, json_row, limited_related_attr
+from .ownership import OwnershipDescriptor
+from .parallel import chunk_tasks, parallel_rows, pk_order, pk_ranges, process_executor
+from .pagination import MAX_PAGE_SIZE, CountStrategy, ExactCount, cursor_page
 from .utils.get_request_args import get_instance_from_args_or_kwargs
+from .utils.body import RequestBodyError, UnsupportedMediaType, request_data, request_items
+from .utils.timing import timed
+from .validation import CompiledRules, compile_rules
 from .response import ApiErrorCode, ApiJsonResponse
 from .route import Router
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser,AnonymousUser
 
+logger = logging.getLogger("revolver_api")
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# 后台导出支持的格式：(content_type, 扩展名)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "xls": ("application/vnd.ms-excel", ".xls"),
+    "xlsx": (XLSX_CONTENT_TYPE, ".xlsx"),
+}
+
 def errorHandler(json=True):
     """api 错误处理
 
@@ -23,11 +48,21 @@ def errorHandler(json=True):
     def wrapper(func):
         # print("errorHandler",func.__name__)
         
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_err_inner(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    if json is False:
+                        raise e
+                    return ApiJsonResponse({} if not hasattr(e,'data') else getattr(e,'data'), code=ApiErrorCode.ERROR,message=str(e) or "error")
+            return async_err_inner
+        
         @wraps(func)
         def err_inner(*args, **kwargs):
             # print("errorHandler inner")
             try:
-                print("working fine....")
                 return func(*args, **kwargs)
             except Exception as e:
                 if json is False:
@@ -43,6 +78,20 @@ class ApiException(Exception):
     message = "api exception"
 
 
+def body_error(e: Exception, **kwargs):
+    """ 请求体错误的响应，请求体类型不支持时返回 415
+
+    Args:
+        e (Exception): request_data / request_items 抛出的错误
+
+    Returns:
+        ApiJsonResponse: _description_
+    """
+    if isinstance(e, UnsupportedMediaType):
+        return ApiJsonResponse(None,code=ApiErrorCode.UNSUPPORTED_MEDIA_TYPE,message=e.__str__(),httpCode=415)
+    return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__() or "json 解析错误",**kwargs)
+
+
 class Rule:
     name: str = ""
     required: bool = False
@@ -54,7 +103,8 @@ class Rule:
     choices: Iterable = []
     default: str = ""
     message: str = ""
-    validator = bool = lambda *args, **kwargs: True
+    # 自定义检查函数，返回 False 或字符串（错误信息）时不通过
+    validator = None
 
     def __init__(self,name, message="",required=True, **kwargs):
         self.name = name
@@ -84,36 +134,91 @@ class Rule:
     def set_message(self,message):
         self.message = message
         return self
+    def set_length(self,min_length=None,max_length=None):
+        if min_length is not None:
+            self.min_length = min_length
+        if max_length is not None:
+            self.max_length = max_length
+        return self
+    def set_type(self,type):
+        self.type = type
+        return self
+    def set_default(self,default):
+        self.default = default
+        return self
+    def set_validator(self,validator):
+        self.validator = validator
+        return self
     
 
-def validator(rules: Iterable[Rule]=[],method="get"):
+def check_rules(rules: Iterable[Rule],params: dict):
+    """检查参数是否满足规则
+
+    Args:
+        rules (Iterable[Rule]): _description_
+        params (dict): _description_
+
+    Returns:
+        str | None: 第一条不满足的规则的提示信息，全部满足时返回 None
+    """
+    _, errors = compile_rules(rules)(params)
+    return errors[0]["message"] if errors else None
+
+
+def validator(rules: Iterable[Rule]=[],method="get",max_body_size=None):
+    """### 检查请求参数，规则在装饰时编译一次
+    
+    检查全部规则（required / type / min / max / min_length / max_length / choices / validator），
+    有错误时返回所有错误，通过时把转换后的数据保存到 request.valid_data
+
+    Args:
+        rules (Iterable[Rule], optional): _description_. Defaults to [].
+        method (str, optional): get 时检查查询参数，否则检查请求体（只解析一次，之后 request_data 直接返回）. Defaults to "get".
+        max_body_size (int, optional): 请求体最大字节数，None 时使用 settings.DATA_UPLOAD_MAX_MEMORY_SIZE. Defaults to None.
+    """
+    compiled = compile_rules(rules)
+    
+    def check(args,kwargs):
+        try:
+            req = get_instance_from_args_or_kwargs(HttpRequest,args,kwargs)
+        except Exception as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+        params = {}
+        if method.lower() == 'get':
+            params = req.GET.dict()
+        else:
+            try:
+                params = request_data(req, max_body_size)
+            except RequestBodyError as e:
+                return body_error(e)
+            if not isinstance(params, dict):
+                return ApiJsonResponse.error(ApiErrorCode.ERROR,"请求数据必须是 json 对象")
+        
+        logger.debug("validator params: %s", params)
+        cleaned, errors = compiled(params)
+        if errors:
+            return ApiJsonResponse({"errors": errors},code=ApiErrorCode.ERROR,message=errors[0]["message"])
+        
+        req.valid_data = cleaned
+        return None
+    
     def wrapper(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_inner(*args,**kwargs):
+                error = check(args,kwargs)
+                if error is not None:
+                    return error
+                logger.debug("validator %s", func.__name__)
+                return await func(*args,**kwargs)
+            return async_inner
+        
         @wraps(func)
         def inner(*args,**kwargs):
-            try:
-                req = get_instance_from_args_or_kwargs(HttpRequest,args,kwargs)
-            except Exception as e:
-                return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
-            params = {}
-            if method.lower() == 'get':
-                params = req.GET.dict()
-            else:
-                params = req.POST.dict()
-                if req.headers.get("Content-Type") == "application/json":
-                    try:
-                        params = json.loads(req.body)
-                        print("get body")
-                    except Exception as e:
-                        return ApiJsonResponse.error(ApiErrorCode.ERROR,"json 解析错误")
-            
-            print("!!! params:",params)
-            for rule in rules:
-                value = params.get(rule.name)
-                if rule.required and value is None or value == "":
-                    return ApiJsonResponse(None,code=ApiErrorCode.ERROR,message=rule.message)
-            
-            print("validator",func.__name__)
-            req.valid_data = params
+            error = check(args,kwargs)
+            if error is not None:
+                return error
+            logger.debug("validator %s", func.__name__)
             return func(*args,**kwargs)
         return inner
     return wrapper
@@ -132,6 +237,58 @@ class Api:
     public_view = False
     user_field = "user"
     disable_delete = False
+
+    # 与 to_json 的序列化参数保持一致，用于推导 select_related / prefetch_related
+    serialize_with_foreign = False
+    serialize_with_related = True
+    # 外键展开层数
+    relation_depth = 3
+    # 反向关联数组的最大条数，None 表示不限制；设置后 <name>_count 由数据库 Count 注解得到
+    related_limit = None
+    # 反向关联数组的排序，None 时按 -created_at（没有该字段时按 -pk）
+    related_ordering = None
+    # 允许查询的字段，None 表示模型自身全部字段；按关联模型的字段查询需要显式列出路径，例如 ["title", "author__name"]
+    filter_fields = None
+    # 允许的查询后缀
+    filter_lookups = DEFAULT_LOOKUPS
+    # 为 True 时删除逐个调用 obj.delete()，用于重写了 delete 的模型
+    delete_per_object = False
+    # 批量创建 / 更新时每批写入的条数
+    bulk_batch_size = 500
+    # 每页最多条数，size 超过时返回错误，None 表示不限制
+    max_page_size = MAX_PAGE_SIZE
+    # 列表总数统计策略：ExactCount / CachedCount / EstimatedCount / HasMoreCount
+    count_strategy: CountStrategy = ExactCount()
+    # 导出时每次从数据库读取的行数
+    export_chunk_size = 2000
+    # 导出 xls 时内存缓冲区大小，超过后转存到系统临时文件
+    export_spool_size = 32 * 1024 * 1024
+    # 导出时格式化行数据（to_json / to_xls_format）的进程数，0 或 1 表示在当前进程逐行处理
+    # 只对未切片、按主键排序（order_by=id_asc / id_desc）的导出生效，按主键分块交给进程池后按原顺序合并；
+    # 默认的 -created_at 排序不能按主键分块，仍然在当前进程逐行处理
+    export_workers = 0
+    # 并行导出时每个分块的行数，必须大于 0
+    export_pk_step = 5000
+    # 行数少于该值时不开启进程池（进程启动的开销大于收益）
+    export_parallel_min_rows = 20000
+    
+    # 条件请求（ETag / Last-Modified）使用的更新时间字段，None 或模型没有该字段时关闭
+    # 只反映本表的修改，关联表的修改不会改变列表 / 详情的 ETag；列表只发送 ETag，详情同时发送 Last-Modified
+    conditional_field = "updated_at"
+    
+    # list / detail 的响应缓存：LocalResponseCache() / DjangoResponseCache()，None 表示关闭
+    # 由模型及其逐层展开的关联模型的 post_save / post_delete 失效，queryset.update() 等不发信号的修改不会失效
+    response_cache: ResponseCache = None
+    
+    # 后台导出任务（export.start / status / download），所有 Api 共用一个线程池；
+    # 任务信息保存在导出目录中，多个 worker 进程需要使用同一个目录
+    export_jobs = ExportJobManager()
+    
+    # 请求体最大字节数，None 时使用 settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    max_body_size = None
+    
+    # 数据归属信息（指向用户模型的字段），每个 Api 子类只解析一次
+    ownership = OwnershipDescriptor()
     
     @property
     def shoud_find_by_user(self):
@@ -140,11 +297,7 @@ class Api:
         Returns:
             _type_: _description_
         """
-        foreign_leys = [f for f in self.model._meta.get_fields() if f.is_relation]
-        for f in foreign_leys:
-            if isinstance(f.related_model(),AbstractUser):
-                return True
-        return False
+        return self.ownership.enabled
     
     def is_supperuser(self,request: HttpRequest):
         """是否是后台管理员
@@ -171,7 +324,7 @@ class Api:
         data = {}
         if not isinstance(user,AnonymousUser):
             data = {
-                self.user_field:user
+                self.ownership.field_name:user
             }
         return query.filter(**data)
     
@@ -191,10 +344,10 @@ class Api:
         if view_only and self.public_view:
             return query
         if self.shoud_find_by_user:
-            print("根据用户查询",query)
+            logger.debug("根据用户查询 %s", query.model)
             return self.find_by_user_query(query=query,user=request.user)
         else:
-            print("不公开数据，且当前用户也没有权限",query)
+            logger.debug("不公开数据，且当前用户也没有权限 %s", query.model)
             return query.filter(pk=-1)
         
     def auto_save_with_user(self,request: HttpRequest, obj: models.Model):
@@ -204,19 +357,47 @@ class Api:
             request (HttpRequest): _description_
             obj (models.Model): _description_
         """
-        if self.shoud_find_by_user:
-            user_field  = self.user_field
-            print("has user field",hasattr(obj,user_field))
-            print("user",request.user)
+        self.assign_user(request, obj)
+        obj.save()
+
+    def assign_user(self,request: HttpRequest, obj: models.Model):
+        """设置用户字段，不保存
+
+        Args:
+            request (HttpRequest): _description_
+            obj (models.Model): _description_
+        """
+        ownership = self.ownership
+        if ownership.enabled and ownership.assignable:
+            user_field  = ownership.field_name
+            logger.debug("has user field %s, user %s", hasattr(obj,user_field), request.user)
             # superuser 在后台手动选择用户时，不会自动保存用户
             if self.is_supperuser(request):
                 if (hasattr(obj,user_field) is False or getattr(obj,user_field) is None):
                     setattr(obj,user_field,request.user)
             else:
                 setattr(obj,user_field,request.user)
-        obj.save()
 
 
+    def request_body(self, request: HttpRequest)->dict:
+        """### 请求数据：经过 validator 时使用检查后的 request.valid_data，否则解析请求体（每个请求只解析一次）
+
+        Args:
+            request (HttpRequest): _description_
+
+        Raises:
+            RequestBodyError: 请求体格式错误、过大或不是 json 对象
+
+        Returns:
+            dict: _description_
+        """
+        data = getattr(request, "valid_data", None)
+        if data is None:
+            data = request_data(request, self.max_body_size)
+        if not isinstance(data, dict):
+            raise RequestBodyError("请求数据必须是 json 对象")
+        return data
+    
     def create(self, request: HttpRequest, **kwargs):
         """### 创建数据
 
@@ -233,17 +414,17 @@ class Api:
             if self.shoud_find_by_user and (request.user is None or request.user.is_anonymous):
                 return ApiJsonResponse.error(ApiErrorCode.ERROR,"没有权限")
         
-        print(self.model, "createApi")
+        logger.debug("%s createApi", self.model)
         try:
-            data = json.loads(request.body)
+            data = self.request_body(request)
         except Exception as e:
-            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+            return body_error(e)
         try:
             dict = data
-            if id in dict:
+            if "id" in dict:
                 del dict["id"]
             
-            obj = self.model.objects.create(**dict)
+            obj = self.model(**dict)
             self.auto_save_with_user(request, obj)
         except Exception as e:
             return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
@@ -255,6 +436,181 @@ class Api:
             }
         )
 
+    def parse_bulk_items(self, request: HttpRequest, rules: Iterable[Rule]):
+        """### 流式解析批量请求的 json 数组，逐条检查规则，每 bulk_batch_size 条返回一批
+
+        Args:
+            request (HttpRequest): _description_
+            rules (Iterable[Rule] | CompiledRules): _description_
+
+        Raises:
+            UnsupportedMediaType: 请求体不是 json 类型
+            ApiException: 请求体不是 json 数组或格式错误
+
+        Yields:
+            tuple[list, list]: 这一批的 (下标, 数据) 列表和每条数据的错误
+        """
+        compiled = compile_rules(rules)
+        valid, errors = [], []
+        try:
+            for index, item in enumerate(request_items(request, self.max_body_size)):
+                if not isinstance(item, dict):
+                    errors.append({"index": index, "message": "数据格式错误"})
+                    continue
+                cleaned, item_errors = compiled(item)
+                if item_errors:
+                    errors.append({"index": index, "message": item_errors[0]["message"], "errors": item_errors})
+                    continue
+                valid.append((index, cleaned))
+                if len(valid) >= self.bulk_batch_size:
+                    yield valid, errors
+                    valid, errors = [], []
+        except UnsupportedMediaType:
+            raise
+        except RequestBodyError as e:
+            raise ApiException(e.__str__() or "json 解析错误")
+        if valid or errors:
+            yield valid, errors
+    
+    def bulk_create(self, request: HttpRequest, **kwargs):
+        """### 批量创建
+        
+        请求体为 json 数组，流式解析，每条数据按 rules 检查；在一个事务中每 bulk_batch_size 条 bulk_create 一次，
+        内存中只保留一批对象。有任何一条出错时继续检查剩余数据但不再写入，最后回滚并返回每条的错误
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        if request.method != "POST":
+            return JsonResponse({"error": "only support POST"})
+        
+        if not self.is_supperuser(request=request):
+            if self.shoud_find_by_user and (request.user is None or request.user.is_anonymous):
+                return ApiJsonResponse.error(ApiErrorCode.ERROR,"没有权限")
+        ids, errors = [], []
+        try:
+            with transaction.atomic():
+                for items, batch_errors in self.parse_bulk_items(request, self.compiled_rules()):
+                    errors.extend(batch_errors)
+                    objs = []
+                    for index, item in items:
+                        item = {key: value for key, value in item.items() if key != "id"}
+                        try:
+                            obj = self.model(**item)
+                        except Exception as e:
+                            errors.append({"index": index, "message": e.__str__()})
+                            continue
+                        self.assign_user(request, obj)
+                        if hasattr(obj, "clean_foreign_ids"):
+                            obj.clean_foreign_ids()
+                        objs.append(obj)
+                    if errors:
+                        continue
+                    objs = self.model.objects.bulk_create(objs, batch_size=self.bulk_batch_size)
+                    ids.extend(obj.pk for obj in objs)
+                if errors:
+                    transaction.set_rollback(True)
+        except UnsupportedMediaType as e:
+            return body_error(e)
+        except Exception as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+        if errors:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,"部分数据有误",{"errors": sorted(errors, key=lambda e: e["index"])})
+        self.invalidate_response_cache()
+        return ApiJsonResponse.success({
+            "count": len(ids),
+            "ids": ids,
+            "errors": [],
+        })
+
+    def bulk_update_batch(self, request: HttpRequest, items: list, errors: list) -> int:
+        """### bulk_update 的一批：按用户范围一次查出这一批的对象并更新
+
+        Args:
+            request (HttpRequest): _description_
+            items (list): parse_bulk_items 返回的 (下标, 数据) 列表
+            errors (list): 出错的数据追加到这里
+
+        Returns:
+            int: 更新的行数，有错误时不写入，返回 0
+        """
+        pk_field = self.model._meta.pk
+        try:
+            items = [(index, pk_field.to_python(item["id"]), item) for index, item in items]
+        except Exception as e:
+            raise ApiException(e.__str__())
+        query = self.find_by_user(self.model.objects.filter(pk__in=[pk for _, pk, _ in items]),request=request)
+        found = query.in_bulk()
+        
+        concrete = {}
+        for field in self.model._meta.concrete_fields:
+            concrete[field.name] = field
+            concrete[field.attname] = field
+        objs, fields = [], set()
+        for index, pk, item in items:
+            obj = found.get(pk)
+            if obj is None:
+                errors.append({"index": index, "message": "无法更新/没有权限"})
+                continue
+            for key in obj.fillable():
+                if key in item and key in concrete:
+                    setattr(obj, key, item[key])
+                    fields.add(concrete[key].name)
+            if hasattr(obj, "clean_foreign_ids"):
+                obj.clean_foreign_ids()
+            objs.append(obj)
+        if errors or not fields:
+            return 0
+        # bulk_update 不会调用 pre_save，auto_now 字段需要手动更新
+        now = timezone.now()
+        for field in self.model._meta.concrete_fields:
+            if getattr(field, "auto_now", False):
+                for obj in objs:
+                    setattr(obj, field.attname, now)
+                fields.add(field.name)
+        return self.model.objects.bulk_update(objs, sorted(fields), batch_size=self.bulk_batch_size)
+    
+    def bulk_update(self, request: HttpRequest, **kwargs):
+        """### 批量更新
+        
+        请求体为 json 数组，每条必须带 id，只更新数据中出现的可填充字段；流式解析，
+        在一个事务中每 bulk_batch_size 条按用户范围查出对象并 bulk_update 一次，有错误时回滚并返回每条的错误
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        if request.method != "PUT":
+            return JsonResponse({"error": "only support PUT"})
+        
+        if not self.is_supperuser(request=request):
+            if self.shoud_find_by_user and (request.user is None or request.user.is_anonymous):
+                return ApiJsonResponse.error(ApiErrorCode.ERROR,"没有权限")
+        count, errors = 0, []
+        try:
+            with transaction.atomic():
+                for items, batch_errors in self.parse_bulk_items(request, self.compiled_rules(with_id=True)):
+                    errors.extend(batch_errors)
+                    count += self.bulk_update_batch(request, items, errors)
+                if errors:
+                    transaction.set_rollback(True)
+        except UnsupportedMediaType as e:
+            return body_error(e)
+        except Exception as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+        if errors:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,"部分数据有误",{"errors": sorted(errors, key=lambda e: e["index"])})
+        self.invalidate_response_cache()
+        return ApiJsonResponse.success({
+            "count": count,
+            "errors": [],
+        })
+
     def update(self, request: HttpRequest, **kwargs):
         """### 更新数据
 
@@ -265,9 +621,9 @@ class Api:
             _type_: _description_
         """
         try:
-            data = json.loads(request.body)
+            data = self.request_body(request)
         except Exception as e:
-            return ApiJsonResponse.error(data={},message=e.__str__() or "json 解析错误")
+            return body_error(e, data={})
         id = data.get("id")
         if id is None or id == "":
             return ApiJsonResponse.error(ApiErrorCode.ERROR,"id 不能为空")
@@ -297,24 +653,16 @@ class Api:
             _type_: _description_
         """
         
-        model_fields = self.model._meta.get_fields()
-        valid_fields = {}
-        input_fields = request.GET.dict()
-        
         # 忽略不在模型中的字段，前端在查询时可能会传入一些不在模型中的字段，这些字段应该被忽略
-        for field in model_fields:
-            for key in input_fields:
-                if not re.match(f'{field.name}(\w+)?$',key):
-                    continue
-                if input_fields[key] == "" or input_fields[key] is None:
-                    continue
-                else:
-                    valid_fields[key] = input_fields[key]
-                    # trim 
-                    if isinstance(input_fields[key],str):
-                        valid_fields[key] = input_fields[key].strip()
+        index = self.filter_index()
+        try:
+            valid_fields = parse_filters(index, request.GET.dict())
+        except ValueError as e:
+            raise ApiException(e.__str__())
         
         query = self.model.objects.all().filter(**valid_fields).order_by("-created_at")
+        if needs_distinct(index, valid_fields):
+            query = query.distinct()
         
         order_by_set = request.GET.get("order_by")
         if order_by_set is not None and order_by_set != "":
@@ -324,169 +672,905 @@ class Api:
                 if order_by.endswith("_asc"):
                     query = query.order_by(order_by.replace("_asc",""))
         
+        query = self.optimize_query(query, self.request_fieldset(self.model, request))
         return self.find_by_user(query,request=request,view_only=True)
+    
+    @staticmethod
+    def request_fieldset(model, request: HttpRequest):
+        """### 解析 fields= / exclude= 参数（逗号分隔），只返回这些 key
+        
+        Args:
+            model (SerializerModel): _description_
+            request (HttpRequest): _description_
+
+        extra_json 的 key 无法预先知道：重写了 extra_json 的模型不校验未知字段，只传 exclude= 时保留 extra_json 的输出
+
+        Raises:
+            ApiException: 包含模型中不存在的字段
+
+        Returns:
+            FieldSet | None: 需要输出的 key，None 表示全部
+        """
+        include = request.GET.get("fields", "")
+        exclude = request.GET.get("exclude", "")
+        if not include and not exclude:
+            return None
+        if not issubclass(model, SerializerModel):
+            return None
+        keys = model.serializable_keys()
+        include = [key.strip() for key in include.split(",") if key.strip()]
+        exclude = [key.strip() for key in exclude.split(",") if key.strip()]
+        unknown = [key for key in include + exclude if key not in keys]
+        if unknown and not model.has_extra_json():
+            raise ApiException("未知字段 " + ",".join(unknown))
+        if include:
+            return FieldSet(set(include).difference(exclude))
+        return FieldSet(set(keys).difference(exclude), excluded=exclude)
+    
+    def project_query(self,query: models.QuerySet,fieldset)->models.QuerySet:
+        """### 按 fieldset 只查询需要的列
+
+        Args:
+            query (models.QuerySet): _description_
+            fieldset (frozenset): _description_
+
+        Returns:
+            models.QuerySet: _description_
+        """
+        meta = query.model._meta
+        plan = query.model.serialize_plan()
+        foreign_ids = set(plan.foreign_id_keys)
+        only = {meta.pk.name}
+        # 条件请求需要更新时间
+        if self.has_conditional_field():
+            only.add(self.conditional_field)
+        for field in meta.concrete_fields:
+            if field.name in fieldset or (field.is_relation and field.attname in foreign_ids and field.attname in fieldset):
+                only.add(field.name)
+        # 排序字段也要查询，游标分页会读取它们
+        for order in query.query.order_by:
+            if isinstance(order, str):
+                name = order.lstrip("-+")
+                if any(f.name == name for f in meta.concrete_fields):
+                    only.add(name)
+        return query.only(*only)
+    
+    @classmethod
+    def compiled_rules(cls, with_id=False)->CompiledRules:
+        """### 编译后的 rules，每个 Api 子类只编译一次
+
+        Args:
+            with_id (bool, optional): 是否追加 id 必填规则（更新时使用）. Defaults to False.
+
+        Returns:
+            CompiledRules: _description_
+        """
+        key = "_compiled_rules_with_id" if with_id else "_compiled_rules"
+        compiled = cls.__dict__.get(key)
+        if compiled is None:
+            rules = list(cls.rules)
+            if with_id:
+                rules.append(Rule(name="id", required=True, message="id不能为空"))
+            compiled = compile_rules(rules)
+            setattr(cls, key, compiled)
+        return compiled
+    
+    @classmethod
+    def filter_index(cls)->dict:
+        """### 允许的查询参数索引，每个 Api 子类只生成一次
+        
+        包含字段名、外键 _id 以及 filter_lookups 中的后缀，例如 name、name__icontains、author_id__in、book；
+        关联模型的字段只有在 filter_fields 中列出路径时才可以查询，例如 author__name、book__title__contains
+
+        Returns:
+            dict: _description_
+        """
+        index = cls.__dict__.get("_filter_index")
+        if index is None:
+            index = build_filter_index(cls.model, fields=cls.filter_fields, lookups=cls.filter_lookups)
+            cls._filter_index = index
+        return index
+    
+    def optimize_query(self,query: models.QuerySet,fieldset=None)->models.QuerySet:
+        """### 根据模型关联字段和序列化参数，自动 select_related / prefetch_related
+        
+        使列表每页的查询次数和 size 无关；传入 fieldset 时只加载选中的关联，并用 only() 只查询选中的列
+
+        Args:
+            query (models.QuerySet): _description_
+            fieldset (frozenset, optional): request_fieldset 的结果. Defaults to None.
+
+        Returns:
+            models.QuerySet: _description_
+        """
+        if not issubclass(query.model,SerializerModel):
+            return query
+        select, prefetch = query.model.relation_lookups(
+            with_foreign=self.serialize_with_foreign,
+            with_related=self.serialize_with_related,
+            depth=self.relation_depth,
+        )
+        if fieldset is not None:
+            accessors = {
+                prefetch_name: field.name
+                for field, _, _, _, prefetch_name in query.model.serialize_plan().relations
+                if prefetch_name is not None
+            }
+            def selected(lookup):
+                head = lookup.split("__", 1)[0]
+                name = accessors.get(head, head) if "__" not in lookup else head
+                return name in fieldset or name + "_count" in fieldset
+            select = [lookup for lookup in select if selected(lookup)]
+            prefetch = [lookup for lookup in prefetch if selected(lookup)]
+            # 不接受 fields 的 to_json 和 extra_json 可能读取任意字段，不能延迟加载
+            if query.model.to_json_accepts_fields() and not query.model.has_extra_json():
+                query = self.project_query(query, fieldset)
+        if select:
+            query = query.select_related(*select)
+        if self.related_limit is not None and self.serialize_with_related:
+            query, prefetch = self.limit_related(query, prefetch)
+        if prefetch:
+            query = query.prefetch_related(*prefetch)
+        return query
+    
+    def limit_related(self,query: models.QuerySet,prefetch: list):
+        """### 限制反向关联数组的条数
+        
+        第一层反向外键改为带切片的 Prefetch（整页一次查询，每个父对象最多 related_limit 条），
+        数量改为 Count 子查询注解；嵌套在外键下的反向关联仍然完整加载，以保证数量正确
+
+        Args:
+            query (models.QuerySet): _description_
+            prefetch (list): relation_lookups 得到的 prefetch_related 列表
+
+        Returns:
+            tuple[models.QuerySet, list]: 查询集和替换后的 prefetch_related 列表
+        """
+        model = query.model
+        model_field_names = {f.name for f in model._meta.get_fields()}
+        annotations = {}
+        prefetch = list(prefetch)
+        for field, _, _, _, prefetch_name in model.serialize_plan().relations:
+            if prefetch_name is None or prefetch_name not in prefetch:
+                continue
+            related = field.related_model
+            ordering = self.related_ordering
+            if ordering is None:
+                has_created_at = any(f.name == "created_at" for f in related._meta.concrete_fields)
+                ordering = ["-created_at", "-pk"] if has_created_at else ["-pk"]
+            prefetch[prefetch.index(prefetch_name)] = models.Prefetch(
+                prefetch_name,
+                queryset=related.objects.order_by(*ordering)[: self.related_limit],
+                to_attr=limited_related_attr(prefetch_name),
+            )
+            count_name = field.name + "_count"
+            if count_name not in model_field_names:
+                # 相关子查询计数：不会让主查询 JOIN 膨胀，count() 时也会被去掉
+                remote = field.field.name
+                counts = (
+                    related.objects.filter(**{remote: models.OuterRef("pk")})
+                    .order_by()
+                    .values(remote)
+                    .annotate(count=models.Count("pk"))
+                    .values("count")
+                )
+                annotations[count_name] = Coalesce(
+                    models.Subquery(counts, output_field=models.IntegerField()), 0
+                )
+        if annotations:
+            query = query.annotate(**annotations)
+        return query, prefetch
+        
+    def has_conditional_field(self)->bool:
+        field = self.conditional_field
+        return field is not None and any(f.name == field for f in self.model._meta.concrete_fields)
+    
+    def list_stamp(self, request: HttpRequest, query: models.QuerySet, parts)->ConditionalStamp:
+        """### 列表的 ETag
         
+        由请求路径（分页、查询参数）、用户和 parts 计算；列表不发送 Last-Modified，
+        最大更新时间无法反映记录被删除，客户端只用 If-Modified-Since 时会一直拿到旧列表
+
+        Args:
+            request (HttpRequest): _description_
+            query (models.QuerySet): _description_
+            parts (Iterable): 反映列表内容的值
+
+        Returns:
+            ConditionalStamp: _description_
+        """
+        user = getattr(request, "user", None)
+        return ConditionalStamp(
+            [type(self).__qualname__, query.model._meta.label, request.get_full_path(), getattr(user, "pk", None), *parts],
+        )
+    
+    def conditional_list(self, request: HttpRequest, query: models.QuerySet):
+        """### 精确总数的页码分页：同一次聚合查询得到总数和最大更新时间，用于计算 ETag
+        
+        总数变化（新增、删除）或任意一条记录更新都会改变 ETag
+
+        Args:
+            request (HttpRequest): _description_
+            query (models.QuerySet): _description_
+
+        Returns:
+            tuple[ConditionalStamp | None, int | None]: 校验值和总数，没有更新时间字段时都是 None
+        """
+        if not self.has_conditional_field():
+            return None, None
+        aggregate = query.order_by().aggregate(last_modified=Max(self.conditional_field), count=Count("pk"))
+        last_modified = aggregate["last_modified"]
+        stamp = self.list_stamp(request, query, [last_modified and last_modified.isoformat(), aggregate["count"]])
+        return stamp, aggregate["count"]
+    
+    def page_stamp(self, request: HttpRequest, query: models.QuerySet, rows: list, *parts):
+        """### 游标分页和其他统计策略：由当前页每条记录的主键和更新时间计算 ETag，不额外查询
+        
+        在序列化之前判断，客户端缓存有效时省去序列化和传输
+
+        Args:
+            request (HttpRequest): _description_
+            query (models.QuerySet): _description_
+            rows (list): 当前页的记录
+            parts: 其他影响响应的值，例如 has_more、next_cursor
+
+        Returns:
+            ConditionalStamp | None: 没有更新时间字段时为 None
+        """
+        if not self.has_conditional_field():
+            return None
+        field = self.conditional_field
+        values = []
+        for obj in rows:
+            last_modified = getattr(obj, field, None)
+            values.append("%s@%s" % (obj.pk, last_modified and last_modified.isoformat()))
+        return self.list_stamp(request, query, [",".join(values), *parts])
+    
+    def needs_exact_count(self, request: HttpRequest)->bool:
+        """### 页码分页且使用 ExactCount 时，总数和 ETag 的聚合一起查询
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            bool: _description_
+        """
+        return request.GET.get("cursor") is None and type(self.count_strategy) is ExactCount
+    
+    def detail_stamp(self, request: HttpRequest, obj: models.Model):
+        """### 详情的 ETag / Last-Modified
+
+        Args:
+            request (HttpRequest): _description_
+            obj (models.Model): _description_
+
+        Returns:
+            ConditionalStamp | None: 没有更新时间字段时为 None
+        """
+        if not self.has_conditional_field():
+            return None
+        last_modified = getattr(obj, self.conditional_field)
+        return ConditionalStamp(
+            [type(self).__qualname__, obj._meta.label, obj.pk, request.get_full_path(), last_modified and last_modified.isoformat()],
+            last_modified,
+        )
+        
+    def response_cache_key(self, request: HttpRequest, route: str):
+        """### 响应缓存的 key：路由、排序后的查询参数、用户范围和相关模型的版本号
+
+        Args:
+            request (HttpRequest): _description_
+            route (str): list / detail
+
+        Returns:
+            str | None: 没有开启缓存时为 None
+        """
+        cache = self.response_cache
+        if cache is None:
+            return None
+        labels = cache.watch(related_models(self.model))
+        return cache.make_key(labels, type(self).__qualname__, route, normalized_query(request), self.user_scope(request))
+    
+    def user_scope(self, request: HttpRequest):
+        """### 用户范围：superuser 为 "*"，其他为用户 id（匿名为 None）
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        if self.is_supperuser(request):
+            return "*"
+        return getattr(getattr(request, "user", None), "pk", None)
+    
+    def cached_response(self, request: HttpRequest, key):
+        """### 命中时直接返回缓存的响应（已编码的内容），客户端 ETag 一致时返回 304
+
+        Args:
+            request (HttpRequest): _description_
+            key (str | None): _description_
+
+        Returns:
+            HttpResponse | None: _description_
+        """
+        if key is None:
+            return None
+        value = self.response_cache.get(key)
+        if value is None:
+            return None
+        response = ResponseCache.load(value)
+        if "ETag" in response:
+            return get_conditional_response(request, etag=response["ETag"], response=response)
+        return response
+    
+    def store_response(self, key, response: HttpResponse)->HttpResponse:
+        """### 缓存成功的响应
+
+        Args:
+            key (str | None): _description_
+            response (HttpResponse): _description_
+
+        Returns:
+            HttpResponse: _description_
+        """
+        if key is not None and response.status_code == 200:
+            self.response_cache.set(key, ResponseCache.dump(response))
+        return response
+    
+    def invalidate_response_cache(self):
+        """### 不发信号的批量写入后手动失效
+        """
+        if self.response_cache is not None:
+            self.response_cache.bump(self.model._meta.label)
+    
+    def page_params(self, request: HttpRequest):
+        """### 分页参数 page / size
+
+        Args:
+            request (HttpRequest): _description_
+
+        Raises:
+            ValueError: 不是正整数或 size 超过 max_page_size
+
+        Returns:
+            tuple[int, int]: _description_
+        """
+        try:
+            page = int(request.GET.get("page", 1))
+            size = int(request.GET.get("size", 10))
+        except (TypeError, ValueError):
+            raise ValueError("page 和 size 必须是整数")
+        if page < 1 or size < 1:
+            raise ValueError("page 和 size 必须大于 0")
+        if self.max_page_size is not None and size > self.max_page_size:
+            raise ValueError("size 不能超过 %d" % self.max_page_size)
+        return page, size
+    
     def list(self, request: HttpRequest, **kwargs):
-        if request.method != "GET":
+        if request.method not in ("GET", "HEAD"):
             return JsonResponse({"error": "only support GET"})
-        page, size = request.GET.get("page", 1), request.GET.get("size", 10)
-        page = int(page)
-        size = int(size)
+        key = self.response_cache_key(request, "list")
+        cached = self.cached_response(request, key)
+        if cached is not None:
+            return cached
+        try:
+            page, size = self.page_params(request)
+        except ValueError as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
         objs = self.defaultQuery(request=request)
-        count = objs.count()
-        objs = objs[
-            (page - 1) * size : (page) * size
-        ]
+        stamp, total = None, None
+        if self.needs_exact_count(request):
+            stamp, total = self.conditional_list(request, objs)
+            if stamp is not None:
+                not_modified = stamp.evaluate(request)
+                if not_modified is not None:
+                    return not_modified
+        cursor = request.GET.get("cursor")
+        if cursor is not None:
+            return self.store_response(key, self.cursor_list(request, objs, cursor, size))
+        strategy = self.count_strategy
+        # 精确总数已经在聚合查询中得到
+        if total is not None and type(strategy) is ExactCount:
+            count = total
+        else:
+            count = strategy.count(self, request, objs)
+        has_more = None
+        if strategy.has_more:
+            rows = list(objs[(page - 1) * size : (page) * size + 1])
+            has_more = len(rows) > size
+            rows = rows[:size]
+        else:
+            rows = list(objs[(page - 1) * size : (page) * size])
+        if stamp is None:
+            stamp = self.page_stamp(request, objs, rows, count, has_more)
+            if stamp is not None:
+                not_modified = stamp.evaluate(request)
+                if not_modified is not None:
+                    return not_modified
+        with timed(request, "serialize"):
+            arr = self.serialize_rows(rows, self.request_fieldset(self.model, request))
+        response = self.page_response(arr, page, size, count, has_more)
+        return self.store_response(key, response if stamp is None else stamp.apply(response))
+    
+    def serialize_rows(self, objs: Iterable, fieldset=None)->list:
+        """### 序列化列表数据
+
+        Args:
+            objs (Iterable): _description_
+            fieldset (frozenset, optional): 只输出这些 key. Defaults to None.
+
+        Returns:
+            list: _description_
+        """
         arr = []
         for obj in objs:
             if hasattr(obj, "to_json"):
-                arr.append(obj.to_json())
+                arr.append(json_row(obj, fieldset))
             else:
                 arr.append(obj)
+        return arr
+    
+    def page_response(self, arr: list, page: int, size: int, count, has_more=None):
+        """### 分页列表响应
+
+        Args:
+            arr (list): 当前页数据
+            page (int): _description_
+            size (int): _description_
+            count (int | None): 总数
+            has_more (bool, optional): 不统计总数时是否还有下一页. Defaults to None.
+
+        Returns:
+            _type_: _description_
+        """
+        if has_more is not None:
+            pageable = {
+                "page": page,
+                "size": size,
+                "total": None,
+                "totalPage": None,
+                "has_more": has_more,
+            }
+        else:
+            pageable = {
+                "page": page,
+                "size": size,
+                "total": count,
+                "totalPage": count // size + 1,
+            }
+        return ApiJsonResponse(
+            {
+                "pageable": pageable,
+                "list": arr,
+            },
+            message="获取成功",
+        )
+    
+    def cursor_list(self, request: HttpRequest, objs: models.QuerySet, cursor: str, size: int):
+        """### 游标分页
+        
+        传入 cursor 参数时启用（第一页传空字符串），按当前排序加主键作为游标，
+        深翻页的代价和第一页相同；不统计总数
+
+        Args:
+            request (HttpRequest): _description_
+            objs (models.QuerySet): _description_
+            cursor (str): _description_
+            size (int): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        try:
+            rows, next_cursor = cursor_page(objs, cursor, size, self.max_page_size)
+        except ValueError as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+        stamp = self.page_stamp(request, objs, rows, next_cursor)
+        if stamp is not None:
+            not_modified = stamp.evaluate(request)
+            if not_modified is not None:
+                return not_modified
+        with timed(request, "serialize"):
+            arr = self.serialize_rows(rows, self.request_fieldset(self.model, request))
+        response = self.cursor_response(arr, size, cursor, next_cursor)
+        return response if stamp is None else stamp.apply(response)
+    
+    def cursor_response(self, arr: list, size: int, cursor: str, next_cursor):
+        """### 游标分页列表响应
+
+        Args:
+            arr (list): 当前页数据
+            size (int): _description_
+            cursor (str): _description_
+            next_cursor (str | None): _description_
+
+        Returns:
+            _type_: _description_
+        """
         return ApiJsonResponse(
             {
                 "pageable": {
-                    "page": page,
                     "size": size,
-                    "total": count,
-                    "totalPage": count // size + 1,
+                    "cursor": cursor,
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None,
                 },
                 "list": arr,
             },
             message="获取成功",
         )
     
-        
-    
     @staticmethod
     def get_db_fields(model:SerializerModel):
         return model.objects.first().to_json().keys()
     
     @staticmethod
-    def export_xls_override(query:models.QuerySet,request:HttpRequest):
-        """导出csv
+    def export_file_name(model:SerializerModel,request:HttpRequest,suffix:str)->str:
+        name = request.GET.get("name") or model.__name__.lower() + "_export_" + str(datetime.datetime.now().strftime("%Y-%m-%d-%H-%M"))
+        return name + suffix
+    
+    @classmethod
+    def export_executor(cls):
+        """### 并行导出使用的进程池，相同进程数的 Api 共用，导出结束后不关闭
+
+        Returns:
+            Executor | None: 无法创建时为 None，退回逐行处理
+        """
+        return process_executor(cls.export_workers)
+    
+    @classmethod
+    def parallel_export_rows(cls,query:models.QuerySet,fieldset=None,xls_fields=None):
+        """### 按主键分块并行格式化导出数据
+        
+        只有按主键排序（order_by=id_asc / id_desc）且未切片的查询会并行，结果与逐行处理的顺序相同；
+        默认的 -created_at 或其他字段排序返回 None，由调用方逐行处理
+
+        Args:
+            query (models.QuerySet): _description_
+            fieldset (frozenset, optional): _description_. Defaults to None.
+            xls_fields (list, optional): xls 的字段顺序，None 时返回 to_json 的字典. Defaults to None.
+
+        Returns:
+            Iterable | None: 未开启、查询已切片或不是按主键排序、主键不是整数、行数太少时为 None
+        """
+        if not cls.export_workers or cls.export_workers < 2:
+            return None
+        order = pk_order(query)
+        if order is None:
+            return None
+        if query.count() < cls.export_parallel_min_rows:
+            return None
+        ranges = pk_ranges(query, cls.export_pk_step, order)
+        if ranges is None:
+            return None
+        executor = cls.export_executor()
+        if executor is None:
+            return None
+        tasks = chunk_tasks(query, ranges, fieldset, xls_fields, cls.export_chunk_size, order)
+        return parallel_rows(tasks, executor, cls.export_workers * 2)
+    
+    @classmethod
+    def xls_rows(cls,query:models.QuerySet,request:HttpRequest):
+        """### xls / xlsx 的表头和逐行生成的单元格数据
 
         Args:
             query (models.QuerySet): _description_
             request (HttpRequest): _description_
 
         Returns:
-            _type_: _description_
+            tuple[list, Iterable[list]] | None: 没有数据时为 None
         """
-        from xlwt import Workbook,easyxf,add_palette_colour
-        work = Workbook()
-        add_palette_colour("custom_colour", 0x21)
-        work.set_colour_RGB(0x21, 235, 235, 235)
-        
-        header_style = easyxf('pattern: pattern solid, fore_colour custom_colour;\
-            borders: left thin, right thin, top thin, bottom thin;\
-            font: bold 1,height 240;')
-        
+        return cls.xls_layout(query, cls.request_fieldset(query.model, request))
+    
+    @classmethod
+    def xls_layout(cls,query:models.QuerySet,fieldset=None):
+        """### 同 xls_rows，字段由 fieldset 指定，不依赖 request
+
+        Args:
+            query (models.QuerySet): _description_
+            fieldset (FieldSet, optional): request_fieldset 的结果. Defaults to None.
+
+        Returns:
+            tuple[list, Iterable[list]] | None: 没有数据时为 None
+        """
+        model:SerializerModel = query.model
+        first = query.first()
+        if first is None:
+            return None
+        fields = [field for field in cls.get_db_fields(model) if fieldset is None or fieldset.allows(field)]
+        sorted_fields = sorted(fields,key=lambda k:model.xls_sort_key(k) )
+        headers = [first.get_xls_key_remark(field) for field in sorted_fields]
+        parallel = cls.parallel_export_rows(query, fieldset, sorted_fields)
+        if parallel is not None:
+            return headers, parallel
         
+        def rows():
+            for obj in query.iterator(chunk_size=cls.export_chunk_size):
+                row = json_row(obj, fieldset)
+                yield [obj.to_xls_format(row,field) for field in sorted_fields]
+        return headers, rows()
+    
+    def csv_rows(self,query:models.QuerySet,request:HttpRequest):
+        """### csv 的表头和逐行生成的数据
+
+        Args:
+            query (models.QuerySet): _description_
+            request (HttpRequest): _description_
+
+        Returns:
+            tuple[list, Iterable[dict]]: _description_
+        """
+        return self.csv_layout(query, self.request_fieldset(self.model, request))
+    
+    def csv_layout(self,query:models.QuerySet,fieldset=None):
+        """### 同 csv_rows，字段由 fieldset 指定，不依赖 request
+
+        Args:
+            query (models.QuerySet): _description_
+            fieldset (FieldSet, optional): request_fieldset 的结果. Defaults to None.
+
+        Returns:
+            tuple[list, Iterable[dict]]: _description_
+        """
+        fields = [field for field in self.get_db_fields(self.model) if fieldset is None or fieldset.allows(field)]
+        sorted_fields = sorted(fields,key=lambda k:self.model.xls_sort_key(k))
+        parallel = self.parallel_export_rows(query, fieldset)
+        if parallel is not None:
+            return sorted_fields, parallel
+        rows = (
+            json_row(obj, fieldset)
+            for obj in query.iterator(chunk_size=self.export_chunk_size)
+        )
+        return sorted_fields, rows
+    
+    @classmethod
+    def export_xls_override(cls,query:models.QuerySet,request:HttpRequest):
+        """导出 xls / xlsx（?format=xlsx）
+
+        写入内存缓冲区，超过 export_spool_size 后才转存到系统临时文件，不会写工作目录
+
+        Args:
+            query (models.QuerySet): _description_
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
         model:SerializerModel = query.model
-        name = request.GET.get("name") or model.__name__.lower() + "_export_" + str(datetime.datetime.now().strftime("%Y-%m-%d-%H-%M"))
-        file_name = name + ".xls"
-        file_path = ("tmp")
-        if not os.path.exists(file_path):
-            os.makedirs(os.path.dirname(file_path))
-        file_path = os.path.join(file_path,file_name)
-        print("export_csv",file_path)
+        layout = cls.xls_rows(query, request)
+        if layout is None:
+            return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"没有找到记录")
+        headers, rows = layout
+        xlsx = request.GET.get("format") == "xlsx"
+        file_name = cls.export_file_name(model, request, ".xlsx" if xlsx else ".xls")
+        
+        output = tempfile.SpooledTemporaryFile(max_size=cls.export_spool_size)
         try:
-            sheet = work.add_sheet("sheet1")
-            data = []
-            for obj in query:
-                data.append(obj)
-            if len(data) == 0:
-                return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"没有找到记录")
-            fields = list(Api.get_db_fields(model))
-            
-            sorted_fields = sorted(fields,key=lambda k:model.xls_sort_key(k) )
-            
-            for i,field in enumerate(sorted_fields):
-                obj:SerializerModel = data[0]
-                remark = model.get_xls_key_remark(obj,field)
-                width = len(remark) * 400
-                width = max(width,3600)
-                sheet.col(i).width = width
-                # sheet.write(0,i,remark,header_style)
-                sheet.write(0,i,remark,header_style)
-            for i,obj in enumerate(data):
-                row = obj.to_json()
-                row_style = easyxf('font: height 320;')
-                sheet.row(i+1).set_style(row_style)
-                for j,field in enumerate(sorted_fields):
-                    val = obj.to_xls_format(row,field)
-                    sheet.write(i+1,j,val)
-            work.save(file_path)
+            if xlsx:
+                write_xlsx(rows,headers,output)
+            else:
+                write_xls(rows,headers,output)
         except Exception as e:
+            output.close()
             return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
-        with open(file_path,"rb") as f:
-            response = HttpResponse(f,content_type="application/vnd.ms-excel")
-            response['Content-Disposition'] = 'attachment; filename="export.xls"'
-            return response
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=file_name,
+            content_type=XLSX_CONTENT_TYPE if xlsx else "application/vnd.ms-excel",
+        )
         
     def export_xls(self,request: HttpRequest):
         query = self.defaultQuery(request)
         return self.export_xls_override(query,request)
     
     def export_csv(self,request: HttpRequest):
+        """### 流式导出 csv，内存占用和数据量无关
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
         query = self.defaultQuery(request)
-        data = []
-        for obj in query:
-            data.append(obj.to_json())
-        if len(data) == 0:
+        if not query.exists():
             return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"没有找到记录")
-        fields = list(Api.get_db_fields(self.model))
-        sorted_fields = sorted(fields,key=lambda k:self.model.xls_sort_key(k))
-        # print("sorted_fields",sorted_fields)
-        import csv
-        import io
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=sorted_fields)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-        response = HttpResponse(output.getvalue(), content_type='text/csv')
+        sorted_fields, rows = self.csv_rows(query, request)
+        response = StreamingHttpResponse(iter_csv(rows,sorted_fields), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="export.csv"'
         return response
+    
+    def write_export(self,query:models.QuerySet,fieldset,format:str,output,progress=None)->int:
+        """### 把导出写入文件，后台导出任务使用（在线程池中执行，不使用 request）
+
+        Args:
+            query (models.QuerySet): _description_
+            fieldset (FieldSet | None): request_fieldset 的结果
+            format (str): csv / xls / xlsx
+            output (_type_): 二进制模式打开的文件
+            progress (Callable[[int], None], optional): 进度回调. Defaults to None.
+
+        Returns:
+            int: 写入的行数，没有数据时为 0（空文件）
+        """
+        if not query.exists():
+            return 0
+        if format == "csv":
+            sorted_fields, rows = self.csv_layout(query, fieldset)
+            return write_csv(rows, sorted_fields, output, progress=progress)
+        layout = self.xls_layout(query, fieldset)
+        if layout is None:
+            return 0
+        headers, rows = layout
+        writer = write_xlsx if format == "xlsx" else write_xls
+        return writer(rows, headers, output, progress=progress)
+    
+    def export_start(self,request: HttpRequest):
+        """### 创建后台导出任务（GET，format=csv / xls / xlsx，其余参数与列表相同）
+        
+        相同查询参数和用户的任务还在执行时直接返回该任务，重复请求不会重复导出；已完成的任务不复用。
+        查询、字段和用户范围在请求中确定，线程池中不再访问 request
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: 任务信息，用 id 查询进度和下载
+        """
+        if request.method != "GET":
+            return ApiJsonResponse(None,code=ApiErrorCode.METHOD_NOT_ALLOWED,httpCode=405)
+        format = request.GET.get("format") or "csv"
+        if format not in EXPORT_FORMATS:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,"不支持的导出格式 " + format)
+        content_type, suffix = EXPORT_FORMATS[format]
+        # 先取出用户范围，request.user 的懒加载不会留到线程池中
+        scope = self.user_scope(request)
+        query = self.defaultQuery(request)
+        fieldset = self.request_fieldset(self.model, request)
+        file_name = self.export_file_name(self.model, request, suffix)
+        raw = "|".join(str(part) for part in (type(self).__qualname__, normalized_query(request), scope))
+        key = hashlib.md5(raw.encode()).hexdigest()
+        
+        def run(job: ExportJob, output):
+            job.total = query.count()
+            return self.write_export(query, fieldset, format, output, progress=job.progress)
+        
+        job = self.export_jobs.start(key, scope, file_name, content_type, run)
+        return ApiJsonResponse.success(job.to_json())
+    
+    def export_status(self,request: HttpRequest):
+        """### 查询后台导出任务的进度（rows 为已写入行数）
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        job = self.export_jobs.get(request.GET.get("id"), self.user_scope(request))
+        if job is None:
+            return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"导出任务不存在或已过期")
+        return ApiJsonResponse.success(job.to_json())
+    
+    def export_download(self,request: HttpRequest):
+        """### 下载已完成的后台导出文件
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        job = self.export_jobs.get(request.GET.get("id"), self.user_scope(request))
+        if job is None:
+            return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"导出任务不存在或已过期")
+        if job.status != DONE:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,"导出任务未完成",job.to_json())
+        try:
+            output = open(job.path, "rb")
+        except OSError:
+            return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"导出文件已过期")
+        return FileResponse(output, as_attachment=True, filename=job.file_name, content_type=job.content_type)
 
     @validator([
         Rule(name="id", required=True, message="id不能为空"),
     ])
     def detail(self, request: HttpRequest):
-        if request.method != "GET":
+        if request.method not in ("GET", "HEAD"):
             return JsonResponse({"error": "only support GET"})
+        key = self.response_cache_key(request, "detail")
+        cached = self.cached_response(request, key)
+        if cached is not None:
+            return cached
         id = request.GET.get("id")
+        fieldset = self.request_fieldset(self.model, request)
         # print(self.model, "get_one",id)
         try:
-            obj = self.find_by_user(self.model.objects.filter(pk=id),request=request).first()
+            obj = self.find_by_user(self.optimize_query(self.model.objects.filter(pk=id), fieldset),request=request).first()
         except Exception as e:
             if environ.get("DEBUG") == "True":
                 raise e
             return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"没有 id 为 "+ id +" 的找到记录")
-        return JsonResponse(
+        if obj is None:
+            return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"没有 id 为 "+ id +" 的找到记录")
+        stamp = self.detail_stamp(request, obj)
+        if stamp is not None:
+            not_modified = stamp.evaluate(request)
+            if not_modified is not None:
+                return not_modified
+        with timed(request, "serialize"):
+            data = json_row(obj, fieldset)
+        response = JsonResponse(
             {
                 "status": "success",
                 "code": 200,
-                "data": obj.to_json(),
+                "data": data,
             }
         )
+        return self.store_response(key, response if stamp is None else stamp.apply(response))
 
     def delete(self, request: HttpRequest):
         if self.disable_delete:
             return ApiJsonResponse.error(ApiErrorCode.ERROR,"不支持删除")
-        data = json.loads(request.body)
+        try:
+            data = self.request_body(request)
+        except RequestBodyError as e:
+            return body_error(e)
         ids = data.get("ids",[])
         if request.method != "DELETE":
             raise Exception("not support http method")
         try:
-            for id in ids:
-                obj = self.find_by_user(self.model.objects.filter(pk=id),request=request).first()
-                if obj is not None:
-                    obj.delete()
-            return ApiJsonResponse.success()
+            deleted, not_found = self.delete_ids(request, ids)
+            return ApiJsonResponse.success({
+                "deleted": deleted,
+                "not_found": not_found,
+            })
         except Exception as e:
             return ApiJsonResponse.error(message=e.__str__())
+    
+    def delete_ids(self, request: HttpRequest, ids: Iterable):
+        """### 按用户范围批量删除
+        
+        一次查询取出有权限的 id，再用一条 pk__in 的 DELETE 删除（模型没有信号接收者和级联时，
+        django 不会逐条加载对象）；delete_per_object 为 True 时逐个调用 obj.delete()
+
+        Args:
+            request (HttpRequest): _description_
+            ids (Iterable): _description_
+
+        Raises:
+            ApiException: ids 格式错误
+
+        Returns:
+            tuple[list, list]: 已删除的 id 和不存在/没有权限的 id
+        """
+        if not isinstance(ids, (list, tuple)):
+            raise ApiException("ids 必须是数组")
+        pk_field = self.model._meta.pk
+        wanted = {}
+        for id in ids:
+            try:
+                wanted.setdefault(pk_field.to_python(id), id)
+            except Exception:
+                raise ApiException("id %s 格式错误" % id)
+        query = self.find_by_user(self.model.objects.filter(pk__in=list(wanted)),request=request)
+        with transaction.atomic():
+            if self.delete_per_object:
+                objs = list(query)
+                found = [obj.pk for obj in objs]
+                for obj in objs:
+                    obj.delete()
+            else:
+                found = list(query.values_list("pk", flat=True))
+                if found:
+                    self.model.objects.filter(pk__in=found).delete()
+        found = set(found)
+        deleted = [id for pk, id in wanted.items() if pk in found]
+        not_found = [id for pk, id in wanted.items() if pk not in found]
+        return deleted, not_found
 
     @property
     def urls(self):
@@ -500,11 +1584,13 @@ class Api:
         pass
     
     def register(self,router:Router,baseUrl="api",middlewares=[]):
+        # 注册时解析数据归属，请求中不再重复计算
+        type(self).ownership
         # list 
         router.get(baseUrl,middlewares=middlewares)(self.list)
         # create 
         router.post(baseUrl + '.create',middlewares=middlewares)(
-            validator(self.rules,method="post")(self.create)
+            validator(self.compiled_rules(),method="post",max_body_size=self.max_body_size)(self.create)
         )
         # detail 
         router.get(baseUrl + '.detail',middlewares=middlewares)(self.detail)
@@ -513,14 +1599,19 @@ class Api:
             validator([
                 Rule(name="ids",message="ids 必传！")
             
-            ],method="delete")(self.delete)
+            ],method="delete",max_body_size=self.max_body_size)(self.delete)
         )
         # update  
         router.put(baseUrl + '.update',middlewares=middlewares)(
-            validator(self.rules + [
-                Rule(name="id", required=True, message="id不能为空"),   
-            ],method="put")(self.update)
+            validator(self.compiled_rules(with_id=True),method="put",max_body_size=self.max_body_size)(self.update)
         )
+        # bulk create / update
+        router.post(baseUrl + '.bulk_create',middlewares=middlewares)(self.bulk_create)
+        router.put(baseUrl + '.bulk_update',middlewares=middlewares)(self.bulk_update)
         # export 
         router.get(baseUrl + '.export',middlewares=middlewares)(self.export_csv)
+        # 后台导出
+        router.get(baseUrl + '.export.start',middlewares=middlewares)(self.export_start)
+        router.get(baseUrl + '.export.status',middlewares=middlewares)(self.export_status)
+        router.get(baseUrl + '.export.download',middlewares=middlewares)(self.export_download)
     
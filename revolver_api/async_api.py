@@ -0,0 +1,252 @@
+from os import environ
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, JsonResponse
+
+from .api import Api, Rule, body_error, validator
+from .pagination import ExactCount, cursor_page
+from .response import ApiErrorCode, ApiJsonResponse
+from .utils.body import RequestBodyError
+from .utils.timing import timed
+
+
+class AsyncApi(Api):
+    """# 生成 async API
+
+    list / detail / create / update / delete 使用 django 的 async ORM（acount、afirst、asave、async for），
+    在 ASGI 下等待数据库时不占用线程；序列化可能会懒加载关联数据，放到线程中执行
+
+    Returns:
+        _type_: _description_
+    """
+
+    async def resolve_user(self, request: HttpRequest):
+        """### 在 async 视图中先取出当前用户，后续 find_by_user 等同步方法不会再访问数据库
+
+        Args:
+            request (HttpRequest): _description_
+        """
+        if hasattr(request, "auser"):
+            request.user = await request.auser()
+
+    async def acached_response(self, request: HttpRequest, route: str):
+        """### 响应缓存的 key 和命中的响应，缓存后端可能访问网络，放到线程中执行
+
+        Args:
+            request (HttpRequest): _description_
+            route (str): list / detail
+
+        Returns:
+            tuple[str | None, HttpResponse | None]: _description_
+        """
+        if self.response_cache is None:
+            return None, None
+
+        def lookup():
+            key = self.response_cache_key(request, route)
+            return key, self.cached_response(request, key)
+        return await sync_to_async(lookup)()
+
+    async def astore_response(self, key, response):
+        """### 缓存成功的响应
+
+        Args:
+            key (str | None): _description_
+            response (HttpResponse): _description_
+
+        Returns:
+            HttpResponse: _description_
+        """
+        if key is None:
+            return response
+        return await sync_to_async(self.store_response)(key, response)
+
+    async def aserialize_rows(self, objs, fieldset=None) -> list:
+        """### 序列化列表数据
+
+        Args:
+            objs (_type_): _description_
+            fieldset (frozenset, optional): 只输出这些 key. Defaults to None.
+
+        Returns:
+            list: _description_
+        """
+        return await sync_to_async(self.serialize_rows)(objs, fieldset)
+
+    async def list(self, request: HttpRequest, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return JsonResponse({"error": "only support GET"})
+        await self.resolve_user(request)
+        key, cached = await self.acached_response(request, "list")
+        if cached is not None:
+            return cached
+        try:
+            page, size = self.page_params(request)
+        except ValueError as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+        objs = self.defaultQuery(request=request)
+        fieldset = self.request_fieldset(self.model, request)
+        stamp, total = None, None
+        if self.needs_exact_count(request):
+            stamp, total = await sync_to_async(self.conditional_list)(request, objs)
+            if stamp is not None:
+                not_modified = stamp.evaluate(request)
+                if not_modified is not None:
+                    return not_modified
+        cursor = request.GET.get("cursor")
+        if cursor is not None:
+            try:
+                rows, next_cursor = await sync_to_async(cursor_page)(objs, cursor, size, self.max_page_size)
+            except ValueError as e:
+                return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+            stamp = self.page_stamp(request, objs, rows, next_cursor)
+            if stamp is not None:
+                not_modified = stamp.evaluate(request)
+                if not_modified is not None:
+                    return not_modified
+            with timed(request, "serialize"):
+                arr = await self.aserialize_rows(rows, fieldset)
+            response = self.cursor_response(arr, size, cursor, next_cursor)
+            return await self.astore_response(key, response if stamp is None else stamp.apply(response))
+        strategy = self.count_strategy
+        if total is not None and type(strategy) is ExactCount:
+            count = total
+        else:
+            count = await strategy.acount(self, request, objs)
+        has_more = None
+        if strategy.has_more:
+            rows = [obj async for obj in objs[(page - 1) * size : (page) * size + 1]]
+            has_more = len(rows) > size
+            rows = rows[:size]
+        else:
+            rows = [obj async for obj in objs[(page - 1) * size : (page) * size]]
+        if stamp is None:
+            stamp = self.page_stamp(request, objs, rows, count, has_more)
+            if stamp is not None:
+                not_modified = stamp.evaluate(request)
+                if not_modified is not None:
+                    return not_modified
+        with timed(request, "serialize"):
+            arr = await self.aserialize_rows(rows, fieldset)
+        response = self.page_response(arr, page, size, count, has_more)
+        return await self.astore_response(key, response if stamp is None else stamp.apply(response))
+
+    @validator([
+        Rule(name="id", required=True, message="id不能为空"),
+    ])
+    async def detail(self, request: HttpRequest):
+        if request.method not in ("GET", "HEAD"):
+            return JsonResponse({"error": "only support GET"})
+        await self.resolve_user(request)
+        key, cached = await self.acached_response(request, "detail")
+        if cached is not None:
+            return cached
+        id = request.GET.get("id")
+        fieldset = self.request_fieldset(self.model, request)
+        try:
+            obj = await self.find_by_user(self.optimize_query(self.model.objects.filter(pk=id), fieldset),request=request).afirst()
+        except Exception as e:
+            if environ.get("DEBUG") == "True":
+                raise e
+            obj = None
+        if obj is None:
+            return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"没有 id 为 "+ id +" 的找到记录")
+        stamp = self.detail_stamp(request, obj)
+        if stamp is not None:
+            not_modified = stamp.evaluate(request)
+            if not_modified is not None:
+                return not_modified
+        with timed(request, "serialize"):
+            data = (await self.aserialize_rows([obj], fieldset))[0]
+        response = JsonResponse(
+            {
+                "status": "success",
+                "code": 200,
+                "data": data,
+            }
+        )
+        return await self.astore_response(key, response if stamp is None else stamp.apply(response))
+
+    async def create(self, request: HttpRequest, **kwargs):
+        """### 创建数据
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        if request.method != "POST":
+            return JsonResponse({"error": "only support POST"})
+        await self.resolve_user(request)
+
+        if not self.is_supperuser(request=request):
+            if self.shoud_find_by_user and (request.user is None or request.user.is_anonymous):
+                return ApiJsonResponse.error(ApiErrorCode.ERROR,"没有权限")
+
+        try:
+            data = self.request_body(request)
+        except Exception as e:
+            return body_error(e)
+        try:
+            data.pop("id", None)
+            obj = self.model(**data)
+            self.assign_user(request, obj)
+            await obj.asave()
+        except Exception as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+        return JsonResponse(
+            {
+                "status": "success",
+                "code": 200,
+                "data": await sync_to_async(obj.to_json)(),
+            }
+        )
+
+    async def update(self, request: HttpRequest, **kwargs):
+        """### 更新数据
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        await self.resolve_user(request)
+        try:
+            data = self.request_body(request)
+        except Exception as e:
+            return body_error(e, data={})
+        id = data.get("id")
+        if id is None or id == "":
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,"id 不能为空")
+        obj = await self.find_by_user(query=self.model.objects.filter(pk=id),request=request).afirst()
+        if obj is None:
+            return ApiJsonResponse.error(ApiErrorCode.NOT_FOUND,"无法更新/没有权限")
+        for key in obj.fillable():
+            setattr(obj, key, data.get(key))
+        try:
+            await obj.asave()
+        except Exception as e:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,e.__str__())
+        return ApiJsonResponse.success(await sync_to_async(obj.to_json)())
+
+    async def delete(self, request: HttpRequest):
+        if self.disable_delete:
+            return ApiJsonResponse.error(ApiErrorCode.ERROR,"不支持删除")
+        if request.method != "DELETE":
+            raise Exception("not support http method")
+        await self.resolve_user(request)
+        try:
+            data = self.request_body(request)
+        except RequestBodyError as e:
+            return body_error(e)
+        ids = data.get("ids",[])
+        try:
+            deleted, not_found = await sync_to_async(self.delete_ids)(request, ids)
+            return ApiJsonResponse.success({
+                "deleted": deleted,
+                "not_found": not_found,
+            })
+        except Exception as e:
+            return ApiJsonResponse.error(message=e.__str__())
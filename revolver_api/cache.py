@@ -0,0 +1,242 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpRequest, HttpResponse
+
+# 不缓存的响应头，重建响应时由 django 重新计算
+SKIP_HEADERS = {"content-length"}
+
+
+# 每个模型的 related_models 结果，模型关系在运行时不会变化
+_related_models = {}
+
+
+def related_models(model) -> frozenset:
+    """ 模型本身以及序列化结果中可能出现的所有模型
+
+    外键对象会继续带着自己的外键和反向关联序列化，所以沿关联逐层展开直到没有新的模型，
+    任意一层的模型保存或删除都会使缓存失效
+
+    Args:
+        model (Model): _description_
+
+    Returns:
+        frozenset: _description_
+    """
+    result = _related_models.get(model)
+    if result is not None:
+        return result
+    found = {model}
+    pending = [model]
+    while pending:
+        current = pending.pop()
+        for field in current._meta.get_fields():
+            related = field.related_model
+            if not field.is_relation or related is None or related == "self" or related in found:
+                continue
+            found.add(related)
+            pending.append(related)
+    result = _related_models[model] = frozenset(found)
+    return result
+
+
+def normalized_query(request: HttpRequest) -> str:
+    """ 排序后的查询参数，参数顺序不同的请求命中同一个缓存
+
+    Args:
+        request (HttpRequest): _description_
+
+    Returns:
+        str: _description_
+    """
+    return "&".join(
+        "%s=%s" % (key, value)
+        for key in sorted(request.GET.keys())
+        for value in request.GET.getlist(key)
+    )
+
+
+class ResponseCache:
+    """ 序列化后的响应缓存
+
+    缓存 key 中包含相关模型的版本号，模型的 post_save / post_delete 信号只把版本号加一，
+    旧的缓存不再命中，由 LRU / 过期时间淘汰
+
+    子类实现 get / set / versions / bump
+    """
+
+    def __init__(self):
+        self._watched = set()
+        self._watch_lock = threading.Lock()
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value):
+        raise NotImplementedError
+
+    def versions(self, labels: list) -> list:
+        """ 模型的当前版本号
+
+        Args:
+            labels (list): 模型 label 列表
+
+        Returns:
+            list: 与 labels 顺序一致
+        """
+        raise NotImplementedError
+
+    def bump(self, label: str):
+        """ 模型数据发生变化，版本号加一
+
+        Args:
+            label (str): 模型 label
+        """
+        raise NotImplementedError
+
+    def watch(self, models) -> list:
+        """ 监听模型的 post_save / post_delete 信号，每个模型只注册一次
+
+        Args:
+            models (Iterable[Model]): _description_
+
+        Returns:
+            list: 排序后的模型 label
+        """
+        labels = []
+        for model in models:
+            label = model._meta.label
+            labels.append(label)
+            if label in self._watched:
+                continue
+            with self._watch_lock:
+                if label in self._watched:
+                    continue
+                uid = "revolver_api.cache.%s.%s" % (id(self), label)
+                post_save.connect(self.invalidate, sender=model, weak=False, dispatch_uid=uid)
+                post_delete.connect(self.invalidate, sender=model, weak=False, dispatch_uid=uid)
+                self._watched.add(label)
+        return sorted(labels)
+
+    def invalidate(self, sender, **kwargs):
+        self.bump(sender._meta.label)
+
+    def make_key(self, labels: list, *parts) -> str:
+        """ 由模型版本号和请求信息计算缓存 key
+
+        Args:
+            labels (list): watch 返回的模型 label
+
+        Returns:
+            str: _description_
+        """
+        raw = "|".join(str(part) for part in (*parts, *self.versions(labels)))
+        return "revolver_api.response." + hashlib.md5(raw.encode()).hexdigest()
+
+    @staticmethod
+    def dump(response: HttpResponse):
+        """ 响应转换为可缓存的值
+
+        Args:
+            response (HttpResponse): _description_
+
+        Returns:
+            tuple: (status, 响应头, 已编码的内容)
+        """
+        headers = [
+            (key, value)
+            for key, value in response.headers.items()
+            if key.lower() not in SKIP_HEADERS
+        ]
+        return response.status_code, headers, response.content
+
+    @staticmethod
+    def load(value) -> HttpResponse:
+        status, headers, content = value
+        return HttpResponse(content, status=status, headers=dict(headers))
+
+
+class LocalResponseCache(ResponseCache):
+    """ 进程内 LRU 缓存（默认）
+
+    Args:
+        maxsize (int, optional): 最多缓存的响应数. Defaults to 1024.
+    """
+
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def versions(self, labels: list) -> list:
+        return [self._versions.get(label, 0) for label in labels]
+
+    def bump(self, label: str):
+        with self._lock:
+            self._versions[label] = self._versions.get(label, 0) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoResponseCache(ResponseCache):
+    """ 使用 django 缓存后端，多进程 / 多机器共享
+
+    Args:
+        timeout (int, optional): 缓存秒数. Defaults to 300.
+        cache_alias (str, optional): settings.CACHES 中的名称. Defaults to "default".
+    """
+
+    def __init__(self, timeout=300, cache_alias="default"):
+        super().__init__()
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+
+    @property
+    def backend(self):
+        from django.core.cache import caches
+
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def version_key(label: str) -> str:
+        return "revolver_api.version." + label
+
+    def get(self, key: str):
+        return self.backend.get(key)
+
+    def set(self, key: str, value):
+        self.backend.set(key, value, self.timeout)
+
+    def versions(self, labels: list) -> list:
+        keys = [self.version_key(label) for label in labels]
+        found = self.backend.get_many(keys)
+        return [found.get(key, 0) for key in keys]
+
+    def bump(self, label: str):
+        key = self.version_key(label)
+        backend = self.backend
+        # 版本号不过期
+        if not backend.add(key, 1, None):
+            try:
+                backend.incr(key)
+            except ValueError:
+                backend.set(key, 1, None)
@@ -0,0 +1,58 @@
+import calendar
+import datetime
+import hashlib
+
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalStamp:
+    """ 条件请求的校验值（ETag / Last-Modified）
+
+    Args:
+        parts (Iterable): 参与计算 ETag 的值，任意一个变化 ETag 就会变化
+        last_modified (datetime.datetime, optional): 最后修改时间. Defaults to None.
+    """
+
+    def __init__(self, parts, last_modified: datetime.datetime = None):
+        raw = "|".join(str(part) for part in parts)
+        self.etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        self.last_modified = last_modified
+
+    @property
+    def timestamp(self):
+        if self.last_modified is None:
+            return None
+        return calendar.timegm(self.last_modified.utctimetuple())
+
+    def evaluate(self, request: HttpRequest):
+        """ 按 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效
+
+        Args:
+            request (HttpRequest): _description_
+
+        Returns:
+            HttpResponse | None: 304 / 412 响应，None 表示需要正常返回数据
+        """
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.timestamp
+        )
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response: HttpResponse) -> HttpResponse:
+        """ 给响应加上 ETag / Last-Modified，错误响应不加
+
+        Args:
+            response (HttpResponse): _description_
+
+        Returns:
+            HttpResponse: _description_
+        """
+        if response.status_code in (200, 304):
+            response.headers["ETag"] = self.etag
+            if self.last_modified is not None:
+                response.headers["Last-Modified"] = http_date(self.timestamp)
+        return response
@@ -1,8 +1,29 @@
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 
+logger = logging.getLogger("revolver_api")
+
 
 def readTomlConfig(baseDir:Path):
-    """_summary_
+    """ 读取 toml 配置，同一个文件只解析一次，之后按修改时间重新读取（见 load_config）
+
+    返回的字典由所有调用方共享，不要修改
+
+    Raises:
+        Exception: 配置文件不存在，创建默认配置后报错
+
+    Returns:
+        _type_: _description_
+    """
+    return load_config(baseDir).data
+
+
+def read_toml_file(baseDir:Path):
+    """ 读取并解析配置文件，不存在时创建默认配置并报错
 
     Raises:
         Exception: _description_
@@ -37,12 +58,150 @@ def get(config: dict[any],domain:str,default=""):
     Returns:
         _type_: _description_
     """
-    keys = domain.split(".")
+    if isinstance(config, Config):
+        return config.get(domain, default)
     target = config
-    for key in keys:
+    for key in split_domain(domain):
         if key in target:
             target = target[key]
         else:
             return default
     return target
 
+
+
+@lru_cache(maxsize=1024)
+def split_domain(domain: str) -> tuple:
+    return tuple(domain.split("."))
+
+
+def flatten(config: dict, prefix="", result=None) -> dict:
+    """ 展开为 a.b.c 形式的 key，中间的表也保留，例如 timezone 和 timezone.timezone
+
+    Args:
+        config (dict): _description_
+        prefix (str, optional): _description_. Defaults to "".
+
+    Returns:
+        dict: _description_
+    """
+    if result is None:
+        result = {}
+    for key, value in config.items():
+        name = prefix + str(key)
+        result[name] = value
+        if isinstance(value, dict):
+            flatten(value, name + ".", result)
+    return result
+
+
+class Config:
+    """ 缓存的 toml 配置，多线程安全
+
+    第一次创建时读取文件，之后最多每 check_interval 秒检查一次修改时间，文件变化时重新读取；
+    读取失败（例如正在编辑）时保留旧的配置
+
+    Args:
+        path (Path): 配置文件路径，不存在时与 readTomlConfig 一样创建默认配置并报错
+        check_interval (float, optional): 检查文件修改的最小间隔（秒），None 表示不重新读取. Defaults to 2.
+    """
+
+    def __init__(self, path: Path, check_interval=2.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._data = read_toml_file(self.path)
+        self._flat = flatten(self._data)
+        self._stamp = self.file_stamp()
+        self._checked_at = time.monotonic()
+
+    def file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def maybe_reload(self):
+        """ 距离上次检查超过 check_interval 时检查文件是否修改
+        """
+        if self.check_interval is None:
+            return
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            self._checked_at = time.monotonic()
+            stamp = self.file_stamp()
+            if stamp is None or stamp == self._stamp:
+                return
+            self.reload(stamp)
+
+    def reload(self, stamp=None):
+        """ 重新读取配置文件
+
+        Args:
+            stamp (tuple, optional): 文件的修改时间和大小. Defaults to None.
+        """
+        import toml
+
+        try:
+            with open(self.path, "r") as f:
+                data = toml.load(f)
+        except Exception as e:
+            logger.warning("重新读取配置 %s 失败：%s", self.path, e)
+            return
+        # 先生成新的字典再替换，读取时不需要加锁
+        self._data, self._flat = data, flatten(data)
+        self._stamp = stamp or self.file_stamp()
+
+    @property
+    def data(self) -> dict:
+        self.maybe_reload()
+        return self._data
+
+    def get(self, domain: str, default=""):
+        """ 读取配置
+
+        Args:
+            domain (str): 例如 timezone.timezone
+            default (str, optional): _description_. Defaults to "".
+
+        Returns:
+            _type_: _description_
+        """
+        self.maybe_reload()
+        return self._flat.get(domain, default)
+
+    def __getitem__(self, domain: str):
+        self.maybe_reload()
+        return self._flat[domain]
+
+    def __contains__(self, domain: str):
+        self.maybe_reload()
+        return domain in self._flat
+
+
+_configs = {}
+_configs_lock = threading.Lock()
+
+
+def load_config(baseDir: Path, check_interval=2.0) -> Config:
+    """ 同一个文件只创建一个 Config
+
+    Args:
+        baseDir (Path): 配置文件路径
+        check_interval (float, optional): _description_. Defaults to 2.
+
+    Returns:
+        Config: _description_
+    """
+    key = os.path.abspath(str(baseDir))
+    config = _configs.get(key)
+    if config is None:
+        with _configs_lock:
+            config = _configs.get(key)
+            if config is None:
+                config = _configs[key] = Config(key, check_interval)
+    return config
@@ -0,0 +1,191 @@
+import csv
+from typing import Iterable
+
+# xls 每个 sheet 最多 65536 行，xlsx 最多 1048576 行（都包含表头）
+XLS_MAX_ROWS = 65536
+XLSX_MAX_ROWS = 1048576
+# 每写入多少行报告一次进度
+PROGRESS_EVERY = 500
+
+
+def report_progress(rows: Iterable, progress=None, every=PROGRESS_EVERY):
+    """ 每 every 行以及结束时调用 progress(已写入行数)
+
+    Args:
+        rows (Iterable): _description_
+        progress (Callable[[int], None], optional): None 时原样返回 rows. Defaults to None.
+        every (int, optional): _description_. Defaults to PROGRESS_EVERY.
+
+    Returns:
+        Iterable: _description_
+    """
+    if progress is None:
+        return rows
+
+    def counted():
+        count = 0
+        for row in rows:
+            yield row
+            count += 1
+            if count % every == 0:
+                progress(count)
+        progress(count)
+
+    return counted()
+
+
+class Echo:
+    """ 只返回写入内容的伪文件对象，配合 csv.writer 逐行生成 csv
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows: Iterable[dict], fieldnames: list, batch_size=500):
+    """ 逐行生成 csv 文本，每 batch_size 行合并成一个块输出
+
+    Args:
+        rows (Iterable[dict]): 行数据，通常是 obj.to_json() 的生成器
+        fieldnames (list): 表头
+        batch_size (int, optional): 每块的行数. Defaults to 500.
+
+    Yields:
+        str: csv 文本块
+    """
+    writer = csv.DictWriter(Echo(), fieldnames=fieldnames, extrasaction="ignore")
+    yield writer.writeheader()
+    buffer = []
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= batch_size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def write_csv(rows: Iterable[dict], fieldnames: list, output, progress=None, encoding="utf-8"):
+    """ 写入 csv 文件
+
+    Args:
+        rows (Iterable[dict]): 行数据
+        fieldnames (list): 表头
+        output (_type_): 以二进制模式打开的文件对象
+        progress (Callable[[int], None], optional): 进度回调. Defaults to None.
+        encoding (str, optional): _description_. Defaults to "utf-8".
+
+    Returns:
+        int: 写入的数据行数
+    """
+    total = 0
+
+    def counted():
+        nonlocal total
+        for row in report_progress(rows, progress):
+            total += 1
+            yield row
+
+    for chunk in iter_csv(counted(), fieldnames):
+        output.write(chunk.encode(encoding))
+    return total
+
+
+def write_xls(rows: Iterable[list], headers: list, output, max_rows=XLS_MAX_ROWS, progress=None):
+    """ 写入 xls，超过单个 sheet 行数上限时自动新建 sheet
+
+    样式对象只创建一次，所有行复用
+
+    Args:
+        rows (Iterable[list]): 每行的单元格数据
+        headers (list): 表头
+        output (_type_): 可写的文件对象
+        max_rows (int, optional): 每个 sheet 的最大行数. Defaults to XLS_MAX_ROWS.
+        progress (Callable[[int], None], optional): 进度回调. Defaults to None.
+
+    Returns:
+        int: 写入的数据行数
+    """
+    from xlwt import Workbook,easyxf,add_palette_colour
+    work = Workbook()
+    add_palette_colour("custom_colour", 0x21)
+    work.set_colour_RGB(0x21, 235, 235, 235)
+
+    header_style = easyxf('pattern: pattern solid, fore_colour custom_colour;\
+        borders: left thin, right thin, top thin, bottom thin;\
+        font: bold 1,height 240;')
+    row_style = easyxf('font: height 320;')
+
+    def add_sheet(index):
+        sheet = work.add_sheet("sheet%d" % index)
+        for i,remark in enumerate(headers):
+            sheet.col(i).width = max(len(remark) * 400,3600)
+            sheet.write(0,i,remark,header_style)
+        return sheet
+
+    sheet = add_sheet(1)
+    sheet_count, line, total = 1, 1, 0
+    for row in report_progress(rows, progress):
+        if line >= max_rows:
+            sheet_count += 1
+            sheet = add_sheet(sheet_count)
+            line = 1
+        sheet_row = sheet.row(line)
+        sheet_row.set_style(row_style)
+        for j,val in enumerate(row):
+            sheet_row.write(j,val)
+        line += 1
+        total += 1
+    work.save(output)
+    return total
+
+
+def write_xlsx(rows: Iterable[list], headers: list, output, max_rows=XLSX_MAX_ROWS, progress=None):
+    """ 以 openpyxl 的 write_only 模式写入 xlsx，超过行数上限时自动新建 sheet
+
+    Args:
+        rows (Iterable[list]): 每行的单元格数据
+        headers (list): 表头
+        output (_type_): 可写的文件对象
+        max_rows (int, optional): 每个 sheet 的最大行数. Defaults to XLSX_MAX_ROWS.
+        progress (Callable[[int], None], optional): 进度回调. Defaults to None.
+
+    Raises:
+        Exception: 没有安装 openpyxl
+
+    Returns:
+        int: 写入的数据行数
+    """
+    try:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
+    except ImportError:
+        raise Exception("导出 xlsx 需要安装 openpyxl")
+    work = Workbook(write_only=True)
+    font = Font(bold=True)
+    fill = PatternFill("solid", fgColor="EBEBEB")
+
+    def add_sheet(index):
+        sheet = work.create_sheet("sheet%d" % index)
+        header = []
+        for remark in headers:
+            cell = WriteOnlyCell(sheet, value=remark)
+            cell.font = font
+            cell.fill = fill
+            header.append(cell)
+        sheet.append(header)
+        return sheet
+
+    sheet = add_sheet(1)
+    sheet_count, line, total = 1, 1, 0
+    for row in report_progress(rows, progress):
+        if line >= max_rows:
+            sheet_count += 1
+            sheet = add_sheet(sheet_count)
+            line = 1
+        sheet.append(row)
+        line += 1
+        total += 1
+    work.save(output)
+    return total
@@ -0,0 +1,275 @@
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+
+# 默认允许的查询后缀
+DEFAULT_LOOKUPS = (
+    "exact",
+    "iexact",
+    "in",
+    "gt",
+    "gte",
+    "lt",
+    "lte",
+    "contains",
+    "icontains",
+    "startswith",
+    "istartswith",
+    "endswith",
+    "iendswith",
+    "isnull",
+)
+
+# 只对文本字段开放的查询后缀，值不做类型转换
+TEXT_LOOKUPS = frozenset(
+    [
+        "iexact",
+        "contains",
+        "icontains",
+        "startswith",
+        "istartswith",
+        "endswith",
+        "iendswith",
+    ]
+)
+
+TRUE_VALUES = frozenset([True, "1", "t", "true", "True", "yes", "on"])
+FALSE_VALUES = frozenset([False, "0", "f", "false", "False", "no", "off"])
+
+
+def coerce_scalar(field: models.Field):
+    """ 按字段类型转换单个值
+
+    Args:
+        field (models.Field): _description_
+
+    Returns:
+        _type_: 转换函数
+    """
+    if isinstance(field, models.BooleanField):
+        return coerce_bool
+    return field.to_python
+
+
+def coerce_list(field: models.Field):
+    """ __in 查询，逗号分隔后逐个转换
+
+    Args:
+        field (models.Field): _description_
+
+    Returns:
+        _type_: 转换函数
+    """
+    scalar = coerce_scalar(field)
+
+    def coerce(value):
+        return [scalar(item.strip()) for item in value.split(",") if item.strip() != ""]
+    return coerce
+
+
+def coerce_bool(value):
+    """ 布尔参数，兼容 true/false、1/0 等写法
+
+    Args:
+        value (_type_): _description_
+
+    Raises:
+        ValidationError: _description_
+
+    Returns:
+        bool: _description_
+    """
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError("invalid boolean")
+
+
+def coerce_text(value):
+    """ 文本查询不做转换
+    """
+    return value
+
+
+def add_field_lookups(index: dict, path: str, target: models.Field, lookups, many=False):
+    """ 为一个字段生成 path 及 path__<lookup> 参数
+
+    Args:
+        index (dict): _description_
+        path (str): 查询路径
+        target (models.Field): 决定值转换方式的字段（关联字段为被关联的主键）
+        lookups (Iterable[str]): _description_
+        many (bool, optional): 是否经过多值关联（多对多、反向外键）. Defaults to False.
+    """
+    is_text = isinstance(target, (models.CharField, models.TextField))
+    index[path] = (path, coerce_scalar(target), many)
+    for lookup in lookups:
+        if lookup in TEXT_LOOKUPS and not is_text:
+            continue
+        if lookup == "in":
+            coerce = coerce_list(target)
+        elif lookup == "isnull":
+            coerce = coerce_bool
+        elif lookup in TEXT_LOOKUPS:
+            coerce = coerce_text
+        else:
+            coerce = coerce_scalar(target)
+        key = "%s__%s" % (path, lookup)
+        index[key] = (key, coerce, many)
+
+
+# 任何模型上都不允许作为查询条件的字段，避免通过 startswith 等逐字符猜出内容
+SECRET_FIELDS = frozenset(["password"])
+
+
+def filterable(model, field, related=False) -> bool:
+    """ 字段是否允许作为查询条件：排除密码字段，关联模型上再排除 exclude_json_keys
+
+    Args:
+        model (_type_): 字段所在的模型
+        field (_type_): _description_
+        related (bool, optional): 是否为经过关联访问的模型. Defaults to False.
+
+    Returns:
+        bool: _description_
+    """
+    if field.name in SECRET_FIELDS:
+        return False
+    if related and hasattr(model, "serialize_plan"):
+        return field.name not in model.serialize_plan().exclude_keys
+    return True
+
+
+def relation_target(field):
+    """ 关联字段按主键查询时用于转换值的字段
+
+    Args:
+        field (_type_): 外键、多对多或反向关联
+
+    Returns:
+        models.Field: _description_
+    """
+    if field.concrete and (field.many_to_one or field.one_to_one):
+        return field.target_field
+    return field.related_model._meta.pk
+
+
+def resolve_filter_path(model, path: str):
+    """ 解析 filter_fields 中的关联路径，例如 author__name、book__title、groups__name
+
+    Args:
+        model (_type_): django 模型
+        path (str): 用 __ 分隔的查询路径
+
+    Raises:
+        ValueError: 路径不存在、中间不是关联字段或经过不允许查询的字段
+
+    Returns:
+        tuple[models.Field, bool]: 决定值转换方式的字段，是否经过多值关联
+    """
+    names = path.split("__")
+    many = False
+    for i, name in enumerate(names):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValueError("filter_fields 中的 %s 不是有效的查询路径" % path)
+        if getattr(field, "hidden", False) or not filterable(model, field, related=i > 0):
+            raise ValueError("filter_fields 中的 %s 不允许查询" % path)
+        last = i == len(names) - 1
+        if not field.is_relation:
+            if not last:
+                raise ValueError("filter_fields 中的 %s 不是有效的查询路径" % path)
+            return field, many
+        many = many or field.many_to_many or field.one_to_many
+        if last:
+            return relation_target(field), many
+        model = field.related_model
+
+
+def build_filter_index(model, fields=None, lookups=DEFAULT_LOOKUPS):
+    """ 预先生成允许的查询参数索引，查询时每个参数只需要一次字典查找
+
+    默认只包含模型自身的字段、外键 / 多对多 / 反向关联的主键（例如 author、author_id、book），
+    不会展开到关联模型的字段；需要按关联模型字段查询时在 fields 中显式列出路径，例如 author__name、book__title
+
+    Args:
+        model (_type_): django 模型
+        fields (Iterable[str], optional): 允许查询的字段和关联路径，None 表示模型自身全部字段. Defaults to None.
+        lookups (Iterable[str], optional): 允许的查询后缀. Defaults to DEFAULT_LOOKUPS.
+
+    Raises:
+        ValueError: fields 中的关联路径无效或不允许查询
+
+    Returns:
+        dict[str, tuple[str, Callable, bool]]: 参数名 -> (orm 查询条件, 值转换函数, 是否经过多值关联)
+    """
+    index = {}
+    for field in model._meta.concrete_fields:
+        if fields is not None and field.name not in fields:
+            continue
+        if not filterable(model, field):
+            continue
+        target = relation_target(field) if field.is_relation else field
+        names = [field.name]
+        if field.is_relation:
+            names.append(field.attname)
+        for name in names:
+            add_field_lookups(index, name, target, lookups)
+    # 多对多和反向关联：name 为 orm 中的查询名（related_query_name），值为被关联模型的主键
+    # related_objects 不包含 related_name 以 + 结尾的隐藏关联
+    relations = list(model._meta.many_to_many) + list(model._meta.related_objects)
+    for relation in relations:
+        if fields is not None and relation.name not in fields:
+            continue
+        many = relation.many_to_many or relation.one_to_many
+        add_field_lookups(index, relation.name, relation.related_model._meta.pk, lookups, many)
+    for path in fields or ():
+        if "__" not in path:
+            continue
+        target, many = resolve_filter_path(model, path)
+        add_field_lookups(index, path, target, lookups, many)
+    return index
+
+
+def needs_distinct(index: dict, filters: dict) -> bool:
+    """ 条件经过多对多或反向外键时，同一条记录可能匹配多次，需要 distinct()
+
+    Args:
+        index (dict): build_filter_index 的结果
+        filters (dict): parse_filters 的结果
+
+    Returns:
+        bool: _description_
+    """
+    return any(index[key][2] for key in filters if key in index)
+
+
+def parse_filters(index: dict, params: dict) -> dict:
+    """ 把请求参数转换为 orm 查询条件，不在索引中的参数直接忽略
+
+    Args:
+        index (dict): build_filter_index 的结果
+        params (dict): 请求参数
+
+    Raises:
+        ValueError: 参数值类型错误
+
+    Returns:
+        dict: _description_
+    """
+    result = {}
+    for key, value in params.items():
+        entry = index.get(key)
+        if entry is None or value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value == "":
+            continue
+        lookup, coerce, _ = entry
+        try:
+            result[lookup] = coerce(value)
+        except (ValidationError, ValueError, TypeError):
+            raise ValueError("查询参数 %s 格式错误" % key)
+    return result
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.db import connections
+
+logger = logging.getLogger("revolver_api")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# 任务 id 为 uuid4().hex，按 id 拼接文件路径前先校验
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class ExportJob:
+    """ 后台导出任务
+
+    Args:
+        key (str): 去重用的 key（查询参数 + 用户）
+        scope (Any): 用户范围，只有同一范围的用户可以查看和下载
+        file_name (str): 下载时的文件名
+        content_type (str): _description_
+        path (Path): 导出文件保存位置
+    """
+
+    # 导出过程中写入进度到元数据文件的最小间隔（秒）
+    save_interval = 1.0
+
+    def __init__(self, key: str, scope, file_name: str, content_type: str, path: Path):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.scope = scope
+        self.file_name = file_name
+        self.content_type = content_type
+        self.path = path
+        self.status = PENDING
+        self.rows = 0
+        self.total = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.saved_at = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path.with_name(self.id + ".json")
+
+    def progress(self, rows: int):
+        self.rows = rows
+        if time.time() - self.saved_at >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """ 把任务信息写入导出文件旁的 <id>.json，其他进程（多个 WSGI worker）通过它查询进度和下载
+        """
+        data = self.to_json()
+        data.update(key=self.key, scope=str(self.scope), content_type=self.content_type, path=str(self.path))
+        temp = self.meta_path.with_suffix(".tmp")
+        with open(temp, "w") as output:
+            json.dump(data, output)
+        os.replace(temp, self.meta_path)
+        self.saved_at = time.time()
+
+    @classmethod
+    def load(cls, meta_path: Path):
+        """ 从元数据文件恢复任务
+
+        Args:
+            meta_path (Path): _description_
+
+        Returns:
+            ExportJob | None: 文件不存在或无法解析时为 None
+        """
+        try:
+            with open(meta_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(data["key"], data["scope"], data["file_name"], data["content_type"], Path(data["path"]))
+        for name in ("id", "status", "rows", "total", "error", "created_at", "finished_at"):
+            setattr(job, name, data[name])
+        return job
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "rows": self.rows,
+            "total": self.total,
+            "file_name": self.file_name,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ExportJobManager:
+    """ 在线程池中执行导出，导出文件和任务信息（<id>.json）保存在本地目录（默认系统临时目录）
+
+    相同 key 的任务还在等待或执行时复用，已完成的任务不复用（数据可能已经变化）；完成 ttl 秒后删除任务和文件。
+    查询进度和下载时按 id 读取目录中的任务信息，多个 worker 进程共用同一个目录即可互相查询
+
+    Args:
+        max_workers (int, optional): 同时执行的导出数. Defaults to 2.
+        ttl (int, optional): 完成后保留的秒数. Defaults to 3600.
+        directory (str, optional): 导出文件目录. Defaults to None.
+    """
+
+    def __init__(self, max_workers=2, ttl=3600, directory=None):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.directory = Path(directory or os.path.join(tempfile.gettempdir(), "revolver_api_exports"))
+        self._jobs = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="revolver_export"
+                    )
+        return self._executor
+
+    def start(self, key: str, scope, file_name: str, content_type: str, run) -> ExportJob:
+        """ 创建任务，当前进程中相同 key 的任务还在等待或执行时直接返回该任务
+
+        Args:
+            key (str): _description_
+            scope (Any): _description_
+            file_name (str): _description_
+            content_type (str): _description_
+            run (Callable[[ExportJob, file], int]): 在线程池中执行，写入文件并返回行数
+
+        Returns:
+            ExportJob: _description_
+        """
+        self.expire()
+        with self._lock:
+            job = self._jobs.get(self._keys.get(key))
+            if job is not None and not job.finished:
+                return job
+            self.directory.mkdir(parents=True, exist_ok=True)
+            suffix = os.path.splitext(file_name)[1]
+            job = ExportJob(key, scope, file_name, content_type, None)
+            job.path = self.directory / (job.id + suffix)
+            job.save()
+            self._jobs[job.id] = job
+            self._keys[key] = job.id
+        self.executor.submit(self.execute, job, run)
+        return job
+
+    def execute(self, job: ExportJob, run):
+        job.status = RUNNING
+        try:
+            job.save()
+            with open(job.path, "wb") as output:
+                job.rows = run(job, output)
+            job.status = DONE
+        except Exception as e:
+            logger.exception("导出任务 %s 失败", job.id)
+            job.error = e.__str__() or e.__class__.__name__
+            job.status = FAILED
+            self.remove_file(job, meta=False)
+        finally:
+            job.finished_at = time.time()
+            job.save()
+            # 线程池中的数据库连接不会被请求结束时的信号关闭
+            connections.close_all()
+
+    def get(self, job_id: str, scope=None):
+        """ 获取任务，先查当前进程，再读取目录中的任务信息；用户范围不一致时返回 None
+
+        Args:
+            job_id (str): _description_
+            scope (Any, optional): _description_. Defaults to None.
+
+        Returns:
+            ExportJob | None: _description_
+        """
+        if not isinstance(job_id, str) or not JOB_ID.fullmatch(job_id):
+            return None
+        self.expire()
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = ExportJob.load(self.directory / (job_id + ".json"))
+        if job is None or str(job.scope) != str(scope):
+            return None
+        return job
+
+    def expire(self):
+        """ 删除完成超过 ttl 秒的任务和文件，包括其他进程创建的任务
+        """
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished and job.finished_at is not None and job.finished_at < deadline
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+                if self._keys.get(job.key) == job.id:
+                    del self._keys[job.key]
+        if self.directory.is_dir():
+            ids = {job.id for job in expired}
+            for meta_path in self.directory.glob("*.json"):
+                job = ExportJob.load(meta_path)
+                if job is None or job.id in ids:
+                    continue
+                if job.finished and job.finished_at is not None and job.finished_at < deadline:
+                    expired.append(job)
+        for job in expired:
+            self.remove_file(job)
+
+    @staticmethod
+    def remove_file(job: ExportJob, meta=True):
+        paths = [job.path, job.meta_path] if meta else [job.path]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -1,11 +1,182 @@
 import datetime
+import inspect
 from django.db import models
-from logging import warn
+import logging
+
+logger = logging.getLogger("revolver_api")
+
+# convert 原样返回的类型，按 type() 精确匹配走快速路径
+PASSTHROUGH_TYPES = frozenset([bool, int, dict, list, str])
+
+
+def convert_value(obj):
+    """ 默认的值转换，与 SerializerModel.convert 结果一致
+
+    Args:
+        obj (_type_): _description_
+
+    Returns:
+        _type_: _description_
+    """
+    if obj is None or type(obj) in PASSTHROUGH_TYPES:
+        return obj
+    if isinstance(obj, (bool, int, dict, list, str)):
+        return obj
+    return obj.__str__()
+
+
+def keep_value(obj):
+    """ 原样返回，交给 ApiJsonResponse 的渲染器处理
+
+    Args:
+        obj (_type_): _description_
+
+    Returns:
+        _type_: _description_
+    """
+    return obj
+
+
+# json_raw_values 为 True 时这些字段原样返回，不转字符串
+RAW_FIELD_TYPES = (
+    models.DateTimeField,
+    models.DateField,
+    models.TimeField,
+    models.DecimalField,
+    models.UUIDField,
+)
+
+
+def field_converter(field, raw=False):
+    """ 根据字段类型选择转换函数
+
+    Args:
+        field (_type_): django 字段
+        raw (bool, optional): 日期、Decimal、UUID 是否原样返回. Defaults to False.
+
+    Returns:
+        _type_: 转换函数
+    """
+    if raw and isinstance(field, RAW_FIELD_TYPES):
+        return keep_value
+    return convert_value
+
+
+class SerializePlan:
+    """ 模型序列化计划
+
+    每个模型类只构建一次，缓存字段列表、外键 id、排除字段和每个字段的转换函数，
+    避免 serialize 时每行都遍历 _meta.get_fields()
+    """
+
+    def __init__(self, instance: "SerializerModel"):
+        cls = type(instance)
+        self.fields = instance.get_fields()
+        self.foreign_fields = instance.foreign_fields()
+        self.exclude_keys = frozenset(instance.exclude_json_keys())
+        # 子类重写了 convert 时，仍然调用实例上的 convert
+        self.native_convert = cls.convert is SerializerModel.convert
+        self.values = [
+            (f.name, field_converter(f, raw=cls.json_raw_values))
+            for f in self.fields
+            if f.name not in self.exclude_keys
+        ]
+        self.foreign_id_keys = [
+            f"{f.name}_id" for f in self.foreign_fields if hasattr(cls, f"{f.name}_id")
+        ]
+        lookup = cls.__name__.lower()
+        self.relations = []
+        for f in self.foreign_fields:
+            # 反向一对多、多对多取到的是 RelatedManager，不需要真的去取
+            is_manager = f.one_to_many or f.many_to_many
+            related_lookup = None
+            prefetch_name = None
+            if f.related_model is not None and hasattr(f.related_model, lookup):
+                related_lookup = lookup
+                # 反向外键正好是 <model>，可以用 prefetch_related 批量加载
+                if f.one_to_many and f.auto_created and f.field.name == lookup:
+                    prefetch_name = f.get_accessor_name()
+            self.relations.append(
+                (
+                    f,
+                    f.name not in self.exclude_keys,
+                    is_manager,
+                    related_lookup,
+                    prefetch_name,
+                )
+            )
+
+
+def limited_related_attr(prefetch_name):
+    """ 限量加载反向关联时 Prefetch 的 to_attr
+
+    Args:
+        prefetch_name (str): 反向关联的 accessor 名称
+
+    Returns:
+        str: _description_
+    """
+    return f"_{prefetch_name}_limited"
+
+
+class FieldSet(frozenset):
+    """ fields= / exclude= 参数解析出的 key 集合
+
+    excluded 不为 None 时是 exclude= 模式：集合中是 serializable_keys 去掉排除项，
+    集合之外的 key（extra_json 的输出）只要没有被排除也保留
+
+    Args:
+        keys (Iterable[str]): _description_
+        excluded (Iterable[str], optional): _description_. Defaults to None.
+    """
+
+    excluded = None
+
+    def __new__(cls, keys=(), excluded=None):
+        obj = super().__new__(cls, keys)
+        obj.excluded = None if excluded is None else frozenset(excluded)
+        return obj
+
+    def allows(self, key) -> bool:
+        return key in self or (self.excluded is not None and key not in self.excluded)
+
+
+def allows_key(fields, key) -> bool:
+    allows = getattr(fields, "allows", None)
+    return allows(key) if allows is not None else key in fields
+
+
+def json_row(obj, fields=None):
+    """ 按 fields 序列化一个对象
+
+    重写了 to_json 且不接受 fields 参数时，先完整序列化再过滤 key
+
+    Args:
+        obj (SerializerModel): _description_
+        fields (Iterable[str], optional): request_fieldset 的结果. Defaults to None.
+
+    Returns:
+        dict: _description_
+    """
+    if fields is None:
+        return obj.to_json()
+    accepts = getattr(type(obj), "to_json_accepts_fields", None)
+    if accepts is not None and accepts():
+        return obj.to_json(fields=fields)
+    return {key: value for key, value in obj.to_json().items() if allows_key(fields, key)}
+
+
+_serialize_plans: dict[type, SerializePlan] = {}
+_relation_lookups: dict[tuple, tuple[list[str], list[str]]] = {}
+_to_json_accepts_fields: dict[type, bool] = {}
 
 
 class SerializerModel(models.Model):
     class Meta:
         abstract = True
+    
+    # 为 True 时 to_json 中的 datetime / Decimal / UUID 不转字符串，由 ApiJsonResponse 的渲染器输出
+    json_raw_values = False
         
     def fillable(self):
         """ 可填充字段
@@ -135,30 +306,44 @@ class SerializerModel(models.Model):
         }.get(key, 999)
 
     def serialize(
-        self, with_foreign=True, with_related=False, related_serializer=False
+        self, with_foreign=True, with_related=False, related_serializer=False, fields=None
     ):
         """遍历所有属性
 
+        Args:
+            fields (Iterable[str], optional): 只遍历这些 key，未选择的字段不会被读取（可以配合 only() 使用）. Defaults to None.
+
         Returns:
             _type_: _description_
         """
-        for field in self.get_fields():
-            key = field.name
-            if hasattr(self, key) and key not in self.exclude_json_keys():
-                res = getattr(self, key)
-                yield key, self.convert(res) if res is not None else None
+        plan = self.serialize_plan(self)
+        convert = None if plan.native_convert else self.convert
+        for key, converter in plan.values:
+            if fields is not None and key not in fields:
+                continue
+            res = getattr(self, key)
+            if res is None:
+                yield key, None
+            else:
+                yield key, converter(res) if convert is None else convert(res)
                 
         # foreign_ids 
-        for field in self.foreign_fields():
-            key = f"{field.name}_id"
-            if hasattr(self, key):
-                res = getattr(self, key)
-                yield key, self.convert(res) if res is not None else None
+        for key in plan.foreign_id_keys:
+            if fields is not None and key not in fields:
+                continue
+            res = getattr(self, key)
+            if res is None:
+                yield key, None
+            else:
+                yield key, convert_value(res) if convert is None else convert(res)
                 
                 
         # print(self.foreignKeys())
-        for field in self.foreign_fields():
-            if hasattr(self, field.name) and with_foreign is True and field.name not in self.exclude_json_keys():
+        prefetched = getattr(self, "_prefetched_objects_cache", None) or {}
+        for field, included, is_manager, related_lookup, prefetch_name in plan.relations:
+            if fields is not None and field.name not in fields and field.name + "_count" not in fields:
+                continue
+            if with_foreign is True and included and hasattr(self, field.name):
                 foreign:SerializerModel = getattr(self, field.name)
                 # print("foreign", fKey.name, foreign)
                 # one to one
@@ -175,16 +360,19 @@ class SerializerModel(models.Model):
                     # 可能是被别的对象引用或者 None ，被别的对象引用的话，这里是一个 RelatedManager 对象,不适合自动处理
                     yield (field.name, None)
             # related one to many
-            if field.related_model is not None and with_related is True:
+            if related_lookup is not None and with_related is True:
                 related:SerializerModel = field.related_model
                 # print(self.__class__.__name__, fKey.name, related.__class__.__name__)
                 arr = []
-                if hasattr(related, self.__class__.__name__.lower()) is False:
-                    continue
-
-                for item in related.objects.filter(
-                    **{self.__class__.__name__.lower(): self}
-                ).all():
+                items = None
+                if prefetch_name is not None:
+                    # 优先使用 Api.related_limit 加载的限量数组，其次是 prefetch 缓存
+                    items = self.__dict__.get(limited_related_attr(prefetch_name))
+                    if items is None:
+                        items = prefetched.get(prefetch_name)
+                if items is None:
+                    items = related.objects.filter(**{related_lookup: self}).all()
+                for item in items:
                     if item is not None and hasattr(item, "sample_to_json"):
                         if related_serializer is True:
                             arr.append(
@@ -197,7 +385,124 @@ class SerializerModel(models.Model):
                             continue
                         arr.append(item.__str__())
                 yield field.name, arr
-                yield field.name + "_count", len(arr)
+                # Api 开启 related_limit 时，数量来自查询集上的 Count 注解
+                count = self.__dict__.get(field.name + "_count")
+                yield field.name + "_count", len(arr) if count is None else count
+
+    @classmethod
+    def serialize_plan(cls, instance=None) -> SerializePlan:
+        """ 获取当前模型类的序列化计划，首次使用时构建
+
+        Args:
+            instance (SerializerModel, optional): 用于构建计划的实例. Defaults to None.
+
+        Returns:
+            SerializePlan: _description_
+        """
+        plan = _serialize_plans.get(cls)
+        if plan is None:
+            plan = _serialize_plans[cls] = SerializePlan(
+                instance if instance is not None else cls()
+            )
+        return plan
+
+    @classmethod
+    def reset_serialize_plan(cls):
+        """ 清除序列化计划缓存，修改了 get_fields / exclude_json_keys 等行为后调用
+        """
+        _serialize_plans.pop(cls, None)
+        _to_json_accepts_fields.pop(cls, None)
+        for key in [k for k in _relation_lookups if k[0] is cls]:
+            del _relation_lookups[key]
+
+    @classmethod
+    def to_json_accepts_fields(cls) -> bool:
+        """ to_json 是否接受 fields 参数，子类重写 to_json(self) 时为 False
+
+        Returns:
+            bool: _description_
+        """
+        accepts = _to_json_accepts_fields.get(cls)
+        if accepts is None:
+            parameters = inspect.signature(cls.to_json).parameters.values()
+            accepts = _to_json_accepts_fields[cls] = any(
+                parameter.name == "fields" or parameter.kind is inspect.Parameter.VAR_KEYWORD
+                for parameter in parameters
+            )
+        return accepts
+
+    @classmethod
+    def has_extra_json(cls) -> bool:
+        """ 是否重写了 extra_json，extra_json 的 key 只有序列化时才知道
+
+        Returns:
+            bool: _description_
+        """
+        return cls.extra_json is not SerializerModel.extra_json
+
+    @classmethod
+    def serializable_keys(cls) -> frozenset:
+        """ serialize 可能输出的全部 key，用于校验 fields / exclude 参数
+
+        Returns:
+            frozenset: _description_
+        """
+        plan = cls.serialize_plan()
+        keys = {key for key, _ in plan.values}
+        keys.update(plan.foreign_id_keys)
+        for field, included, _, related_lookup, _ in plan.relations:
+            if included:
+                keys.add(field.name)
+            if related_lookup is not None:
+                keys.add(field.name)
+                keys.add(field.name + "_count")
+        return frozenset(keys)
+
+    @classmethod
+    def relation_lookups(cls, with_foreign=True, with_related=False, depth=3):
+        """ 根据序列化参数推导 select_related / prefetch_related 查询
+
+        与 serialize 的行为保持一致：with_foreign 时外键对象会继续以
+        with_foreign=True, with_related=True 序列化，所以递归展开，depth 限制展开层数
+
+        Args:
+            with_foreign (bool, optional): _description_. Defaults to True.
+            with_related (bool, optional): _description_. Defaults to False.
+            depth (int, optional): 外键展开层数. Defaults to 3.
+
+        Returns:
+            tuple[list[str], list[str]]: select_related 和 prefetch_related 列表
+        """
+        key = (cls, with_foreign, with_related, depth)
+        lookups = _relation_lookups.get(key)
+        if lookups is None:
+            select, prefetch = [], []
+            cls._collect_relation_lookups(
+                "", with_foreign, with_related, depth, select, prefetch
+            )
+            lookups = _relation_lookups[key] = (select, prefetch)
+        return lookups
+
+    @classmethod
+    def _collect_relation_lookups(
+        cls, prefix, with_foreign, with_related, depth, select, prefetch
+    ):
+        plan = cls.serialize_plan()
+        for field, included, is_manager, related_lookup, prefetch_name in plan.relations:
+            if with_related and prefetch_name is not None:
+                prefetch.append(prefix + prefetch_name)
+            if not with_foreign or not included or is_manager or depth <= 0:
+                continue
+            # 正向外键、一对一以及反向一对一都可以 select_related
+            if not (field.many_to_one or field.one_to_one) or field.related_model is None:
+                continue
+            if not field.concrete and not field.one_to_one:
+                continue
+            select.append(prefix + field.name)
+            if issubclass(field.related_model, SerializerModel):
+                field.related_model._collect_relation_lookups(
+                    prefix + field.name + "__", True, True, depth - 1, select, prefetch
+                )
 
     def extra_json(self):
         return {}
@@ -217,9 +522,14 @@ class SerializerModel(models.Model):
         with_related=True,
         related_serializer=False,
         merge_force=False,
+        fields=None,
     ):
         """转换为json
 
+        Args:
+            fields (Iterable[str], optional): 只输出这些 key，None 表示全部；FieldSet 的 exclude 模式下
+                保留未被排除的 extra_json key. Defaults to None.
+
         Returns:
             _type_: _description_
         """
@@ -229,6 +539,7 @@ class SerializerModel(models.Model):
                 with_foreign=with_foreign,
                 with_related=with_related,
                 related_serializer=related_serializer,
+                fields=fields,
             )
         }
 
@@ -240,7 +551,10 @@ class SerializerModel(models.Model):
                 if result.get(key) is None:
                     result[key] = value
                 else:
-                    warn("key %s is exists" % key)
+                    logger.warning("key %s is exists", key)
+        
+        if fields is not None:
+            result = {key: value for key, value in result.items() if allows_key(fields, key)}
                 
         return result
     
@@ -253,12 +567,14 @@ class SerializerModel(models.Model):
         Returns:
             _type_: _description_
         """
-        # foreign_id is "" set to None
-        for field in self.foreign_fields():
-            key = f"{field.name}_id"
-            if hasattr(self, key):
-                res = getattr(self, key)
-                if res == "":
-                    setattr(self, key, None)
+        self.clean_foreign_ids()
         super().save(*args, **kwargs)
 
+    def clean_foreign_ids(self):
+        """ 外键 id 为空字符串时设置为 None，bulk_create / bulk_update 不会调用 save，需要单独调用
+        """
+        # foreign_id is "" set to None
+        for key in self.serialize_plan(self).foreign_id_keys:
+            if getattr(self, key) == "":
+                setattr(self, key, None)
+
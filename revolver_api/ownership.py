@@ -0,0 +1,83 @@
+from django.contrib.auth.models import AbstractUser
+
+
+class Ownership:
+    """ 模型的数据归属信息：哪个关联字段指向用户模型
+
+    Args:
+        field_name (str | None): 按用户查询时使用的字段名，None 表示模型不属于用户
+        user_model (type, optional): 用户模型. Defaults to None.
+        assignable (bool, optional): 是否可以直接给该字段赋值（正向外键）. Defaults to False.
+    """
+
+    def __init__(self, field_name=None, user_model=None, assignable=False):
+        self.field_name = field_name
+        self.user_model = user_model
+        self.assignable = assignable
+
+    @property
+    def enabled(self):
+        return self.field_name is not None
+
+    def __repr__(self):
+        if not self.enabled:
+            return "<Ownership disabled>"
+        return "<Ownership %s -> %s>" % (self.field_name, self.user_model.__name__)
+
+
+def resolve_ownership(model, user_field="user") -> Ownership:
+    """ 找出模型中指向用户模型的关联字段
+
+    优先使用名称为 user_field 的字段，其次是正向外键，最后是其他关联
+
+    Args:
+        model (_type_): django 模型
+        user_field (str, optional): 期望的字段名. Defaults to "user".
+
+    Returns:
+        Ownership: _description_
+    """
+    candidates = [
+        f
+        for f in model._meta.get_fields()
+        if f.is_relation
+        and isinstance(f.related_model, type)
+        and issubclass(f.related_model, AbstractUser)
+    ]
+    if not candidates:
+        return Ownership()
+    field = next((f for f in candidates if f.name == user_field), None)
+    if field is None:
+        field = next((f for f in candidates if f.concrete), candidates[0])
+    return Ownership(
+        field_name=field.name,
+        user_model=field.related_model,
+        assignable=bool(field.concrete and (field.many_to_one or field.one_to_one)),
+    )
+
+
+class OwnershipDescriptor:
+    """ Api 子类的 Ownership，每个子类只解析一次，类和实例上都可以访问
+
+    例如 BookApi.ownership
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def __get__(self, instance, owner):
+        ownership = self.cache.get(owner)
+        if ownership is None:
+            ownership = self.cache[owner] = resolve_ownership(owner.model, owner.user_field)
+        return ownership
+
+    def reset(self, owner=None):
+        """ 清除缓存，修改 user_field 后调用
+
+        Args:
+            owner (type, optional): Api 子类，None 表示全部. Defaults to None.
+        """
+        if owner is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(owner, None)
@@ -0,0 +1,272 @@
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.db import connections, models
+
+# 每页最多条数，Api.max_page_size 的默认值
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: list) -> str:
+    """ 把排序字段的值编码为游标
+
+    Args:
+        values (list): 排序字段的值，顺序与 ordering_keys 一致
+
+    Returns:
+        str: url 安全的 base64 字符串
+    """
+    def default(obj):
+        if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+            return obj.isoformat()
+        if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+            return str(obj)
+        raise TypeError("不支持的游标值 %r" % obj)
+
+    raw = json.dumps(values, default=default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """ 解码游标
+
+    Args:
+        cursor (str): _description_
+
+    Raises:
+        ValueError: 游标格式错误
+
+    Returns:
+        list: _description_
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError("cursor 格式错误")
+    if not isinstance(values, list):
+        raise ValueError("cursor 格式错误")
+    return values
+
+
+def ordering_keys(query: models.QuerySet) -> list[tuple[models.Field, bool]]:
+    """ 当前查询集的排序字段，最后追加主键保证顺序唯一
+
+    Args:
+        query (models.QuerySet): _description_
+
+    Raises:
+        ValueError: 排序中包含表达式、跨表字段或可为空的字段（NULL 无法用 > / < 比较，
+            不同数据库 NULL 的排序位置也不同，这些行会在翻页时丢失）
+
+    Returns:
+        list[tuple[models.Field, bool]]: (字段, 是否倒序)
+    """
+    meta = query.model._meta
+    ordering = query.query.order_by or meta.ordering or []
+    keys = []
+    for item in ordering:
+        if not isinstance(item, str) or item == "?":
+            raise ValueError("cursor 分页只支持按模型字段排序")
+        desc = item.startswith("-")
+        name = item.lstrip("-+")
+        try:
+            field = meta.pk if name == "pk" else meta.get_field(name)
+        except Exception:
+            raise ValueError("cursor 分页不支持排序字段 %s" % name)
+        if not field.concrete or field.is_relation and not field.many_to_one:
+            raise ValueError("cursor 分页不支持排序字段 %s" % name)
+        if field.null:
+            raise ValueError("cursor 分页不支持可为空的排序字段 %s" % name)
+        keys.append((field, desc))
+        if field.primary_key:
+            return keys
+    keys.append((meta.pk, keys[-1][1] if keys else False))
+    return keys
+
+
+def keyset_filter(keys: list[tuple[models.Field, bool]], values: list) -> models.Q:
+    """ 生成“排在游标之后”的查询条件
+
+    (k1 > v1) or (k1 = v1 and k2 > v2) or ...，倒序字段使用 <
+
+    Args:
+        keys (list[tuple[models.Field, bool]]): ordering_keys 的结果
+        values (list): decode_cursor 的结果
+
+    Raises:
+        ValueError: 游标与排序字段不匹配
+
+    Returns:
+        models.Q: _description_
+    """
+    if len(keys) != len(values):
+        raise ValueError("cursor 与当前排序不匹配")
+    values = [field.to_python(value) for (field, _), value in zip(keys, values)]
+    condition = models.Q()
+    equal = {}
+    for (field, desc), value in zip(keys, values):
+        if value is None:
+            raise ValueError("cursor 分页不支持排序字段 %s 为空" % field.name)
+        lookup = "%s__%s" % (field.attname, "lt" if desc else "gt")
+        condition |= models.Q(**equal, **{lookup: value})
+        equal[field.attname] = value
+    return condition
+
+
+def cursor_page(query: models.QuerySet, cursor: str, size: int, max_size=MAX_PAGE_SIZE):
+    """ 游标分页，每页都只是一次带索引条件的 LIMIT 查询，与翻到第几页无关
+
+    Args:
+        query (models.QuerySet): 已排序的查询集
+        cursor (str): 上一页返回的 next_cursor，空字符串表示第一页
+        size (int): 每页条数，小于 1 时按 1 处理，超过 max_size 时按 max_size 处理
+        max_size (int, optional): 每页最多条数，None 表示不限制. Defaults to MAX_PAGE_SIZE.
+
+    Raises:
+        ValueError: 游标错误或排序不支持游标分页
+
+    Returns:
+        tuple[list, str | None]: 当前页数据和下一页的游标
+    """
+    size = max(int(size), 1)
+    if max_size is not None:
+        size = min(size, max_size)
+    keys = ordering_keys(query)
+    query = query.order_by(*[("-" if desc else "") + field.attname for field, desc in keys])
+    if cursor:
+        query = query.filter(keyset_filter(keys, decode_cursor(cursor)))
+    rows = list(query[: size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, field.attname) for field, _ in keys])
+
+
+# 分页时不参与统计条件的参数
+PAGINATION_PARAMS = ("page", "size", "cursor", "order_by")
+
+
+class CountStrategy:
+    """ 列表总数统计策略，设置在 Api.count_strategy 上
+
+    has_more 为 True 时列表不统计总数，而是多取一条判断是否还有下一页
+    """
+
+    has_more = False
+
+    def count(self, api, request, query: models.QuerySet):
+        return query.count()
+
+    async def acount(self, api, request, query: models.QuerySet):
+        return await sync_to_async(self.count)(api, request, query)
+
+
+class ExactCount(CountStrategy):
+    """ 每次都执行 COUNT，默认策略
+    """
+
+    async def acount(self, api, request, query: models.QuerySet):
+        return await query.acount()
+
+
+class HasMoreCount(CountStrategy):
+    """ 不统计总数，取 size+1 条判断 has_more
+    """
+
+    has_more = True
+
+    def count(self, api, request, query: models.QuerySet):
+        return None
+
+    async def acount(self, api, request, query: models.QuerySet):
+        return None
+
+
+class CachedCount(CountStrategy):
+    """ 使用 django cache 缓存总数，键由 Api 类、模型、查询参数和用户范围组成
+
+    不同 Api 类的 defaultQuery / 归属范围可能不同，即使模型相同也不共用总数
+
+    Args:
+        ttl (int, optional): 缓存秒数. Defaults to 60.
+        cache_alias (str, optional): django cache 名称. Defaults to "default".
+    """
+
+    def __init__(self, ttl=60, cache_alias="default"):
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+
+    def cache_key(self, api, request, query: models.QuerySet):
+        params = sorted(
+            (key, value)
+            for key, values in request.GET.lists()
+            if key not in PAGINATION_PARAMS
+            for value in values
+        )
+        user = getattr(request, "user", None)
+        scope = (
+            getattr(user, "pk", None),
+            bool(getattr(user, "is_superuser", False)),
+        )
+        raw = json.dumps([type(api).__module__, type(api).__qualname__, query.model._meta.label, params, scope])
+        return "revolver_api:count:" + hashlib.md5(raw.encode()).hexdigest()
+
+    def count(self, api, request, query: models.QuerySet):
+        from django.core.cache import caches
+
+        cache = caches[self.cache_alias]
+        key = self.cache_key(api, request, query)
+        total = cache.get(key)
+        if total is None:
+            total = query.count()
+            cache.set(key, total, self.ttl)
+        return total
+
+
+class EstimatedCount(CountStrategy):
+    """ 无过滤条件时使用数据库统计信息估算总数（PostgreSQL / MySQL），
+    有过滤条件或其他数据库时交给 fallback
+
+    Args:
+        fallback (CountStrategy, optional): _description_. Defaults to ExactCount().
+    """
+
+    def __init__(self, fallback: CountStrategy = None):
+        self.fallback = fallback or ExactCount()
+
+    def estimate(self, query: models.QuerySet):
+        connection = connections[query.db]
+        table = query.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [connection.ops.quote_name(table)],
+                )
+            elif connection.vendor == "mysql":
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s",
+                    [table],
+                )
+            else:
+                return None
+            row = cursor.fetchone()
+        # reltuples 为 -1 表示表还没有被 ANALYZE
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def count(self, api, request, query: models.QuerySet):
+        if not query.query.where:
+            total = self.estimate(query)
+            if total is not None:
+                return total
+        return self.fallback.count(api, request, query)
@@ -0,0 +1,247 @@
+import multiprocessing
+import os
+import pickle
+import threading
+from collections import deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from django.db import connections, models
+
+from .model import json_row
+
+# 按进程数缓存的进程池，所有导出共用，避免每次导出都启动新进程并重新加载 django
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def init_worker(settings_module: str):
+    """ 进程池初始化：spawn 出的新进程需要重新加载 django，数据库连接在进程中单独建立
+
+    Args:
+        settings_module (str): DJANGO_SETTINGS_MODULE
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def process_executor(workers: int):
+    """ spawn 方式的进程池，没有 DJANGO_SETTINGS_MODULE（settings.configure）时无法在子进程中加载 django
+
+    进程数不超过 CPU 核数，只有一个核时不创建；相同进程数的进程池只创建一次，之后的导出复用
+
+    Args:
+        workers (int): _description_
+
+    Returns:
+        ProcessPoolExecutor | None: _description_
+    """
+    settings_module = os.environ.get("DJANGO_SETTINGS_MODULE")
+    workers = min(workers, os.cpu_count() or 1)
+    if not settings_module or workers < 2:
+        return None
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(settings_module,),
+            )
+    return executor
+
+
+def discard_executor(executor):
+    """ 进程池损坏（子进程被杀死等）时丢弃，下次导出重新创建
+
+    Args:
+        executor (Executor): _description_
+    """
+    with _executors_lock:
+        for workers, cached in list(_executors.items()):
+            if cached is executor:
+                del _executors[workers]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def pk_order(query: models.QuerySet):
+    """ 查询按主键排序时返回 "pk" 或 "-pk"，分块并行只在这时保持原有顺序
+
+    Args:
+        query (models.QuerySet): _description_
+
+    Returns:
+        str | None: 已切片或不是按主键排序时为 None
+    """
+    if query.query.is_sliced:
+        return None
+    order_by = query.query.order_by
+    if len(order_by) != 1 or not isinstance(order_by[0], str):
+        return None
+    pk = query.model._meta.pk
+    name = order_by[0]
+    descending = name.startswith("-")
+    if name.lstrip("-") not in ("pk", pk.name, pk.attname):
+        return None
+    return "-pk" if descending else "pk"
+
+
+def pk_ranges(query: models.QuerySet, step: int, order="pk"):
+    """ 按实际的主键分块，每块 step 行；边界在使用时才逐块查询（每次按主键索引跳过 step 行），
+    主键稀疏或很大时也不会产生空的分块
+
+    Args:
+        query (models.QuerySet): _description_
+        step (int): 每块的行数
+        order (str, optional): "-pk" 时从大到小返回分块. Defaults to "pk".
+
+    Raises:
+        ValueError: step 不是正数
+
+    Returns:
+        Iterator[tuple[int | None, int | None]] | None: [low, high) 的迭代器，None 表示不限制；主键不是整数时为 None
+    """
+    if step <= 0:
+        raise ValueError("step 必须大于 0")
+    if not isinstance(query.model._meta.pk, (models.AutoField, models.BigAutoField, models.IntegerField)):
+        return None
+    pks = query.prefetch_related(None).order_by(order).values_list("pk", flat=True)
+    if order == "-pk":
+        return descending_ranges(pks, step)
+    return ascending_ranges(pks, step)
+
+
+def ascending_ranges(pks: models.QuerySet, step: int):
+    low = None
+    while True:
+        # 下一块的第一个主键
+        chunk = pks if low is None else pks.filter(pk__gte=low)
+        boundary = list(chunk[step:step + 1])
+        if not boundary:
+            yield low, None
+            return
+        yield low, boundary[0]
+        low = boundary[0]
+
+
+def descending_ranges(pks: models.QuerySet, step: int):
+    high = None
+    while True:
+        # 下一块的第一个（最大的）主键，主键是整数，加 1 作为本块的下界
+        chunk = pks if high is None else pks.filter(pk__lt=high)
+        boundary = list(chunk[step:step + 1])
+        if not boundary:
+            yield None, high
+            return
+        yield boundary[0] + 1, high
+        high = boundary[0] + 1
+
+
+def format_chunk(task):
+    """ 在子进程中查询一个主键范围并格式化为行数据
+
+    Args:
+        task (tuple): chunk_tasks 生成的任务
+
+    Returns:
+        list: csv 为 to_json 的字典，xls 为单元格列表
+    """
+    from django.apps import apps
+
+    label, raw_query, prefetch, order, low, high, fieldset, xls_fields, chunk_size = task
+    model = apps.get_model(label)
+    query = model._default_manager.all()
+    query.query = pickle.loads(raw_query)
+    if low is not None:
+        query = query.filter(pk__gte=low)
+    if high is not None:
+        query = query.filter(pk__lt=high)
+    query = query.order_by(order)
+    if prefetch:
+        query = query.prefetch_related(*prefetch)
+    rows = []
+    try:
+        for obj in query.iterator(chunk_size=chunk_size):
+            row = json_row(obj, fieldset)
+            if xls_fields is not None:
+                row = [obj.to_xls_format(row, field) for field in xls_fields]
+            rows.append(row)
+    finally:
+        connections.close_all()
+    return rows
+
+
+def chunk_tasks(query: models.QuerySet, ranges: list, fieldset=None, xls_fields=None, chunk_size=2000, order="pk"):
+    """ 每个主键范围一个可 pickle 的任务：模型 label、pickle 后的 query、prefetch_related、排序、范围和输出字段
+
+    Args:
+        query (models.QuerySet): 未切片、按主键排序的查询
+        ranges (Iterable): pk_ranges 的结果
+        fieldset (FieldSet, optional): _description_. Defaults to None.
+        xls_fields (list, optional): _description_. Defaults to None.
+        chunk_size (int, optional): _description_. Defaults to 2000.
+        order (str, optional): "pk" / "-pk". Defaults to "pk".
+
+    Returns:
+        Iterator[tuple]: _description_
+    """
+    raw_query = pickle.dumps(query.query)
+    prefetch = tuple(query._prefetch_related_lookups)
+    label = query.model._meta.label
+    return (
+        (label, raw_query, prefetch, order, low, high, fieldset, xls_fields, chunk_size)
+        for low, high in ranges
+    )
+
+
+def ordered_map(executor, func, tasks, window: int):
+    """ 按提交顺序返回结果，同时最多 window 个任务在执行或等待读取；提前结束时取消未开始的任务
+
+    Args:
+        executor (Executor): _description_
+        func (Callable): _description_
+        tasks (Iterable): _description_
+        window (int): _description_
+
+    Yields:
+        Any: _description_
+    """
+    pending = deque()
+    tasks = iter(tasks)
+    try:
+        for task in tasks:
+            pending.append(executor.submit(func, task))
+            if len(pending) >= window:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for task in tasks:
+                pending.append(executor.submit(func, task))
+                break
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def parallel_rows(tasks, executor, window: int):
+    """ 多进程格式化导出数据，按任务顺序合并；进程池由所有导出共用，结束后不关闭
+
+    Args:
+        tasks (Iterable[tuple]): chunk_tasks 的结果
+        executor (Executor): _description_
+        window (int): 同时提交的任务数
+
+    Yields:
+        dict | list: 行数据
+    """
+    try:
+        for rows in ordered_map(executor, format_chunk, tasks, window):
+            yield from rows
+    except BrokenExecutor:
+        discard_executor(executor)
+        raise
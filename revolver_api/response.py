@@ -1,7 +1,83 @@
 import enum
+import json
+from django.core.serializers.json import DjangoJSONEncoder
 from django.http import JsonResponse
 
 
+class JsonRenderer:
+    """ ApiJsonResponse 的 json 渲染器，datetime / Decimal / UUID 等类型由渲染器处理
+    """
+
+    def render(self, data) -> bytes:
+        raise NotImplementedError
+
+
+class StdlibJsonRenderer(JsonRenderer):
+    """ 标准库 json，indent 为 None 时输出紧凑格式
+
+    Args:
+        indent (int, optional): _description_. Defaults to None.
+    """
+
+    def __init__(self, indent=None):
+        self.indent = indent
+        self.separators = (",", ":") if indent is None else None
+
+    def render(self, data) -> bytes:
+        return json.dumps(
+            data,
+            cls=DjangoJSONEncoder,
+            ensure_ascii=False,
+            indent=self.indent,
+            separators=self.separators,
+        ).encode("utf-8")
+
+
+class OrjsonRenderer(JsonRenderer):
+    """ orjson 渲染器，需要安装 orjson
+
+    Args:
+        indent (bool, optional): 是否缩进. Defaults to False.
+    """
+
+    def __init__(self, indent=False):
+        import orjson
+
+        self.orjson = orjson
+        self.option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            self.option |= orjson.OPT_INDENT_2
+
+    @staticmethod
+    def default(obj):
+        return DjangoJSONEncoder().default(obj)
+
+    def render(self, data) -> bytes:
+        return self.orjson.dumps(data, default=self.default, option=self.option)
+
+
+_default_renderers = {}
+
+
+def default_renderer() -> JsonRenderer:
+    """ 默认渲染器：安装了 orjson 时使用 orjson，DEBUG 下缩进输出，否则紧凑输出
+
+    Returns:
+        JsonRenderer: _description_
+    """
+    from django.conf import settings
+
+    pretty = bool(settings.DEBUG)
+    renderer = _default_renderers.get(pretty)
+    if renderer is None:
+        try:
+            renderer = OrjsonRenderer(indent=pretty)
+        except ImportError:
+            renderer = StdlibJsonRenderer(indent=4 if pretty else None)
+        _default_renderers[pretty] = renderer
+    return renderer
+
+
 
             
             
@@ -11,6 +87,8 @@ class ApiErrorCode(enum.Enum):
     AUTH_ERROR = 401, "认证失败"
     AUTH_EXPIRED = 402, "认证过期"
     NOT_FOUND = 404, "资源不存在"
+    METHOD_NOT_ALLOWED = 405, "不支持的请求方法"
+    UNSUPPORTED_MEDIA_TYPE = 415, "不支持的请求体类型"
     
     USER_NOT_EXIST = 1001, "用户不存在"
     USER_EXIST = 1002, "用户已存在"
@@ -22,15 +100,19 @@ class ApiErrorCode(enum.Enum):
     TOKEN_INVALID = 1007, "token无效"
 
 class ApiJsonResponse(JsonResponse):
-    def __init__(self, data, message="", code=ApiErrorCode.SUCCESS,httpCode=200, **kwargs):
-        super().__init__(
-            {
+    # 渲染器，None 时使用 default_renderer()
+    renderer: JsonRenderer = None
+    
+    def __init__(self, data, message="", code=ApiErrorCode.SUCCESS,httpCode=200, renderer: JsonRenderer = None, **kwargs):
+        renderer = renderer or self.renderer or default_renderer()
+        kwargs.setdefault("content_type", "application/json")
+        # 跳过 JsonResponse 自己的 json.dumps，由渲染器输出
+        super(JsonResponse, self).__init__(
+            content=renderer.render({
                 "message": message or code.value[1], 
                 "code": code.value[0], 
                 "data": data
-            },
-            safe=False,
-            json_dumps_params={"ensure_ascii": False, "indent": 4},
+            }),
             **kwargs,
         )
         self["Access-Control-Allow-Origin"] = "*"
@@ -1,63 +1,257 @@
 from functools import wraps
 import inspect
+import logging
 from os import environ
+import re
+import time
+from types import MappingProxyType, MethodType
+import uuid
+from contextlib import nullcontext
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.http import HttpRequest
+from django.http.response import HttpResponseBase
 from django.urls import re_path
 
-from revolver_api.revolver_api.model import SerializerModel
+from .model import SerializerModel
 from .utils.get_request_args import  get_instance_from_args_or_kwargs
 from .response import ApiErrorCode, ApiJsonResponse
+from .utils.queries import count_queries, install as install_query_counter
+from .utils.timing import add_server_timing, record_timing
+
+logger = logging.getLogger("revolver_api")
+
+
+# 路径参数转换器，写法与 django path 一致，例如 users/<int:id>
+PATH_CONVERTERS = {
+    "str": ("[^/]+", str),
+    "int": ("[0-9]+", int),
+    "slug": ("[-a-zA-Z0-9_]+", str),
+    "path": (".+", str),
+    "uuid": ("[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", uuid.UUID),
+}
+PATH_PARAM_RE = re.compile(r"<(?:(?P<converter>[^>:]+):)?(?P<name>[^>]+)>")
+# 未指定请求方法的路由
+ANY_METHOD = "*"
+
+
+def compile_path(url: str):
+    """ 把带参数的路由编译为正则
+
+    Args:
+        url (str): _description_
+
+    Raises:
+        ValueError: 未知的转换器
+
+    Returns:
+        tuple[re.Pattern, dict]: 正则和各参数的转换函数
+    """
+    pattern, converters, last = "^", {}, 0
+    for match in PATH_PARAM_RE.finditer(url):
+        converter = match.group("converter") or "str"
+        if converter not in PATH_CONVERTERS:
+            raise ValueError("未知的路由参数类型 %s" % converter)
+        regex, to_python = PATH_CONVERTERS[converter]
+        name = match.group("name")
+        pattern += re.escape(url[last:match.start()]) + "(?P<%s>%s)" % (name, regex)
+        converters[name] = to_python
+        last = match.end()
+    pattern += re.escape(url[last:]) + "$"
+    return re.compile(pattern), converters
+
+
+class DispatchTable:
+    """ Router 冻结后的路由表，不可变
+
+    静态路由按 (method, path) 直接查字典，带参数的路由按第一段路径分组后再匹配正则
+    """
+
+    def __init__(self, entries):
+        static = {}
+        static_methods = {}
+        dynamic = {}
+        for method, url, func in entries:
+            if PATH_PARAM_RE.search(url) is None:
+                static[(method, url)] = func
+                static_methods.setdefault(url, set()).add(method)
+                continue
+            head = url.split("/", 1)[0]
+            bucket = head if PATH_PARAM_RE.search(head) is None else None
+            group = dynamic.setdefault(bucket, {})
+            if url not in group:
+                group[url] = (*compile_path(url), {})
+            group[url][2][method] = func
+        self.static = MappingProxyType(static)
+        self.static_methods = MappingProxyType(
+            {url: frozenset(methods) for url, methods in static_methods.items()}
+        )
+        self.dynamic = MappingProxyType(
+            {
+                bucket: tuple(
+                    (regex, converters, MappingProxyType(funcs))
+                    for regex, converters, funcs in group.values()
+                )
+                for bucket, group in dynamic.items()
+            }
+        )
+
+    def resolve(self, method: str, path: str):
+        """ 查找路由
+
+        Args:
+            method (str): 请求方法
+            path (str): 路径
+
+        Returns:
+            tuple: (处理函数, 路径参数, 允许的方法)，未找到路径时处理函数和允许的方法都为 None
+        """
+        # 静态路径存在但方法不对时，继续查找同样匹配该路径的带参数路由，都不支持时才返回 405
+        allowed = self.static_methods.get(path)
+        if allowed is not None:
+            func = self._pick(self.static, method, path, allowed)
+            if func is not None:
+                return func, {}, allowed
+        for bucket in (path.split("/", 1)[0], None):
+            for regex, converters, funcs in self.dynamic.get(bucket, ()):
+                match = regex.match(path)
+                if match is None:
+                    continue
+                func = self._pick(funcs, method, None, funcs.keys())
+                if func is None:
+                    # 后面的路由可能支持该方法，都不支持时才返回 405
+                    allowed = (allowed or frozenset()) | frozenset(funcs.keys())
+                    continue
+                try:
+                    kwargs = {
+                        name: converters[name](value)
+                        for name, value in match.groupdict().items()
+                    }
+                except ValueError:
+                    continue
+                return func, kwargs, frozenset(funcs.keys())
+        return None, {}, allowed
+
+    @staticmethod
+    def _pick(funcs, method, path, methods):
+        for candidate in (method, "GET" if method == "HEAD" else None, ANY_METHOD):
+            if candidate is not None and candidate in methods:
+                return funcs[(candidate, path)] if path is not None else funcs[candidate]
+        return None
 
 
 def valid_method_middlewares(method="GET"):
     def middleware(request:HttpRequest):
-        print("valid_method_middlewares",request.method)
-        if request.method == method:
+        logger.debug("valid_method_middlewares %s", request.method)
+        # HEAD 由 GET 路由处理
+        if request.method == method or (method == "GET" and request.method == "HEAD"):
             return True
         else:
             raise Exception("不支持的请求方法")
     return middleware
 
 
+class shared_or_bound:
+    """ 在实例上调用时使用该实例的路由表；在类上调用时（旧写法 Router.handler(request, path)）
+    使用 Router.shared()，其中包含所有 Router 注册的路由
+    """
+
+    def __init__(self, func):
+        self.func = func
+        wraps(func)(self)
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            obj = cls.shared()
+        return MethodType(self.func, obj)
+
+
 class Router():
     """_summary_
     """
+    # 是否返回 Server-Timing 响应头（中间件 / 处理函数 / 序列化耗时），None 时跟随 settings.DEBUG
+    # 响应头会暴露处理函数名，生产环境不要开启
+    server_timing = None
+    # 是否统计每个请求的数据库查询并返回 X-DB-Queries / X-DB-Time 响应头，None 时跟随 settings.DEBUG
+    query_debug = None
+    # 同一条 SQL 在一个请求中执行的次数达到该值时视为 N+1 查询，记录警告
+    n_plus_one_threshold = 5
+    # 所有 Router 注册的路由，供 Router.shared() 使用
+    _registry = []
+    _shared = None
+    
     def __init__(self,baseUrl="api/") -> None:
         self.baseUrl = baseUrl
-    
-    routes = []
-    routeMap = {}
+        self.routes = []
+        self.routeMap = {}
+        self._entries = []
+        self._dispatch = None
     
     def route(self,url, middlewares=[],name_suffix="",
                 exception_json=True,
-                description=""
+                description="",
+                method=None,
         ):
         """_summary_
 
         Args:
-            url (_type_): _description_
+            url (_type_): 路由，可以带参数，例如 users/<int:id>
             middlewares (list, optional): _description_. Defaults to [].
+            method (str, optional): 请求方法，None 表示不限制. Defaults to None.
         """
+        middlewares = tuple(middlewares)
         def decorator(func):
             
-            @wraps(func)
-            def inner(*args, **kwargs):
-                request = get_instance_from_args_or_kwargs(HttpRequest, args, kwargs)
-                for middleware in middlewares:
-                    print("midd:",middleware.__name__)
-                    try:
-                        next = middleware(request)
-                        if next:
-                            return func(*args, **kwargs)
-                    except Exception as e:
-                        if environ.get("DEBUG") == "True":
-                            raise e
-                        if not exception_json:
-                            raise e
-                        return ApiJsonResponse.error(ApiErrorCode.ERROR,str(e),{
-                            "file": inspect.getsourcefile(func),
-                            "line": str(func.__code__.co_firstlineno),
-                        })
+            def error_response(e):
+                if environ.get("DEBUG") == "True":
+                    raise e
+                if not exception_json:
+                    raise e
+                return ApiJsonResponse.error(ApiErrorCode.ERROR,str(e),{
+                    "file": inspect.getsourcefile(func),
+                    "line": str(func.__code__.co_firstlineno),
+                })
+            
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def inner(*args, **kwargs):
+                    request = get_instance_from_args_or_kwargs(HttpRequest, args, kwargs)
+                    start = time.perf_counter()
+                    for middleware in middlewares:
+                        logger.debug("midd: %s", middleware.__name__)
+                        try:
+                            next = middleware(request)
+                            if inspect.isawaitable(next):
+                                next = await next
+                            if next:
+                                handler_start = time.perf_counter()
+                                record_timing(request, "mw", handler_start - start, "middlewares")
+                                with self.query_counter() as counter:
+                                    response = await func(*args, **kwargs)
+                                record_timing(request, "handler", time.perf_counter() - handler_start, func.__name__)
+                                self.with_query_stats(request, response, counter, url)
+                                return self.with_server_timing(request, response)
+                        except Exception as e:
+                            return error_response(e)
+            else:
+                @wraps(func)
+                def inner(*args, **kwargs):
+                    request = get_instance_from_args_or_kwargs(HttpRequest, args, kwargs)
+                    start = time.perf_counter()
+                    for middleware in middlewares:
+                        logger.debug("midd: %s", middleware.__name__)
+                        try:
+                            next = middleware(request)
+                            if next:
+                                handler_start = time.perf_counter()
+                                record_timing(request, "mw", handler_start - start, "middlewares")
+                                with self.query_counter() as counter:
+                                    response = func(*args, **kwargs)
+                                record_timing(request, "handler", time.perf_counter() - handler_start, func.__name__)
+                                self.with_query_stats(request, response, counter, url)
+                                return self.with_server_timing(request, response)
+                        except Exception as e:
+                            return error_response(e)
                     
             # self.urls.append(path(url, inner, name=func.__name__ + name_suffix))
             file = inspect.getsourcefile(func)
@@ -69,26 +263,89 @@ class Router():
             }
             self.routes.append({
                 "url": "/" + url,
+                "method": method or ANY_METHOD,
                 "name": func.__name__ + name_suffix,
                 "description": description,
                 "file": "vscode://file/" + file + ":" + str(func.__code__.co_firstlineno),
             })
+            self._entries.append((method or ANY_METHOD, url, inner))
+            self._dispatch = None
+            if self._entries is not Router._registry:
+                Router._registry.append((method or ANY_METHOD, url, inner))
+            if Router._shared is not None:
+                Router._shared._dispatch = None
             return inner
             
         return decorator
     
+    def with_server_timing(self,request: HttpRequest,response):
+        """ 把请求中记录的各阶段耗时写入 Server-Timing 响应头
+
+        Args:
+            request (HttpRequest): _description_
+            response (HttpResponse): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        if self.server_timing_enabled:
+            add_server_timing(request, response)
+        return response
+    
+    def query_counter(self):
+        """ 开启查询统计时返回 count_queries()，否则不统计
+
+        Returns:
+            _type_: _description_
+        """
+        return count_queries() if self.query_debug_enabled else nullcontext()
+    
+    @property
+    def server_timing_enabled(self):
+        return settings.DEBUG if self.server_timing is None else self.server_timing
+    
+    @property
+    def query_debug_enabled(self):
+        return settings.DEBUG if self.query_debug is None else self.query_debug
+    
+    def with_query_stats(self,request: HttpRequest,response,counter,url: str):
+        """ 写入查询次数 / 数据库耗时响应头，重复的 SQL 记录为 N+1 警告
+
+        Args:
+            request (HttpRequest): _description_
+            response (HttpResponse): _description_
+            counter (QueryCounter | None): _description_
+            url (str): 路由
+
+        Returns:
+            _type_: _description_
+        """
+        if counter is None:
+            return response
+        record_timing(request, "db", counter.time, "%d queries" % counter.count)
+        if not isinstance(response, HttpResponseBase):
+            return response
+        response["X-DB-Queries"] = str(counter.count)
+        response["X-DB-Time"] = "%.2f" % (counter.time * 1000)
+        repeated = counter.repeated(self.n_plus_one_threshold)
+        if repeated:
+            response["X-DB-Repeated-Queries"] = str(len(repeated))
+            for sql, times in repeated:
+                logger.warning("N+1 查询：%s 中以下 SQL 执行了 %d 次：%s", url, times, sql)
+        return response
+    
     def get(self,url,middlewares=[],**kwargs):
         # TODO：合并 middlewares
-        return self.route(url,middlewares=[valid_method_middlewares("GET"),*middlewares] ,name_suffix="_get",**kwargs)
+        return self.route(url,middlewares=[valid_method_middlewares("GET"),*middlewares] ,name_suffix="_get",method="GET",**kwargs)
 
     def post(self,url,middlewares=[],**kwargs):
-        return self.route(url,middlewares=[valid_method_middlewares("POST")] + middlewares,name_suffix="_post",**kwargs)
+        return self.route(url,middlewares=[valid_method_middlewares("POST")] + middlewares,name_suffix="_post",method="POST",**kwargs)
     
     def put(self,url,middlewares=[],**kwargs):
-        return self.route(url,middlewares=[valid_method_middlewares("PUT")] + middlewares,name_suffix="_put",**kwargs)
+        return self.route(url,middlewares=[valid_method_middlewares("PUT")] + middlewares,name_suffix="_put",method="PUT",**kwargs)
     
     def delete(self,url,middlewares=[],**kwargs):
-        return self.route(url,middlewares=[valid_method_middlewares("DELETE")] + middlewares,name_suffix="_delete",**kwargs)
+        return self.route(url,middlewares=[valid_method_middlewares("DELETE")] + middlewares,name_suffix="_delete",method="DELETE",**kwargs)
     
     def resource(self,baseUrl,middlewares=[],**kwargs):
         def wrapper(obj):
@@ -98,23 +355,110 @@ class Router():
                 o.register(self,baseUrl,middlewares=middlewares,**kwargs)
         return wrapper
     
+    @property
+    def is_async(self):
+        """ 是否注册了 async 路由，是的话 urls 使用 ahandler
+
+        Returns:
+            bool: _description_
+        """
+        return any(inspect.iscoroutinefunction(func) for _, _, func in self._entries)
+    
     @property
     def urls(self):
         return [
             # re_path(r"^api/(.*)$", Router.handler, name="api")
-            re_path(r"^" + self.baseUrl + "(.*)$", Router.handler, name="api")
+            re_path(r"^" + self.baseUrl + "(.*)$", self.ahandler if self.is_async else self.handler, name="api")
         ]
     
+    def freeze(self) -> DispatchTable:
+        """ 生成不可变的路由表，第一次请求时自动调用，之后注册新路由会重新生成
+
+        Returns:
+            DispatchTable: _description_
+        """
+        if self._dispatch is None:
+            self._dispatch = DispatchTable(self._entries)
+        return self._dispatch
+    
+    def not_found(self,methods):
+        """ 未找到路由时的响应，路径存在但请求方法不对时返回 405
+
+        Args:
+            methods (frozenset | None): 路径允许的请求方法
+
+        Returns:
+            _type_: _description_
+        """
+        if methods is None:
+            return ApiJsonResponse(None,code=ApiErrorCode.NOT_FOUND,message="未找到对应的路由",httpCode=404)
+        response = ApiJsonResponse(None,code=ApiErrorCode.METHOD_NOT_ALLOWED,httpCode=405)
+        if "GET" in methods:
+            methods = methods | {"HEAD"}
+        response["Allow"] = ", ".join(sorted(methods))
+        return response
+    
+    @classmethod
+    def shared(cls) -> "Router":
+        """ 包含所有 Router 路由的默认路由器，兼容以前路由保存在类属性上时 Router.handler(request, path) 的写法
+
+        Returns:
+            Router: _description_
+        """
+        if Router._shared is None:
+            router = Router()
+            router._entries = Router._registry
+            Router._shared = router
+        return Router._shared
     
     @staticmethod
-    def handler(request: HttpRequest,path: str):
-        func = Router.routeMap.get(path)
+    def head_response(request: HttpRequest,response):
+        """ HEAD 请求只返回响应头，Content-Length 保持和 GET 一致
+
+        Args:
+            request (HttpRequest): _description_
+            response (HttpResponse): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        if request.method != "HEAD" or not isinstance(response, HttpResponseBase):
+            return response
+        if getattr(response, "streaming", False):
+            response.close()
+            response.streaming_content = []
+        else:
+            length = len(response.content)
+            response.content = b""
+            response["Content-Length"] = str(length)
+        return response
+    
+    @shared_or_bound
+    def handler(self,request: HttpRequest,path: str):
+        func, kwargs, methods = (self._dispatch or self.freeze()).resolve(request.method, path)
         if func is None:
-            return ApiJsonResponse.error(ApiErrorCode.ERROR,"未找到对应的路由")
-        if path in ['users.detail1']:
-            return ApiJsonResponse.error(ApiErrorCode.AUTH_ERROR,"未登录")
-        return func["func"](request)
-        
-        
+            return self.not_found(methods)
+        if inspect.iscoroutinefunction(func):
+            if self.query_debug_enabled:
+                # async 路由中的同步查询会回到当前线程执行，当前线程的连接也要统计
+                install_query_counter()
+            return self.head_response(request, async_to_sync(func)(request,**kwargs))
+        return self.head_response(request, func(request,**kwargs))
     
+    @shared_or_bound
+    async def ahandler(self,request: HttpRequest,path: str):
+        """ ASGI 下使用的入口，async 路由直接 await，同步路由放到线程中执行
 
+        Args:
+            request (HttpRequest): _description_
+            path (str): _description_
+
+        Returns:
+            _type_: _description_
+        """
+        func, kwargs, methods = (self._dispatch or self.freeze()).resolve(request.method, path)
+        if func is None:
+            return self.not_found(methods)
+        if inspect.iscoroutinefunction(func):
+            return self.head_response(request, await func(request,**kwargs))
+        return self.head_response(request, await sync_to_async(func)(request,**kwargs))
@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+
+from django.http import HttpRequest
+
+from .route import Router
+from .utils.queries import count_queries
+
+
+def format_statements(counter) -> str:
+    return "\n".join(
+        "%4d x %s" % (times, sql) for sql, times in counter.statements.most_common()
+    )
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """### 断言 with 代码块中的数据库查询不超过 limit 次
+
+        with assert_max_queries(3):
+            api.list(request)
+
+    Args:
+        limit (int): _description_
+
+    Yields:
+        QueryCounter: _description_
+    """
+    with count_queries() as counter:
+        yield counter
+    assert counter.count <= limit, "执行了 %d 次查询，超过上限 %d：\n%s" % (
+        counter.count,
+        limit,
+        format_statements(counter),
+    )
+
+
+def assert_route_max_queries(router: Router, request: HttpRequest, path: str, limit: int):
+    """### 断言一个路由的查询次数不超过 limit，流式响应会读完全部内容
+
+    Args:
+        router (Router): _description_
+        request (HttpRequest): _description_
+        path (str): 路由，不含 router.baseUrl
+        limit (int): _description_
+
+    Returns:
+        HttpResponse: _description_
+    """
+    with assert_max_queries(limit):
+        response = router.handler(request, path)
+        if getattr(response, "streaming", False):
+            response.streaming_content = list(response.streaming_content)
+    return response
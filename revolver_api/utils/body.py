@@ -0,0 +1,249 @@
+import codecs
+import json
+import re
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.http import HttpRequest
+from django.http.request import RawPostDataException
+
+# 表单类型的请求体由 django 解析为 request.POST
+FORM_CONTENT_TYPES = ("application/x-www-form-urlencoded", "multipart/form-data")
+# 按 json 解析的类型，另外接受 application/vnd.api+json 这类 +json 后缀的类型
+JSON_CONTENT_TYPES = ("application/json",)
+# 流式解析时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+# 解析结果保存在 request 上的属性名（本模块私有，不依赖 django 的内部属性）
+PARSED_ATTR = "_revolver_parsed_body"
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class RequestBodyError(ValueError):
+    """ 请求体无法解析或超过大小限制
+    """
+
+
+class UnsupportedMediaType(RequestBodyError):
+    """ 请求体既不是表单也不是 json，对应 415
+    """
+
+
+def resolve_max_size(max_size):
+    if max_size is None:
+        return settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    return max_size
+
+
+def is_form(request: HttpRequest) -> bool:
+    return request.content_type in FORM_CONTENT_TYPES
+
+
+def check_json_content_type(request: HttpRequest):
+    """ text/plain、application/octet-stream 等类型不按 json 解析
+
+    Args:
+        request (HttpRequest): _description_
+
+    Raises:
+        UnsupportedMediaType: _description_
+    """
+    content_type = request.content_type or ""
+    if content_type in JSON_CONTENT_TYPES or content_type.endswith("+json"):
+        return
+    raise UnsupportedMediaType("不支持的请求体类型 %s，请使用 application/json" % (content_type or "(空)"))
+
+
+class LimitedReader:
+    """ 读取请求体，超过 max_size 时报错
+
+    Args:
+        stream (_type_): 可 read 的对象，通常是 request 本身
+        max_size (int | None): _description_
+    """
+
+    def __init__(self, stream, max_size):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestBodyError("请求体超过 %d 字节" % self.max_size)
+        return chunk
+
+
+def check_content_length(request: HttpRequest, max_size):
+    if max_size is None:
+        return
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length > max_size:
+        raise RequestBodyError("请求体超过 %d 字节" % max_size)
+
+
+def read_body(request: HttpRequest, max_size) -> bytes:
+    """ 通过 request.body 读取完整的请求体
+
+    request.body 自身受 settings.DATA_UPLOAD_MAX_MEMORY_SIZE 限制，max_size 更大时需要同时调大该配置
+
+    Args:
+        request (HttpRequest): _description_
+        max_size (int | None): _description_
+
+    Raises:
+        RequestBodyError: 超过大小限制，或请求体已经被流式读取
+
+    Returns:
+        bytes: _description_
+    """
+    check_content_length(request, max_size)
+    try:
+        raw = request.body
+    except RequestDataTooBig:
+        raise RequestBodyError("请求体超过 %d 字节" % settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+    except RawPostDataException:
+        raise RequestBodyError("请求体已经被读取")
+    if max_size is not None and len(raw) > max_size:
+        raise RequestBodyError("请求体超过 %d 字节" % max_size)
+    return raw
+
+
+def decode_json(raw: bytes):
+    if not raw.strip():
+        raise RequestBodyError("请求体为空")
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        raise RequestBodyError(e.__str__() or "json 解析错误")
+
+
+def request_data(request: HttpRequest, max_size=None):
+    """ 解析请求体，同一个请求只解析一次
+
+    表单类型返回 request.POST.dict()，json 类型按 json 解析，其他类型报错
+
+    Args:
+        request (HttpRequest): _description_
+        max_size (int, optional): 最大字节数，None 时使用 settings.DATA_UPLOAD_MAX_MEMORY_SIZE. Defaults to None.
+
+    Raises:
+        UnsupportedMediaType: 不是表单或 json 类型
+        RequestBodyError: 请求体为空、json 格式错误或超过大小限制
+
+    Returns:
+        Any: _description_
+    """
+    if hasattr(request, PARSED_ATTR):
+        return getattr(request, PARSED_ATTR)
+    if is_form(request):
+        data = request.POST.dict()
+    else:
+        check_json_content_type(request)
+        data = decode_json(read_body(request, resolve_max_size(max_size)))
+    setattr(request, PARSED_ATTR, data)
+    return data
+
+
+def iter_json_array(stream, chunk_size=STREAM_CHUNK_SIZE):
+    """ 流式解析 json 数组，逐条返回元素，内存中只保留当前读取的块和元素
+
+    Args:
+        stream (_type_): 可 read 的对象
+        chunk_size (int, optional): _description_. Defaults to STREAM_CHUNK_SIZE.
+
+    Raises:
+        RequestBodyError: 不是 json 数组或格式错误
+
+    Yields:
+        Any: 数组元素
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        try:
+            text = text_decoder.decode(chunk, final=eof)
+        except UnicodeDecodeError as e:
+            raise RequestBodyError(e.__str__())
+        buffer, pos = buffer[pos:] + text, 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ""
+            fill()
+
+    if peek() != "[":
+        raise RequestBodyError("请求数据必须是 json 数组")
+    pos += 1
+    if peek() == "]":
+        pos += 1
+    else:
+        while True:
+            peek()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError as e:
+                    if eof:
+                        raise RequestBodyError(e.__str__() or "json 解析错误")
+                    fill()
+                    continue
+                # 数字可能被块截断，读到下一块再确认
+                if end == len(buffer) and not eof:
+                    fill()
+                    continue
+                break
+            yield item
+            pos = end
+            separator = peek()
+            pos += 1
+            if separator == ",":
+                continue
+            if separator == "]":
+                break
+            raise RequestBodyError("json 解析错误")
+    if peek() != "":
+        raise RequestBodyError("json 解析错误")
+
+
+def request_items(request: HttpRequest, max_size=None):
+    """ 解析 json 数组请求体（批量接口），返回逐条解析的生成器，不保留原始字节和完整的数组
+
+    类型和 Content-Length 在调用时检查，格式错误在迭代到对应位置时报错。
+    已经访问过 request.body 时 django 会从内存中的副本读取；流式解析后 request.body 和 request_data 不能再使用
+
+    Args:
+        request (HttpRequest): _description_
+        max_size (int, optional): 同 request_data. Defaults to None.
+
+    Raises:
+        UnsupportedMediaType: 不是 json 类型
+        RequestBodyError: _description_
+
+    Returns:
+        Iterator: 数组元素
+    """
+    if hasattr(request, PARSED_ATTR) or is_form(request):
+        items = request_data(request, max_size)
+        if not isinstance(items, list):
+            raise RequestBodyError("请求数据必须是 json 数组")
+        return iter(items)
+    check_json_content_type(request)
+    max_size = resolve_max_size(max_size)
+    check_content_length(request, max_size)
+    return iter_json_array(LimitedReader(request, max_size))
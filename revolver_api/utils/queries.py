@@ -0,0 +1,96 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# 当前请求的计数器，sync_to_async 会复制 context，线程池中执行的查询也能统计到
+_current_counter = ContextVar("revolver_api_query_counter", default=None)
+
+
+class QueryCounter:
+    """ 统计查询次数、数据库耗时和每条 SQL（不含参数）的执行次数
+
+    Args:
+        parent (QueryCounter, optional): 外层的计数器，嵌套统计时同时计入. Defaults to None.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - start)
+
+    def record(self, sql: str, seconds: float):
+        counter = self
+        while counter is not None:
+            counter.time += seconds
+            counter.count += 1
+            counter.statements[sql] += 1
+            counter = counter.parent
+
+    def repeated(self, threshold: int) -> list:
+        """ 重复执行次数不少于 threshold 的 SQL，通常是 N+1 查询
+
+        Args:
+            threshold (int): _description_
+
+        Returns:
+            list[tuple[str, int]]: (sql, 次数)，次数多的在前
+        """
+        return [
+            (sql, times)
+            for sql, times in self.statements.most_common()
+            if times >= threshold
+        ]
+
+
+def _dispatch(execute, sql, params, many, context):
+    counter = _current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def _install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+def install():
+    """ 给当前线程的数据库连接加上 execute_wrapper，其他线程的连接在建立时加上
+    """
+    connection_created.connect(
+        _on_connection_created, dispatch_uid="revolver_api.utils.queries"
+    )
+    for connection in connections.all():
+        _install(connection)
+
+
+@contextmanager
+def count_queries():
+    """ 统计 with 代码块中的数据库查询
+
+    Yields:
+        QueryCounter: _description_
+    """
+    install()
+    counter = QueryCounter(_current_counter.get())
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
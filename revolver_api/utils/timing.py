@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+
+from django.http import HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+
+
+def record_timing(request: HttpRequest, name: str, seconds: float, description=""):
+    """### 记录请求中某个阶段的耗时，同名阶段累加
+
+    Args:
+        request (HttpRequest): _description_
+        name (str): 阶段名称，例如 mw / handler / serialize
+        seconds (float): 耗时（秒）
+        description (str, optional): _description_. Defaults to "".
+    """
+    if request is None:
+        return
+    timings = getattr(request, "server_timing", None)
+    if timings is None:
+        timings = request.server_timing = {}
+    if name in timings:
+        timings[name][0] += seconds
+    else:
+        timings[name] = [seconds, description]
+
+
+@contextmanager
+def timed(request: HttpRequest, name: str, description=""):
+    """### 记录 with 代码块的耗时
+
+    Args:
+        request (HttpRequest): _description_
+        name (str): _description_
+        description (str, optional): _description_. Defaults to "".
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(request, name, time.perf_counter() - start, description)
+
+
+def server_timing_header(request: HttpRequest) -> str:
+    """### Server-Timing 响应头的值，耗时单位为毫秒
+
+    Args:
+        request (HttpRequest): _description_
+
+    Returns:
+        str: 没有记录时为空字符串
+    """
+    parts = []
+    for name, (seconds, description) in (getattr(request, "server_timing", None) or {}).items():
+        part = "%s;dur=%.2f" % (name, seconds * 1000)
+        if description:
+            part += ';desc="%s"' % description
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def add_server_timing(request: HttpRequest, response: HttpResponse) -> HttpResponse:
+    """### 把记录的耗时写入响应头
+
+    Args:
+        request (HttpRequest): _description_
+        response (HttpResponse): _description_
+
+    Returns:
+        HttpResponse: _description_
+    """
+    header = server_timing_header(request)
+    if header and isinstance(response, HttpResponseBase):
+        response["Server-Timing"] = header
+    return response
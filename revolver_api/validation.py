@@ -0,0 +1,254 @@
+from django.core.exceptions import ValidationError
+
+from .filters import coerce_bool
+
+# Rule 上没有显式设置时不检查的约束
+OPTIONAL_CONSTRAINTS = ("type", "min", "max", "min_length", "max_length", "default", "validator")
+
+
+def to_number(value):
+    """ 转为 int，有小数部分时转为 float
+
+    Args:
+        value (_type_): _description_
+
+    Raises:
+        ValueError: 不是数字
+
+    Returns:
+        int | float: _description_
+    """
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def to_int(value):
+    number = to_number(value)
+    if isinstance(number, float) and not number.is_integer():
+        raise ValueError(value)
+    return int(number)
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    try:
+        return coerce_bool(str(value).lower())
+    except ValidationError:
+        raise ValueError(value)
+
+
+TYPE_COERCERS = {
+    "string": str,
+    "str": str,
+    "number": to_number,
+    "int": to_int,
+    "integer": to_int,
+    "float": lambda value: float(to_number(value)),
+    "bool": to_bool,
+    "boolean": to_bool,
+}
+
+TYPE_NAMES = {
+    "string": "字符串",
+    "str": "字符串",
+    "number": "数字",
+    "int": "整数",
+    "integer": "整数",
+    "float": "数字",
+    "bool": "布尔值",
+    "boolean": "布尔值",
+}
+
+
+def declared(rule) -> dict:
+    """ Rule 实例上显式设置的约束（构造参数或 set_xxx），类属性上的默认值不算
+
+    Args:
+        rule (Rule): _description_
+
+    Returns:
+        dict: _description_
+    """
+    return {key: rule.__dict__[key] for key in OPTIONAL_CONSTRAINTS if key in rule.__dict__}
+
+
+def compile_rule(rule):
+    """ 把一条规则编译为检查函数
+
+    Args:
+        rule (Rule): _description_
+
+    Raises:
+        ValueError: 未知的 type
+
+    Returns:
+        Callable[[Any], tuple[Any, str | None]]: 输入原始值，返回 (转换后的值, 错误信息)
+    """
+    name = rule.name
+    custom_message = rule.message
+    options = declared(rule)
+    checks = []
+
+    def fail(message):
+        return custom_message or message
+
+    type_name = options.get("type")
+    if type_name is not None:
+        if type_name not in TYPE_COERCERS:
+            raise ValueError("规则 %s 的类型 %s 不支持" % (name, type_name))
+        coerce = TYPE_COERCERS[type_name]
+        type_message = fail("%s 必须是%s" % (name, TYPE_NAMES[type_name]))
+    else:
+        coerce = None
+
+    if "min" in options or "max" in options:
+        low, high = options.get("min"), options.get("max")
+        number_message = fail("%s 必须是数字" % name)
+        low_message = fail("%s 不能小于 %s" % (name, low))
+        high_message = fail("%s 不能大于 %s" % (name, high))
+
+        def check_range(value):
+            try:
+                number = to_number(value)
+            except (TypeError, ValueError):
+                return number_message
+            if low is not None and number < low:
+                return low_message
+            if high is not None and number > high:
+                return high_message
+            return None
+
+        checks.append(check_range)
+
+    if "min_length" in options or "max_length" in options:
+        shortest, longest = options.get("min_length"), options.get("max_length")
+        length_message = fail("%s 格式错误" % name)
+        short_message = fail("%s 长度不能小于 %s" % (name, shortest))
+        long_message = fail("%s 长度不能大于 %s" % (name, longest))
+
+        def check_length(value):
+            try:
+                length = len(value)
+            except TypeError:
+                return length_message
+            if shortest is not None and length < shortest:
+                return short_message
+            if longest is not None and length > longest:
+                return long_message
+            return None
+
+        checks.append(check_length)
+
+    if rule.choices:
+        choices = list(rule.choices)
+        try:
+            choice_set = frozenset(choices)
+        except TypeError:
+            choice_set = None
+        choice_message = fail("%s 必须是 %s 之一" % (name, ",".join(str(choice) for choice in choices)))
+
+        def check_choices(value):
+            try:
+                found = value in choice_set if choice_set is not None else value in choices
+            except TypeError:
+                found = False
+            return None if found else choice_message
+
+        checks.append(check_choices)
+
+    custom = options.get("validator")
+    if custom is not None:
+        custom_fail = fail("%s 格式错误" % name)
+
+        def check_custom(value):
+            try:
+                result = custom(value)
+            except (TypeError, ValueError) as e:
+                return custom_message or str(e) or custom_fail
+            if isinstance(result, str):
+                return result
+            return None if result else custom_fail
+
+        checks.append(check_custom)
+
+    required = rule.required
+    required_message = fail("%s 不能为空" % name)
+    has_default = "default" in options
+    default = options.get("default")
+
+    def run(value):
+        if value is None or value == "":
+            if has_default:
+                return default, None
+            if required:
+                return value, required_message
+            return value, None
+        if coerce is not None:
+            try:
+                value = coerce(value)
+            except (TypeError, ValueError):
+                return value, type_message
+        for check in checks:
+            message = check(value)
+            if message is not None:
+                return value, message
+        return value, None
+
+    return run
+
+
+class CompiledRules:
+    """ 编译后的规则列表，一次检查全部规则并收集所有错误
+
+    Args:
+        rules (Iterable[Rule]): _description_
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.checks = [(rule.name, compile_rule(rule)) for rule in self.rules]
+
+    def __call__(self, params: dict):
+        """ 检查参数
+
+        Args:
+            params (dict): _description_
+
+        Returns:
+            tuple[dict, list]: (转换后的数据，包含未声明规则的字段, 错误列表 [{"name", "message"}])
+        """
+        cleaned = dict(params)
+        errors = []
+        for name, check in self.checks:
+            raw = params.get(name)
+            value, message = check(raw)
+            if message is not None:
+                errors.append({"name": name, "message": message})
+            elif value is not raw:
+                cleaned[name] = value
+        return cleaned, errors
+
+    def __len__(self):
+        return len(self.checks)
+
+
+def compile_rules(rules) -> CompiledRules:
+    """ 编译规则列表，已经编译过的直接返回
+
+    Args:
+        rules (Iterable[Rule] | CompiledRules): _description_
+
+    Returns:
+        CompiledRules: _description_
+    """
+    if isinstance(rules, CompiledRules):
+        return rules
+    return CompiledRules(rules)
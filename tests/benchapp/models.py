@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+from revolver_api.model import SerializerModel
+
+
+class Author(SerializerModel):
+    name = models.CharField(max_length=50)
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Book(SerializerModel):
+    title = models.CharField(max_length=50)
+    price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    pages = models.IntegerField(default=0)
+    published = models.BooleanField(default=False)
+    author = models.ForeignKey(Author, null=True, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+
+class Review(SerializerModel):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.body
+
+
+class LegacyBook(Book):
+    """ 重写 to_json 且不接受 fields 参数的下游写法
+    """
+
+    class Meta:
+        proxy = True
+
+    def to_json(self):
+        data = super().to_json()
+        data["legacy"] = True
+        return data
+
+
+class LabelledBook(Book):
+    class Meta:
+        proxy = True
+
+    def extra_json(self):
+        return {"label": "%s (%s)" % (self.title, self.pages)}
+
+
+class AuditedBook(Book):
+    """ 重写 delete 的模型，Api.delete_per_object 为 True 时逐个调用
+    """
+
+    deleted = []
+
+    class Meta:
+        proxy = True
+
+    def delete(self, *args, **kwargs):
+        AuditedBook.deleted.append(self.pk)
+        return super().delete(*args, **kwargs)
+
+
+class Loan(SerializerModel):
+    """ 两个字段指向用户，归属字段由 Api.user_field 决定
+    """
+
+    lender = models.ForeignKey(User, null=True, related_name="+", on_delete=models.CASCADE)
+    borrower = models.ForeignKey(User, null=True, related_name="loans", on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
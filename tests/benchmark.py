@@ -0,0 +1,131 @@
+""" 简单的基准测试工具
+
+每个用例取多轮中最快的一次，除以同一台机器上固定计算量的耗时（calibrate），
+得到与机器性能无关的相对值，和 baselines.json 中保存的基线比较。
+不同机器、负载下相对值仍有波动，默认只在慢于基线 5 倍时失败，用于发现数量级的退化。
+只有显式要求时才写入基线，普通测试不会修改 baselines.json。
+baselines.json 中的 <名称>.before 是优化前代码的相对值，吞吐量报告据此给出优化前后的对比。
+
+    pytest tests --update-baselines          # 重新生成基线（或 REVOLVER_BENCH_UPDATE=1）
+    REVOLVER_BENCH_TOLERANCE=10 pytest tests # 允许的倍数，默认 5
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+BASELINE_FILE = Path(__file__).with_name("baselines.json")
+DEFAULT_TOLERANCE = 5.0
+
+
+def best_of(func, rounds=5, number=20) -> float:
+    """ 多轮中最快一轮的单次耗时（秒）
+
+    Args:
+        func (Callable): _description_
+        rounds (int, optional): _description_. Defaults to 5.
+        number (int, optional): 每轮调用次数. Defaults to 20.
+
+    Returns:
+        float: _description_
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def calibration_workload():
+    total = 0
+    for i in range(20000):
+        total += i * i % 7
+    data = {str(i): i for i in range(2000)}
+    return total + len(json.dumps(data))
+
+
+class Benchmark:
+    """ 基准测试结果与基线比较
+
+    Args:
+        path (Path, optional): 基线文件. Defaults to BASELINE_FILE.
+        update (bool, optional): 写入基线，不和基线比较. Defaults to False.
+    """
+
+    def __init__(self, path=BASELINE_FILE, update=False):
+        self.path = Path(path)
+        self.update = update or os.environ.get("REVOLVER_BENCH_UPDATE") == "1"
+        self.tolerance = float(os.environ.get("REVOLVER_BENCH_TOLERANCE", DEFAULT_TOLERANCE))
+        self.baselines = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.results = {}
+        # 吞吐量：名称 -> (每秒处理量, 单位, 每次调用处理的数量)
+        self.rates = {}
+        self._unit = None
+        self._lock = threading.Lock()
+
+    @property
+    def unit(self) -> float:
+        if self._unit is None:
+            self._unit = best_of(calibration_workload, rounds=7, number=5)
+        return self._unit
+
+    def __call__(self, name: str, func, rounds=5, number=20, items=None, item_unit="rows") -> float:
+        """ 运行基准测试，超过基线 tolerance 倍时失败
+
+        Args:
+            name (str): 基线中的名称
+            func (Callable): 无参数函数
+            rounds (int, optional): _description_. Defaults to 5.
+            number (int, optional): _description_. Defaults to 20.
+            items (int, optional): 每次调用处理的数量（行数、字节数），给出时记录吞吐量. Defaults to None.
+            item_unit (str, optional): 吞吐量的单位. Defaults to "rows".
+
+        Returns:
+            float: 相对耗时
+        """
+        func()
+        seconds = best_of(func, rounds=rounds, number=number)
+        relative = seconds / self.unit
+        with self._lock:
+            self.results[name] = float("%.4g" % relative)
+            if items:
+                self.rates[name] = (items / seconds, item_unit, items)
+        baseline = self.baselines.get(name)
+        if self.update or baseline is None:
+            return relative
+        assert relative <= baseline * self.tolerance, (
+            "%s 性能下降：%.4g，基线 %.4g（允许 %.1f 倍）"
+            % (name, relative, baseline, self.tolerance)
+        )
+        return relative
+
+    def report(self) -> list:
+        """ 吞吐量报告，每行一个用例（结果与机器有关，只输出不比较）
+
+        基线中有 <名称>.before 时，按本机的 calibrate 换算出优化前的吞吐量并给出倍数
+
+        Returns:
+            list[str]: _description_
+        """
+        lines = []
+        for name, (rate, item_unit, items) in sorted(self.rates.items()):
+            line = "%-28s %12.4g %s/s" % (name, rate, item_unit)
+            before = self.baselines.get(name + ".before")
+            if before:
+                before_rate = items / (before * self.unit)
+                line += "  (before %.4g %s/s, %.2fx)" % (before_rate, item_unit, rate / before_rate)
+            lines.append(line)
+        return lines
+
+    def save(self):
+        """ 要求更新基线时写入本次结果，没有基线的用例只运行、不写入
+        """
+        if not self.update or not self.results:
+            return
+        merged = dict(self.baselines)
+        merged.update(self.results)
+        if merged != self.baselines:
+            self.path.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n")
@@ -0,0 +1,59 @@
+import os
+
+import django
+import pytest
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from tests.benchapp.models import Author, Book, Review
+from tests.benchmark import Benchmark
+
+BENCH_KEY = pytest.StashKey[Benchmark]()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-baselines", action="store_true", default=False,
+        help="把基准测试结果写入 tests/baselines.json",
+    )
+
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    benchmark = config.stash.get(BENCH_KEY, None)
+    if benchmark is None or not benchmark.rates:
+        return
+    terminalreporter.section("benchmark throughput")
+    for line in benchmark.report():
+        terminalreporter.write_line(line)
+
+
+@pytest.fixture(scope="session")
+def bench_db():
+    """ 内存数据库建表并写入测试数据：20 个作者、200 本书、每本书 3 条评论
+    """
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    user = User.objects.create(username="admin", is_superuser=True)
+    authors = [Author.objects.create(name="author%d" % i, user=user) for i in range(20)]
+    Book.objects.bulk_create([
+        Book(title="book%d" % i, price=i, pages=i * 10, author=authors[i % 20], user=user)
+        for i in range(200)
+    ])
+    Review.objects.bulk_create([
+        Review(book=book, body="review%d" % j)
+        for book in Book.objects.all()
+        for j in range(3)
+    ])
+    return user
+
+
+@pytest.fixture(scope="session")
+def bench(request):
+    benchmark = Benchmark(update=request.config.getoption("--update-baselines"))
+    request.config.stash[BENCH_KEY] = benchmark
+    yield benchmark
+    benchmark.save()
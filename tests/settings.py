@@ -0,0 +1,24 @@
+""" 测试 / 基准测试使用的 django 配置，内存 sqlite
+"""
+SECRET_KEY = "revolver-api-tests"
+DEBUG = False
+USE_TZ = True
+INSTALLED_APPS = [
+    "django.contrib.contenttypes",
+    "django.contrib.auth",
+    "tests.benchapp",
+]
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        # 共享缓存的内存数据库，后台导出线程和测试线程使用同一个数据库
+        "NAME": "file:revolver_api_tests?mode=memory&cache=shared",
+    }
+}
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+ROOT_URLCONF = "tests.urls"
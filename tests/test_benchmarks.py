@@ -0,0 +1,204 @@
+import io
+import json
+
+from django.http import HttpRequest
+from django.test import RequestFactory
+
+from revolver_api.api import Api, Rule, validator
+from revolver_api.response import ApiJsonResponse, OrjsonRenderer, StdlibJsonRenderer
+from revolver_api.route import Router
+from revolver_api.validation import compile_rules
+from tests.benchapp.models import Author, Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+class AuthorApi(Api):
+    model = Author
+
+
+def get(user, path="/", **params):
+    request = factory.get(path, params)
+    request.user = user
+    return request
+
+
+def test_to_json(bench_db, bench):
+    books = list(Book.objects.select_related("author").prefetch_related("review_set")[:50])
+
+    def run():
+        for book in books:
+            book.to_json()
+
+    bench("to_json", run)
+    data = books[0].to_json()
+    assert data["title"] == books[0].title
+    assert data["review_count"] == 3
+
+
+def test_serialize_rows(bench_db, bench):
+    books = list(Book.objects.all())
+
+    def run():
+        for book in books:
+            book.sample_to_json(with_foreign=False, with_related=False)
+
+    bench("serialize_rows", run, number=10, items=len(books))
+    data = books[0].sample_to_json(with_foreign=False, with_related=False)
+    assert data["title"] == books[0].title and data["author_id"] == books[0].author_id
+
+
+def test_default_query(bench_db, bench):
+    api = BookApi()
+    request = get(bench_db, title__contains="book", pages__gte="10", published="false")
+
+    def run():
+        str(api.defaultQuery(request).query)
+
+    bench("defaultQuery", run)
+    assert api.defaultQuery(request).count() == 199
+
+
+def test_list(bench_db, bench):
+    api = AuthorApi()
+    request = get(bench_db, size="20")
+    bench("list", lambda: api.list(request), number=5)
+    data = json.loads(api.list(request).content)
+    assert len(data["data"]["list"]) == 20
+
+
+def test_router_dispatch(bench_db, bench):
+    router = Router()
+    for i in range(50):
+        router.get("static%d" % i)(lambda request: ApiJsonResponse.success())
+        router.get("items%d/<int:id>" % i)(lambda request, id: ApiJsonResponse.success(id))
+    request = get(bench_db)
+
+    def run():
+        router.handler(request, "items49/7")
+        router.handler(request, "static49")
+
+    bench("router_dispatch", run, number=200)
+    assert json.loads(router.handler(request, "items49/7").content)["data"] == 7
+    assert router.handler(request, "missing").status_code == 404
+
+
+def test_router_dispatch_many_routes(bench_db, bench):
+    def make(count):
+        router = Router()
+        for i in range(count):
+            router.get("static%d" % i)(lambda request: ApiJsonResponse.success())
+            router.get("items%d/<int:id>" % i)(lambda request, id: ApiJsonResponse.success(id))
+            router.post("items%d/<int:id>/edit" % i)(lambda request, id: ApiJsonResponse.success(id))
+        return router
+
+    request = get(bench_db)
+
+    def dispatch(router, count):
+        last = count - 1
+        return lambda: (
+            router.handler(request, "items%d/7" % last),
+            router.handler(request, "static%d" % last),
+        )
+
+    small_router, large_router = make(50), make(2000)
+    small = bench("router_dispatch_50_routes", dispatch(small_router, 50), number=200)
+    large = bench("router_dispatch_2000_routes", dispatch(large_router, 2000), number=200)
+    # 静态路由查字典、动态路由按第一段分组，分发耗时和路由数量无关（留足波动余量）
+    assert large <= small * 5
+    assert json.loads(large_router.handler(request, "items1999/7").content)["data"] == 7
+    assert large_router.handler(request, "items1999/7/edit").status_code == 405
+
+
+def test_validator(bench_db, bench):
+    rules = [
+        Rule(name="name", message="name 不能为空"),
+        Rule(name="page", required=False).number().set_min(1).set_max(100),
+        Rule(name="kind", required=False).set_choices(["a", "b", "c"]),
+    ]
+
+    @validator(rules)
+    def view(request: HttpRequest):
+        return ApiJsonResponse.success(request.valid_data)
+
+    request = get(bench_db, name="x", page="3", kind="a")
+    bench("validator", lambda: view(request), number=200)
+    assert view(request).status_code == 200
+
+
+def test_export_csv(bench_db, bench):
+    api = BookApi()
+    request = get(bench_db)
+
+    def run():
+        response = api.export_csv(request)
+        return b"".join(response.streaming_content)
+
+    bench("export_csv", run, rounds=3, number=2, items=Book.objects.count())
+    lines = run().decode().splitlines()
+    assert len(lines) == 201
+
+
+def test_export_xls(bench_db, bench):
+    request = get(bench_db)
+
+    def run():
+        response = Api.export_xls_override(Book.objects.all(), request)
+        buffer = io.BytesIO()
+        for chunk in response.streaming_content:
+            buffer.write(chunk)
+        return buffer.getvalue()
+
+    bench("export_xls", run, rounds=3, number=2, items=Book.objects.count())
+    assert run()[:4] == b"\xd0\xcf\x11\xe0"
+
+
+def test_renderers(bench_db, bench):
+    payload = {
+        "message": "成功",
+        "code": 200,
+        "data": [book.to_json() for book in Book.objects.prefetch_related("review_set")[:100]],
+    }
+    renderers = {
+        "render_stdlib_indent": StdlibJsonRenderer(indent=4),
+        "render_stdlib_compact": StdlibJsonRenderer(),
+    }
+    try:
+        renderers["render_orjson_compact"] = OrjsonRenderer()
+        renderers["render_orjson_pretty"] = OrjsonRenderer(indent=True)
+    except ImportError:
+        pass
+    outputs = {}
+    for name, renderer in renderers.items():
+        outputs[name] = renderer.render(payload)
+        bench(name, lambda: renderer.render(payload), number=20, items=len(outputs[name]), item_unit="B")
+    expected = json.loads(outputs["render_stdlib_indent"])
+    assert all(json.loads(output) == expected for output in outputs.values())
+    assert len(outputs["render_stdlib_compact"]) < len(outputs["render_stdlib_indent"])
+
+
+def test_validator_scales_with_rule_count(bench_db, bench):
+    def make(count):
+        rules = [
+            Rule(name="field%d" % i, required=False).number().set_min(0).set_max(1000)
+            for i in range(count)
+        ]
+        compiled = compile_rules(rules)
+        params = {"field%d" % i: str(i) for i in range(count)}
+        return lambda: compiled(params)
+
+    small = bench("validator_5_rules", make(5), number=200)
+    large = bench("validator_50_rules", make(50), number=50)
+    # 两次测量在同一台机器上，比值和机器无关：规则数 10 倍时耗时按基线中的比值线性增长，
+    # 逐条规则重复解析等平方级的退化（约 100 倍）会超出允许范围
+    baselines = bench.baselines
+    if bench.update or "validator_5_rules" not in baselines or "validator_50_rules" not in baselines:
+        return
+    expected = baselines["validator_50_rules"] / baselines["validator_5_rules"]
+    assert large / small <= expected * bench.tolerance, (
+        "validator 随规则数增长：%.3g 倍，基线 %.3g 倍" % (large / small, expected)
+    )
@@ -0,0 +1,116 @@
+import io
+import json
+
+import pytest
+from django.test import RequestFactory
+
+from revolver_api.api import Api, Rule
+from revolver_api.route import Router
+from revolver_api.utils.body import (
+    RequestBodyError,
+    UnsupportedMediaType,
+    iter_json_array,
+    request_data,
+    request_items,
+)
+from tests.benchapp.models import Author
+
+factory = RequestFactory()
+
+
+class AuthorApi(Api):
+    model = Author
+    rules = [Rule(name="name", message="name 不能为空")]
+
+
+def post(user, data, path="/", method="post", content_type="application/json"):
+    body = data if isinstance(data, (str, bytes)) else json.dumps(data)
+    request = getattr(factory, method)(path, body, content_type=content_type)
+    request.user = user
+    return request
+
+
+def test_iter_json_array_across_chunks():
+    items = [{"name": "author%d" % i, "n": i * 1000, "text": "中文" * i} for i in range(50)]
+    raw = json.dumps(items).encode()
+    assert list(iter_json_array(io.BytesIO(raw), chunk_size=7)) == items
+    assert list(iter_json_array(io.BytesIO(b" [ 1 , 22 , 333 ] "), chunk_size=1)) == [1, 22, 333]
+    assert list(iter_json_array(io.BytesIO(b"[]"))) == []
+    for bad in (b'{"a": 1}', b"[1, 2", b"[1 2]", b"[1] x"):
+        with pytest.raises(RequestBodyError):
+            list(iter_json_array(io.BytesIO(bad), chunk_size=2))
+
+
+def test_request_data_is_parsed_once():
+    request = post(None, {"name": "x"})
+    data = request_data(request)
+    assert request_data(request) is data
+    assert json.loads(request.body) == data
+    form = factory.post("/", {"name": "y"})
+    assert request_data(form) == {"name": "y"}
+    with pytest.raises(RequestBodyError):
+        request_data(post(None, {"name": "z" * 100}), max_size=10)
+
+
+def test_request_items_streams_arrays():
+    request = post(None, [{"name": "a"}, {"name": "b"}])
+    items = request_items(request)
+    assert not isinstance(items, list)
+    assert next(items) == {"name": "a"}
+    assert list(items) == [{"name": "b"}]
+    # 流式读取后请求体不能再解析
+    with pytest.raises(RequestBodyError):
+        request_data(request)
+    with pytest.raises(RequestBodyError):
+        request_items(post(None, [{"name": "a" * 100}]), max_size=10)
+    # 已经由 request_data 解析过时使用解析结果
+    parsed = post(None, [{"name": "c"}])
+    request_data(parsed)
+    assert list(request_items(parsed)) == [{"name": "c"}]
+
+
+def test_unknown_content_types_are_rejected(bench_db):
+    for content_type in ("text/plain", "application/octet-stream", "application/xml"):
+        with pytest.raises(UnsupportedMediaType):
+            request_data(post(None, {"name": "x"}, content_type=content_type))
+        # 类型在调用时检查，不等到迭代
+        with pytest.raises(UnsupportedMediaType):
+            request_items(post(None, [{"name": "x"}], content_type=content_type))
+    assert request_data(post(None, {"name": "x"}, content_type="application/vnd.api+json")) == {"name": "x"}
+    assert request_data(post(None, {"name": "x"}, content_type="application/json; charset=utf-8")) == {"name": "x"}
+
+    router = Router()
+    AuthorApi().register(router, "authors")
+    for route, data in (("authors.create", {"name": "x"}), ("authors.bulk_create", [{"name": "x"}])):
+        response = router.handler(post(bench_db, data, content_type="text/plain"), route)
+        assert response.status_code == 415
+        assert json.loads(response.content)["code"] == 415
+    assert not Author.objects.filter(name="x").exists()
+
+
+def test_routes_use_validated_data(bench_db):
+    router = Router()
+    AuthorApi().register(router, "authors")
+    data = json.loads(router.handler(post(bench_db, {"name": "new"}), "authors.create").content)
+    assert data["data"]["name"] == "new"
+    pk = data["data"]["id"]
+    response = router.handler(post(bench_db, {"id": pk, "name": "renamed"}, method="put"), "authors.update")
+    assert json.loads(response.content)["data"]["name"] == "renamed"
+    response = router.handler(post(bench_db, {"name": ""}), "authors.create")
+    assert json.loads(response.content)["message"] == "name 不能为空"
+    response = router.handler(post(bench_db, [{"name": "b1"}, {"name": "b2"}]), "authors.bulk_create")
+    assert json.loads(response.content)["data"]["count"] == 2
+    response = router.handler(post(bench_db, {"ids": [pk]}, method="delete"), "authors.delete")
+    assert json.loads(response.content)["data"]["deleted"] == [pk]
+
+
+def test_body_uses_public_request_api():
+    request = post(None, [{"name": "a"}])
+    assert json.loads(request.body) == [{"name": "a"}]
+    # 已经读取过 request.body 时从 django 保留的副本流式解析
+    assert list(request_items(request)) == [{"name": "a"}]
+
+    streamed = post(None, {"name": "x"})
+    streamed.read()
+    with pytest.raises(RequestBodyError):
+        request_data(streamed)
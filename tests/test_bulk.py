@@ -0,0 +1,119 @@
+import json
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from revolver_api.api import Api, Rule
+from tests.benchapp.models import Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+    rules = [Rule(name="title", required=False).set_length(max_length=50)]
+
+
+class BatchedBookApi(BookApi):
+    bulk_batch_size = 3
+
+
+def put(user, items, api=None):
+    request = factory.put("/", json.dumps(items), content_type="application/json")
+    request.user = user
+    response = (api or BookApi()).bulk_update(request)
+    return response.status_code, json.loads(response.content)
+
+
+def post(user, items, api=None):
+    request = factory.post("/", json.dumps(items), content_type="application/json")
+    request.user = user
+    response = (api or BookApi()).bulk_create(request)
+    return response.status_code, json.loads(response.content)
+
+
+def test_bulk_update_in_one_batch(bench_db):
+    books = [Book.objects.create(title="bulk%d" % i, user=bench_db) for i in range(10)]
+    try:
+        with CaptureQueriesContext(connection) as captured:
+            status, data = put(bench_db, [{"id": book.pk, "pages": i} for i, book in enumerate(books)])
+        assert status == 200 and data["data"]["count"] == 10
+        statements = [query["sql"].split()[0] for query in captured.captured_queries]
+        assert statements.count("SELECT") == 1 and statements.count("UPDATE") == 1
+        assert [book.pages for book in Book.objects.filter(title__startswith="bulk").order_by("pk")] == list(range(10))
+        # 只更新出现的字段
+        assert set(Book.objects.filter(title__startswith="bulk").values_list("title", flat=True)) == {
+            book.title for book in books
+        }
+    finally:
+        Book.objects.filter(title__startswith="bulk").delete()
+
+
+def test_bulk_update_reports_item_errors(bench_db):
+    book = Book.objects.create(title="bulk", pages=1, user=bench_db)
+    try:
+        status, data = put(bench_db, [
+            {"id": book.pk, "pages": 2},
+            {"pages": 3},
+            "not an object",
+            {"id": book.pk, "title": "x" * 100},
+            {"id": 10 ** 9, "pages": 4},
+        ])
+        assert status == 400
+        assert [error["index"] for error in data["data"]["errors"]] == [1, 2, 3, 4]
+        assert data["data"]["errors"][3]["message"] == "无法更新/没有权限"
+        # 有错误时一条都不写入
+        book.refresh_from_db()
+        assert book.pages == 1
+    finally:
+        book.delete()
+
+
+def test_bulk_update_respects_ownership(bench_db):
+    alice = User.objects.create(username="bulk-alice")
+    bob = User.objects.create(username="bulk-bob")
+    owned = Book.objects.create(title="bulk-alice", pages=1, user=alice)
+    other = Book.objects.create(title="bulk-bob", pages=1, user=bob)
+    try:
+        status, data = put(alice, [{"id": owned.pk, "pages": 2}, {"id": other.pk, "pages": 2}])
+        assert status == 400 and [error["index"] for error in data["data"]["errors"]] == [1]
+        status, data = put(alice, [{"id": owned.pk, "pages": 2}])
+        assert status == 200 and data["data"]["count"] == 1
+        status, data = put(AnonymousUser(), [{"id": other.pk, "pages": 3}])
+        assert status == 400 and data["message"] == "没有权限"
+        owned.refresh_from_db()
+        other.refresh_from_db()
+        assert (owned.pages, other.pages) == (2, 1)
+    finally:
+        Book.objects.filter(title__startswith="bulk").delete()
+        alice.delete()
+        bob.delete()
+
+
+def test_bulk_requests_are_written_in_batches(bench_db):
+    try:
+        with CaptureQueriesContext(connection) as captured:
+            status, data = post(bench_db, [{"title": "bulk%d" % i, "pages": i} for i in range(7)], BatchedBookApi())
+        assert status == 200 and data["data"]["count"] == 7
+        assert [query["sql"].split()[0] for query in captured.captured_queries].count("INSERT") == 3
+        books = list(Book.objects.filter(title__startswith="bulk").order_by("pk"))
+        assert data["data"]["ids"] == [book.pk for book in books]
+
+        with CaptureQueriesContext(connection) as captured:
+            status, data = put(bench_db, [{"id": book.pk, "pages": 100} for book in books], BatchedBookApi())
+        assert status == 200 and data["data"]["count"] == 7
+        statements = [query["sql"].split()[0] for query in captured.captured_queries]
+        assert statements.count("SELECT") == 3 and statements.count("UPDATE") == 3
+
+        # 最后一批出错时，前面已经写入的批次一起回滚
+        items = [{"id": book.pk, "pages": 200} for book in books] + [{"id": 10 ** 9, "pages": 200}]
+        status, data = put(bench_db, items, BatchedBookApi())
+        assert status == 400 and [error["index"] for error in data["data"]["errors"]] == [7]
+        status, data = post(bench_db, [{"title": "bulk-new"}] * 4 + [{"title": "x" * 100}], BatchedBookApi())
+        assert status == 400 and [error["index"] for error in data["data"]["errors"]] == [4]
+        assert set(Book.objects.filter(title__startswith="bulk").values_list("pages", flat=True)) == {100}
+        assert Book.objects.filter(title__startswith="bulk").count() == 7
+    finally:
+        Book.objects.filter(title__startswith="bulk").delete()
@@ -0,0 +1,84 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from revolver_api.api import Api
+from revolver_api.cache import LocalResponseCache, related_models
+from tests.benchapp.models import Author, Book, Review
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+    response_cache = LocalResponseCache()
+
+
+def listing(user, **params):
+    """ 返回列表数据和本次请求的查询次数
+    """
+    request = factory.get("/", {"title__startswith": "cached", **params})
+    request.user = user
+    with CaptureQueriesContext(connection) as captured:
+        response = BookApi().list(request)
+    assert response.status_code == 200
+    return json.loads(response.content)["data"]["list"], len(captured.captured_queries)
+
+
+def test_related_models_follow_nested_relations():
+    assert {Book, Author, Review, User} <= related_models(Book)
+    # Author -> Book -> Review，两层之外的模型也会使缓存失效
+    assert Review in related_models(Author)
+    assert related_models(Review) is related_models(Review)
+
+
+def test_cache_hit_and_invalidation(bench_db):
+    book = Book.objects.create(title="cached-1", user=bench_db)
+    review = Review.objects.create(book=book, body="first")
+    try:
+        rows, queries = listing(bench_db)
+        assert queries > 0 and rows[0]["review"] == ["first"]
+        rows, queries = listing(bench_db)
+        assert queries == 0 and rows[0]["title"] == "cached-1"
+
+        # post_save
+        book.title = "cached-2"
+        book.save()
+        rows, queries = listing(bench_db)
+        assert queries > 0 and rows[0]["title"] == "cached-2"
+
+        # 关联模型的修改
+        review.body = "second"
+        review.save()
+        rows, _ = listing(bench_db)
+        assert rows[0]["review"] == ["second"]
+        review.delete()
+        rows, _ = listing(bench_db)
+        assert rows[0]["review"] == []
+
+        # post_delete
+        Book.objects.create(title="cached-3", user=bench_db).delete()
+        _, queries = listing(bench_db)
+        assert queries > 0
+    finally:
+        book.delete()
+
+
+def test_cached_responses_are_per_user(bench_db):
+    alice = User.objects.create(username="cache-alice")
+    bob = User.objects.create(username="cache-bob")
+    book = Book.objects.create(title="cached-alice", user=alice)
+    try:
+        rows, _ = listing(alice)
+        assert [row["title"] for row in rows] == ["cached-alice"]
+        assert listing(alice)[1] == 0
+        rows, queries = listing(bob)
+        assert rows == [] and queries > 0
+        assert [row["title"] for row in listing(bench_db)[0]] == ["cached-alice"]
+    finally:
+        book.delete()
+        alice.delete()
+        bob.delete()
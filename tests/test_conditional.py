@@ -0,0 +1,93 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from django.utils.http import http_date
+
+from revolver_api.api import Api
+from revolver_api.async_api import AsyncApi
+from revolver_api.pagination import HasMoreCount
+from tests.benchapp.models import Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+class HasMoreBookApi(Api):
+    model = Book
+    count_strategy = HasMoreCount()
+
+
+class AsyncHasMoreBookApi(AsyncApi):
+    model = Book
+    count_strategy = HasMoreCount()
+
+
+def get(user, headers=None, **params):
+    request = factory.get("/", params, headers=headers)
+    request.user = user
+    return request
+
+
+def etags(api, user, **params):
+    """ 每种分页方式第一次请求的 ETag，再带上 If-None-Match 请求一次应返回 304
+    """
+    result = {}
+    for name, extra in (("page", {}), ("cursor", {"cursor": ""})):
+        response = api.list(get(user, **params, **extra))
+        assert response.status_code == 200
+        assert "Last-Modified" not in response
+        etag = response["ETag"]
+        again = api.list(get(user, {"If-None-Match": etag}, **params, **extra))
+        assert again.status_code == 304
+        result[name] = etag
+    return result
+
+
+def test_list_not_modified_until_rows_change(bench_db):
+    books = [Book.objects.create(title="cond%d" % i) for i in range(3)]
+    try:
+        for api in (BookApi(), HasMoreBookApi()):
+            before = etags(api, bench_db, title__startswith="cond", order_by="id_asc")
+            books[1].pages += 1
+            books[1].save()
+            updated = etags(api, bench_db, title__startswith="cond", order_by="id_asc")
+            assert all(updated[name] != before[name] for name in before)
+
+            # 删除最早的一条，最大更新时间不变，ETag 也要变化
+            oldest = books.pop(0)
+            oldest.delete()
+            deleted = etags(api, bench_db, title__startswith="cond", order_by="id_asc")
+            assert all(deleted[name] != updated[name] for name in updated)
+            books.append(Book.objects.create(title="cond%d" % (len(books) + 10)))
+    finally:
+        Book.objects.filter(title__startswith="cond").delete()
+
+
+def test_exact_count_etag_changes_when_a_row_off_the_page_is_deleted(bench_db):
+    old = Book.objects.create(title="cond-old")
+    Book.objects.filter(pk=old.pk).update(updated_at=Book.objects.order_by("updated_at").first().updated_at)
+    Book.objects.create(title="cond-new")
+    try:
+        before = etags(BookApi(), bench_db, size="1")["page"]
+        old.delete()
+        assert etags(BookApi(), bench_db, size="1")["page"] != before
+    finally:
+        Book.objects.filter(title__startswith="cond").delete()
+
+
+def test_list_ignores_if_modified_since(bench_db):
+    # 列表不发送 Last-Modified，只带 If-Modified-Since 的请求总是返回数据
+    response = BookApi().list(get(bench_db, {"If-Modified-Since": http_date()}, size="5"))
+    assert response.status_code == 200
+    assert len(json.loads(response.content)["data"]["list"]) == 5
+
+
+def test_async_list_not_modified(bench_db):
+    response = async_to_sync(AsyncHasMoreBookApi().list)(get(bench_db, size="5"))
+    assert response.status_code == 200 and "Last-Modified" not in response
+    again = async_to_sync(AsyncHasMoreBookApi().list)(get(bench_db, {"If-None-Match": response["ETag"]}, size="5"))
+    assert again.status_code == 304
@@ -0,0 +1,63 @@
+import os
+import threading
+
+import pytest
+
+from revolver_api.config import Config, get, load_config, readTomlConfig
+
+
+def write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_config_reloads_when_file_changes(tmp_path):
+    path = tmp_path / "config.toml"
+    write(path, '[timezone]\ntimezone = "Asia/Shanghai"\n', 1000)
+    config = Config(path, check_interval=0)
+    assert config.get("timezone.timezone") == "Asia/Shanghai"
+    assert config.get("timezone") == {"timezone": "Asia/Shanghai"}
+    assert config.get("missing.key", "x") == "x"
+    assert get(config, "timezone.timezone") == "Asia/Shanghai"
+    assert get(config.data, "timezone.timezone") == "Asia/Shanghai"
+
+    write(path, '[timezone]\ntimezone = "UTC"\n', 2000)
+    assert config.get("timezone.timezone") == "UTC"
+
+    # 编辑到一半的文件不会覆盖已有配置
+    write(path, "[timezone\n", 3000)
+    assert config.get("timezone.timezone") == "UTC"
+
+
+def test_config_checks_at_most_every_interval(tmp_path):
+    path = tmp_path / "config.toml"
+    write(path, 'a = 1\n', 1000)
+    config = Config(path, check_interval=3600)
+    write(path, 'a = 2\n', 2000)
+    assert config.get("a") == 1
+
+
+def test_load_config_is_shared_between_threads(tmp_path):
+    path = tmp_path / "config.toml"
+    write(path, 'a = 1\n', 1000)
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(load_config(path))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(config) for config in found}) == 1
+
+
+def test_read_toml_config_uses_the_cache(tmp_path):
+    path = tmp_path / "config.toml"
+    with pytest.raises(Exception):
+        readTomlConfig(path)
+    # 不存在时创建默认配置，下一次读取成功
+    assert get(readTomlConfig(path), "timezone.timezone") == "Asia/Shanghai"
+    assert readTomlConfig(path) is readTomlConfig(path) is load_config(path).data
+
+    write(path, '[timezone]\ntimezone = "UTC"\n', 2000)
+    config = load_config(path)
+    config._checked_at -= config.check_interval
+    assert get(readTomlConfig(path), "timezone.timezone") == "UTC"
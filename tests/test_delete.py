@@ -0,0 +1,90 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from revolver_api.api import Api
+from tests.benchapp.models import AuditedBook, Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+class AuditedBookApi(Api):
+    model = AuditedBook
+    delete_per_object = True
+
+
+def delete(api, user, ids):
+    request = factory.delete("/", json.dumps({"ids": ids}), content_type="application/json")
+    request.user = user
+    response = api.delete(request)
+    return response.status_code, json.loads(response.content)
+
+
+def test_delete_reports_deleted_and_not_found(bench_db):
+    books = [Book.objects.create(title="delete%d" % i) for i in range(3)]
+    ids = [book.pk for book in books]
+    with CaptureQueriesContext(connection) as captured:
+        status, data = delete(BookApi(), bench_db, [ids[0], str(ids[1]), ids[0], 10 ** 9])
+    assert status == 200
+    # 重复的 id 只报告一次，保留请求中的写法
+    assert data["data"] == {"deleted": [ids[0], str(ids[1])], "not_found": [10 ** 9]}
+    # 一条 pk__in 的 DELETE（另一条是评论的级联删除）
+    deletes = [query["sql"] for query in captured.captured_queries if query["sql"].startswith("DELETE")]
+    assert len([sql for sql in deletes if 'FROM "benchapp_book"' in sql]) == 1
+    assert list(Book.objects.filter(title__startswith="delete").values_list("pk", flat=True)) == [ids[2]]
+    Book.objects.filter(pk=ids[2]).delete()
+
+
+def test_delete_rejects_bad_ids(bench_db):
+    book = Book.objects.create(title="delete-bad")
+    try:
+        for ids in (["abc"], "1,2", {"id": 1}):
+            status, data = delete(BookApi(), bench_db, ids)
+            assert status == 400, ids
+        assert Book.objects.filter(pk=book.pk).exists()
+    finally:
+        book.delete()
+
+
+def test_delete_outside_owner_scope_is_not_found(bench_db):
+    alice = User.objects.create(username="delete-alice")
+    bob = User.objects.create(username="delete-bob")
+    mine = Book.objects.create(title="delete-alice", user=alice)
+    theirs = Book.objects.create(title="delete-bob", user=bob)
+    try:
+        status, data = delete(BookApi(), alice, [mine.pk, theirs.pk])
+        assert status == 200
+        assert data["data"] == {"deleted": [mine.pk], "not_found": [theirs.pk]}
+        assert Book.objects.filter(pk=theirs.pk).exists()
+    finally:
+        Book.objects.filter(title__startswith="delete").delete()
+        alice.delete()
+        bob.delete()
+
+
+def test_delete_per_object_calls_delete_and_signals(bench_db):
+    books = [AuditedBook.objects.create(title="delete-audit%d" % i) for i in range(3)]
+    signalled = []
+
+    def receiver(sender, instance, **kwargs):
+        signalled.append(instance.pk)
+
+    post_delete.connect(receiver, sender=AuditedBook)
+    AuditedBook.deleted.clear()
+    try:
+        ids = [book.pk for book in books[:2]]
+        status, data = delete(AuditedBookApi(), bench_db, ids)
+        assert status == 200 and data["data"]["deleted"] == ids
+        assert sorted(AuditedBook.deleted) == sorted(ids)
+        assert sorted(signalled) == sorted(ids)
+    finally:
+        post_delete.disconnect(receiver, sender=AuditedBook)
+        Book.objects.filter(title__startswith="delete-audit").delete()
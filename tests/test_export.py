@@ -0,0 +1,44 @@
+import io
+
+from django.test import RequestFactory
+
+from revolver_api.api import Api
+from tests.benchapp.models import Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+class SmallSpoolApi(BookApi):
+    export_spool_size = 16
+    export_chunk_size = 7
+
+    @staticmethod
+    def get_db_fields(model):
+        return ["id", "title"]
+
+
+def get(user, **params):
+    request = factory.get("/", params)
+    request.user = user
+    return request
+
+
+def test_export_settings_follow_subclass(bench_db):
+    request = get(bench_db)
+    response = BookApi.export_xls_override(Book.objects.all(), request)
+    assert not response.file_to_stream._rolled
+    response.close()
+    response = SmallSpoolApi.export_xls_override(Book.objects.all(), request)
+    # 超过子类的 export_spool_size 后转存到临时文件
+    assert response.file_to_stream._rolled
+    response.close()
+
+    sorted_fields, rows = SmallSpoolApi().csv_rows(Book.objects.order_by("pk"), request)
+    assert sorted_fields == ["id", "title"]
+    output = io.BytesIO()
+    assert SmallSpoolApi().write_export(Book.objects.all(), None, "csv", output) == Book.objects.count()
+    assert output.getvalue().decode().splitlines()[0] == "id,title"
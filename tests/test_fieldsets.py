@@ -0,0 +1,84 @@
+import json
+import pickle
+
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from revolver_api.api import Api
+from revolver_api.model import FieldSet
+from tests.benchapp.models import Book, LabelledBook, LegacyBook
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+class LegacyBookApi(Api):
+    model = LegacyBook
+
+
+class LabelledBookApi(Api):
+    model = LabelledBook
+
+
+def rows(api, user, **params):
+    request = factory.get("/", {"size": "3", **params})
+    request.user = user
+    response = api.list(request)
+    assert response.status_code == 200, response.content
+    return json.loads(response.content)["data"]["list"]
+
+
+def selected_columns(api, user, **params):
+    """ 列表查询 benchapp_book 的 SELECT 中出现的列
+    """
+    with CaptureQueriesContext(connection) as captured:
+        rows(api, user, **params)
+    columns = set()
+    for query in captured.captured_queries:
+        sql = query["sql"]
+        if not sql.startswith("SELECT") or "COUNT(" in sql or ' FROM "benchapp_book"' not in sql:
+            continue
+        select = sql[len("SELECT"):sql.index(' FROM "benchapp_book"')]
+        columns.update(part.strip().split(".")[-1].strip('"') for part in select.split(","))
+    return columns
+
+
+def test_fields_narrow_the_select(bench_db):
+    # 只查询请求的列，加上主键、条件请求的更新时间和排序字段
+    assert selected_columns(BookApi(), bench_db, fields="id,title") == {"id", "title", "updated_at", "created_at"}
+    assert selected_columns(BookApi(), bench_db, fields="title,author_id", order_by="pages_desc") == {
+        "id", "title", "author_id", "updated_at", "pages",
+    }
+    assert "price" in selected_columns(BookApi(), bench_db)
+    # to_json 不接受 fields 的模型不做投影
+    assert "price" in selected_columns(LegacyBookApi(), bench_db, fields="id,title")
+
+
+def test_to_json_override_without_fields(bench_db):
+    data = rows(LegacyBookApi(), bench_db, fields="id,title")
+    assert all(set(row) == {"id", "title"} for row in data)
+    data = rows(LegacyBookApi(), bench_db, exclude="title")
+    assert all("title" not in row and row["legacy"] is True for row in data)
+
+    request = factory.get("/", {"id": str(LegacyBook.objects.first().pk), "fields": "id,pages"})
+    request.user = bench_db
+    assert set(json.loads(LegacyBookApi().detail(request).content)["data"]) == {"id", "pages"}
+
+
+def test_extra_json_keys_pass_fieldsets(bench_db):
+    data = rows(LabelledBookApi(), bench_db, fields="id,label")
+    assert all(set(row) == {"id", "label"} for row in data)
+    data = rows(LabelledBookApi(), bench_db, exclude="pages")
+    assert all("label" in row and "pages" not in row for row in data)
+    data = rows(LabelledBookApi(), bench_db, exclude="label")
+    assert all("label" not in row and "pages" in row for row in data)
+
+
+def test_fieldset_pickles():
+    fieldset = pickle.loads(pickle.dumps(FieldSet({"id"}, excluded={"title"})))
+    assert fieldset.allows("id") and fieldset.allows("label") and not fieldset.allows("title")
+    assert not FieldSet({"id"}).allows("label")
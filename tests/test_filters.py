@@ -0,0 +1,75 @@
+import pytest
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+
+from revolver_api.api import Api
+from revolver_api.filters import build_filter_index
+from tests.benchapp.models import Author, Book
+
+factory = RequestFactory()
+
+
+class AuthorApi(Api):
+    model = Author
+    filter_fields = ["name", "book", "book__title"]
+
+
+class BookApi(Api):
+    model = Book
+    filter_fields = ["title", "review__body"]
+
+
+def query(api, user, **params):
+    request = factory.get("/", params)
+    request.user = user
+    return api.defaultQuery(request)
+
+
+def test_relation_filters(bench_db):
+    # 反向外键：每个作者有 10 本书，结果不重复
+    authors = list(query(AuthorApi(), bench_db, book__title__startswith="book1"))
+    assert len(authors) == len(set(author.pk for author in authors))
+    assert {author.name for author in authors} == set(
+        Author.objects.filter(book__title__startswith="book1").values_list("name", flat=True)
+    )
+    assert list(query(AuthorApi(), bench_db, book__title="book21")) == [Book.objects.get(title="book21").author]
+    book = Book.objects.get(title="book5")
+    assert list(query(AuthorApi(), bench_db, book=str(book.pk))) == [book.author]
+    assert list(query(BookApi(), bench_db, review__body="missing")) == []
+    assert query(BookApi(), bench_db, review__body__contains="review0").count() == Book.objects.count()
+
+    # 多对多
+    index = build_filter_index(User, fields=["username", "groups", "groups__name"])
+    assert {"groups", "groups__in", "groups__name", "groups__name__icontains"} <= set(index)
+    assert index["groups__name"][2] and not index["username"][2]
+
+
+def test_related_fields_are_opt_in(bench_db):
+    index = build_filter_index(Book)
+    assert {"title__contains", "author", "author_id__in", "user", "review"} <= set(index)
+    assert not {"author__name", "user__username", "user__password", "review__body"} & set(index)
+    assert not [key for key in build_filter_index(User) if key.startswith("password")]
+
+    # 密码和关联模型 exclude_json_keys 中的字段即使显式列出也不允许查询
+    for path in ("user__password", "author__user__password", "user__password__startswith"):
+        with pytest.raises(ValueError):
+            build_filter_index(Book, fields=[path])
+
+    class PasswordApi(Api):
+        model = Book
+        filter_fields = ["title", "user", "user__username"]
+
+    index = PasswordApi.filter_index()
+    assert "user__username__startswith" in index
+    assert not [key for key in index if "password" in key]
+    user = User.objects.create_user("bob", password="secret")
+    book = Book.objects.create(title="owned", user=user)
+    try:
+        # 未知参数被忽略，不能按密码前缀筛选
+        prefix = user.password[:10]
+        assert query(PasswordApi(), bench_db, user__password__startswith=prefix).count() == Book.objects.count()
+        assert query(BookApi(), bench_db, user__password__startswith=prefix).count() == Book.objects.count()
+        assert list(query(PasswordApi(), bench_db, user__username="bob")) == [book]
+    finally:
+        book.delete()
+        user.delete()
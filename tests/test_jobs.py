@@ -0,0 +1,147 @@
+import io
+import json
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from revolver_api.api import Api
+from revolver_api.jobs import ExportJobManager
+from revolver_api.route import Router
+from tests.benchapp.models import Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+    export_jobs = ExportJobManager(max_workers=1, ttl=60)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    jobs = ExportJobManager(max_workers=1, ttl=60, directory=tmp_path)
+    monkeypatch.setattr(BookApi, "export_jobs", jobs)
+    yield jobs
+    jobs.shutdown()
+
+
+def call(router, user, method, path, **params):
+    request = getattr(factory, method)("/?" + "&".join("%s=%s" % item for item in params.items()))
+    request.user = user
+    return router.handler(request, path)
+
+
+def wait(router, user, job_id):
+    for _ in range(200):
+        data = json.loads(call(router, user, "get", "books.export.status", id=job_id).content)["data"]
+        if data["status"] in ("done", "failed"):
+            return data
+        time.sleep(0.02)
+    raise AssertionError("导出任务没有完成")
+
+
+def test_background_export(bench_db, manager):
+    router = Router()
+    BookApi().register(router, "books")
+
+    started = json.loads(call(router, bench_db, "get", "books.export.start", format="csv", title__contains="book1").content)["data"]
+    again = json.loads(call(router, bench_db, "get", "books.export.start", title__contains="book1", format="csv").content)["data"]
+    assert again["id"] == started["id"]
+
+    data = wait(router, bench_db, started["id"])
+    assert data["status"] == "done"
+    assert data["rows"] == data["total"] == Book.objects.filter(title__contains="book1").count()
+
+    response = call(router, bench_db, "get", "books.export.download", id=started["id"])
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert len(lines) == data["rows"] + 1
+    response.close()
+
+    xls = json.loads(call(router, bench_db, "get", "books.export.start", format="xls").content)["data"]
+    assert wait(router, bench_db, xls["id"])["rows"] == Book.objects.count()
+
+    other = User.objects.create(username="other")
+    response = call(router, other, "get", "books.export.download", id=started["id"])
+    assert response.status_code == 400
+
+
+def test_finished_jobs_are_not_reused(bench_db, manager):
+    router = Router()
+    BookApi().register(router, "books")
+    first = json.loads(call(router, bench_db, "get", "books.export.start", title__contains="book1").content)["data"]
+    rows = wait(router, bench_db, first["id"])["rows"]
+    assert rows == Book.objects.filter(title__contains="book1").count()
+    book = Book.objects.create(title="book1-new")
+    try:
+        second = json.loads(call(router, bench_db, "get", "books.export.start", title__contains="book1").content)["data"]
+        assert second["id"] != first["id"]
+        assert wait(router, bench_db, second["id"])["rows"] == rows + 1
+    finally:
+        book.delete()
+
+
+def test_jobs_are_visible_to_other_workers(bench_db, manager, monkeypatch):
+    router = Router()
+    BookApi().register(router, "books")
+    started = json.loads(call(router, bench_db, "get", "books.export.start", title__contains="book1").content)["data"]
+    data = wait(router, bench_db, started["id"])
+
+    # 另一个 worker 进程：同一个目录，内存中没有任务
+    other = ExportJobManager(max_workers=1, ttl=60, directory=manager.directory)
+    monkeypatch.setattr(BookApi, "export_jobs", other)
+    assert json.loads(call(router, bench_db, "get", "books.export.status", id=started["id"]).content)["data"] == data
+    response = call(router, bench_db, "get", "books.export.download", id=started["id"])
+    assert len(b"".join(response.streaming_content).decode().splitlines()) == data["rows"] + 1
+    response.close()
+    assert other.get(started["id"], "other") is None
+    assert other.get("../" + started["id"], bench_db.pk) is None
+
+
+def test_finished_jobs_expire(bench_db, manager, tmp_path):
+    manager.ttl = 0
+    router = Router()
+    BookApi().register(router, "books")
+    started = json.loads(call(router, bench_db, "get", "books.export.start", format="csv").content)["data"]
+    for _ in range(200):
+        job = manager._jobs.get(started["id"])
+        if job is None or job.finished:
+            break
+        time.sleep(0.02)
+    time.sleep(0.01)
+    manager.expire()
+    assert manager._jobs.get(started["id"]) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_empty_export_finishes_with_zero_rows(bench_db, manager):
+    router = Router()
+    BookApi().register(router, "books")
+    for format in ("csv", "xls"):
+        started = json.loads(call(router, bench_db, "get", "books.export.start", format=format, title="missing").content)["data"]
+        data = wait(router, bench_db, started["id"])
+        assert data["status"] == "done" and data["rows"] == 0, data
+    assert call(router, bench_db, "post", "books.export.start").status_code == 405
+
+
+def test_job_does_not_use_request_after_response(bench_db, manager, monkeypatch):
+    captured = {}
+
+    def start(key, scope, file_name, content_type, run):
+        captured["run"] = run
+        return manager.__class__.start(manager, key, scope, file_name, content_type, lambda job, output: 0)
+
+    monkeypatch.setattr(manager, "start", start)
+    request = factory.get("/", {"fields": "id,title", "title__contains": "book1"})
+    request.user = bench_db
+    BookApi().export_start(request)
+    # 响应返回后 request 被修改或回收，后台任务不受影响
+    request.GET = QueryDict("fields=pages")
+    del request.user
+    output = io.BytesIO()
+    job = manager.get(next(iter(manager._jobs)), "*")
+    rows = captured["run"](job, output)
+    assert rows == Book.objects.filter(title__contains="book1").count()
+    assert output.getvalue().decode().splitlines()[0] == "id,title"
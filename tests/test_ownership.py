@@ -0,0 +1,63 @@
+from django.contrib.auth.models import Group, User
+from django.test import RequestFactory
+
+from revolver_api.api import Api
+from revolver_api.ownership import resolve_ownership
+from tests.benchapp.models import Book, Loan, Review
+
+factory = RequestFactory()
+
+
+def test_user_field_is_preferred():
+    ownership = resolve_ownership(Loan, "borrower")
+    assert ownership.field_name == "borrower" and ownership.user_model is User and ownership.assignable
+    assert resolve_ownership(Loan, "lender").field_name == "lender"
+
+
+def test_fallback_to_first_concrete_foreign_key():
+    assert resolve_ownership(Loan, "owner").field_name == "lender"
+    assert resolve_ownership(Book, "owner").field_name == "user"
+    # 只有反向关联时可以查询但不能赋值
+    ownership = resolve_ownership(Group)
+    assert ownership.field_name == "user" and not ownership.assignable
+    assert not resolve_ownership(Review).enabled
+
+
+class LoanApi(Api):
+    model = Loan
+
+
+class BorrowerLoanApi(Api):
+    model = Loan
+    user_field = "borrower"
+
+
+def test_ownership_is_cached_per_api_and_reset(bench_db):
+    assert LoanApi.ownership is LoanApi().ownership
+    assert LoanApi.ownership.field_name == "lender"
+    assert BorrowerLoanApi.ownership.field_name == "borrower"
+
+    # 修改 user_field 后需要 reset 才会重新解析
+    LoanApi.user_field = "borrower"
+    try:
+        assert LoanApi.ownership.field_name == "lender"
+        Api.__dict__["ownership"].reset(LoanApi)
+        assert LoanApi.ownership.field_name == "borrower"
+        assert BorrowerLoanApi.ownership.field_name == "borrower"
+    finally:
+        LoanApi.user_field = "user"
+        Api.__dict__["ownership"].reset()
+    assert LoanApi.ownership.field_name == "lender"
+
+    # 查询按解析出的字段过滤
+    alice = User.objects.create(username="loan-alice")
+    lent = Loan.objects.create(lender=alice)
+    borrowed = Loan.objects.create(borrower=alice)
+    try:
+        request = factory.get("/")
+        request.user = alice
+        assert list(LoanApi().defaultQuery(request)) == [lent]
+        assert list(BorrowerLoanApi().defaultQuery(request)) == [borrowed]
+    finally:
+        Loan.objects.all().delete()
+        alice.delete()
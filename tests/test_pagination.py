@@ -0,0 +1,127 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory
+
+from revolver_api.api import Api
+from revolver_api.pagination import CachedCount, EstimatedCount, cursor_page
+from tests.benchapp.models import Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+class CachedBookApi(Api):
+    model = Book
+    count_strategy = CachedCount()
+
+
+class PublishedBookApi(CachedBookApi):
+    def defaultQuery(self, request):
+        return super().defaultQuery(request).filter(published=True)
+
+
+class EstimatedBookApi(Api):
+    model = Book
+    count_strategy = EstimatedCount()
+
+
+def get(user, **params):
+    request = factory.get("/", params)
+    request.user = user
+    return request
+
+
+def test_invalid_page_size_is_rejected(bench_db):
+    api = BookApi()
+    for params in (
+        {"size": "0"}, {"size": "-5"}, {"page": "0"}, {"size": "x"}, {"size": "0", "cursor": ""},
+        {"size": "1001"}, {"size": "1000000", "cursor": ""},
+    ):
+        response = api.list(get(bench_db, **params))
+        assert response.status_code == 400, params
+    data = json.loads(api.list(get(bench_db, size="1", cursor="")).content)["data"]
+    assert len(data["list"]) == 1 and data["pageable"]["next_cursor"]
+
+
+def test_cursor_page_clamps_size(bench_db):
+    for size in (0, -3):
+        rows, next_cursor = cursor_page(Book.objects.order_by("pk"), "", size)
+        assert len(rows) == 1 and next_cursor is not None
+    rows, _ = cursor_page(Book.objects.order_by("pk"), "", 10 ** 6, max_size=5)
+    assert len(rows) == 5
+
+
+def traverse(api, user, size, **params):
+    """ 沿 next_cursor 翻完所有页，返回依次得到的 id
+    """
+    ids, cursor = [], ""
+    while cursor is not None:
+        response = api.list(get(user, size=str(size), cursor=cursor, **params))
+        assert response.status_code == 200, response.content
+        data = json.loads(response.content)["data"]
+        ids.extend(row["id"] for row in data["list"])
+        cursor = data["pageable"]["next_cursor"]
+    return ids
+
+
+def test_cursor_traversal_visits_every_row_once(bench_db):
+    # created_at 全部相同时按主键决定顺序
+    books = [Book.objects.create(title="tied%d" % i) for i in range(25)]
+    Book.objects.filter(title__startswith="tied").update(created_at=books[0].created_at)
+    try:
+        for size in (1, 4, 25, 30):
+            ids = traverse(BookApi(), bench_db, size, title__startswith="tied")
+            assert sorted(ids) == sorted(book.pk for book in books) and len(set(ids)) == len(ids)
+        ids = traverse(BookApi(), bench_db, 7)
+        assert len(ids) == len(set(ids)) == Book.objects.count()
+        ids = traverse(BookApi(), bench_db, 9, order_by="pages_asc")
+        assert len(ids) == len(set(ids)) == Book.objects.count()
+    finally:
+        Book.objects.filter(title__startswith="tied").delete()
+
+
+def test_cursor_rejects_nullable_ordering(bench_db):
+    response = BookApi().list(get(bench_db, cursor="", order_by="author_desc"))
+    assert response.status_code == 400
+    assert "author" in json.loads(response.content)["message"]
+
+
+def total(api, user, **params):
+    response = api.list(get(user, **params))
+    assert response.status_code == 200, response.content
+    return json.loads(response.content)["data"]["pageable"]["total"]
+
+
+def test_cached_count(bench_db):
+    cache.clear()
+    count = Book.objects.count()
+    other = User.objects.create(username="count-other")
+    assert total(CachedBookApi(), bench_db, size="5") == count
+    book = Book.objects.create(title="counted", user=other)
+    try:
+        # 分页参数不影响缓存，新增的记录在过期前不计入
+        assert total(CachedBookApi(), bench_db, size="7", page="2") == count
+        # 查询条件、用户范围、Api 类不同时分别统计
+        assert total(CachedBookApi(), bench_db, title="counted") == 1
+        assert total(CachedBookApi(), other) == 1
+        assert total(PublishedBookApi(), bench_db) == Book.objects.filter(published=True).count() != count
+        cache.clear()
+        assert total(CachedBookApi(), bench_db) == count + 1
+    finally:
+        book.delete()
+        other.delete()
+        cache.clear()
+
+
+def test_estimated_count(bench_db, monkeypatch):
+    # sqlite 没有统计信息，交给 fallback 精确统计
+    assert total(EstimatedBookApi(), bench_db) == Book.objects.count()
+    monkeypatch.setattr(EstimatedCount, "estimate", lambda self, query: 12345)
+    assert total(EstimatedBookApi(), bench_db) == 12345
+    # 有过滤条件时不能使用整表的估算
+    assert total(EstimatedBookApi(), bench_db, title="book1") == 1
@@ -0,0 +1,158 @@
+import io
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from django.test import RequestFactory
+
+from revolver_api.api import Api
+from revolver_api.export import write_csv
+from revolver_api.model import FieldSet, json_row
+from revolver_api.parallel import (
+    chunk_tasks,
+    discard_executor,
+    format_chunk,
+    pk_order,
+    pk_ranges,
+    process_executor,
+)
+from tests.benchapp.models import Book
+
+factory = RequestFactory()
+
+# 测试数据库在内存中，子进程无法访问，用线程池验证分块和合并顺序
+executor = ThreadPoolExecutor(max_workers=2)
+
+
+class BookApi(Api):
+    model = Book
+
+
+class ParallelBookApi(BookApi):
+    export_workers = 2
+    export_pk_step = 30
+    export_parallel_min_rows = 0
+
+    @classmethod
+    def export_executor(cls):
+        return executor
+
+
+def csv_text(api, request):
+    query = api.defaultQuery(request)
+    output = io.BytesIO()
+    sorted_fields, rows = api.csv_rows(query, request)
+    write_csv(rows, sorted_fields, output)
+    return output.getvalue().decode()
+
+
+def get(user, **params):
+    request = factory.get("/", params)
+    request.user = user
+    return request
+
+
+def chunk_sizes(query, ranges):
+    sizes = []
+    for low, high in ranges:
+        chunk = query
+        if low is not None:
+            chunk = chunk.filter(pk__gte=low)
+        if high is not None:
+            chunk = chunk.filter(pk__lt=high)
+        sizes.append(chunk.count())
+    return sizes
+
+
+def test_pk_ranges(bench_db):
+    query = Book.objects.all()
+    for order in ("pk", "-pk"):
+        ranges = list(pk_ranges(query, 30, order))
+        assert chunk_sizes(query, ranges) == [30] * 6 + [20]
+        pks = [pk for low, high in ranges for pk in ([low] if order == "pk" else [high]) if pk is not None]
+        assert pks == sorted(pks, reverse=order == "-pk")
+
+    # 主键稀疏时按实际行分块，不会按主键跨度产生大量空分块
+    sparse = Book.objects.filter(title__in=["book0", "book199"])
+    assert chunk_sizes(sparse, pk_ranges(sparse, 1)) == [1, 1]
+    assert chunk_sizes(sparse, pk_ranges(sparse, 1, "-pk")) == [1, 1]
+    assert list(pk_ranges(Book.objects.none(), 30)) == [(None, None)]
+    with pytest.raises(ValueError):
+        pk_ranges(Book.objects.all(), 0)
+
+
+def test_process_pool_is_shared(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 4)
+    first = process_executor(2)
+    try:
+        assert process_executor(2) is first
+    finally:
+        discard_executor(first)
+    second = process_executor(2)
+    assert second is not first
+    discard_executor(second)
+
+
+def test_pk_order():
+    assert pk_order(Book.objects.order_by("pk")) == "pk"
+    assert pk_order(Book.objects.order_by("-id")) == "-pk"
+    assert pk_order(Book.objects.all()) is None
+    assert pk_order(Book.objects.order_by("-created_at")) is None
+    assert pk_order(Book.objects.order_by("pk", "title")) is None
+    assert pk_order(Book.objects.order_by("pk")[:10]) is None
+
+
+def test_parallel_csv_matches_serial(bench_db):
+    for params in (
+        {"title__contains": "book1", "order_by": "id_asc"},
+        {"fields": "id,title", "order_by": "id_desc"},
+    ):
+        request = get(bench_db, **params)
+        query = ParallelBookApi().defaultQuery(request)
+        assert ParallelBookApi.parallel_export_rows(query) is not None
+        assert csv_text(ParallelBookApi(), request) == csv_text(BookApi(), request)
+
+    # 默认按 -created_at 排序，不能按主键分块，保持逐行导出
+    request = get(bench_db)
+    assert ParallelBookApi.parallel_export_rows(ParallelBookApi().defaultQuery(request)) is None
+    assert csv_text(ParallelBookApi(), request) == csv_text(BookApi(), request)
+
+
+def test_parallel_xls_rows(bench_db):
+    request = get(bench_db)
+    query = Book.objects.order_by("pk")
+    headers, rows = ParallelBookApi.xls_rows(query, request)
+    serial_headers, serial_rows = BookApi.xls_rows(query, request)
+    assert headers == serial_headers
+    assert list(rows) == list(serial_rows)
+
+    output = io.BytesIO()
+    assert ParallelBookApi().write_export(query, None, "xls", output) == Book.objects.count()
+
+
+def test_small_or_sliced_exports_stay_serial(bench_db):
+    class Small(ParallelBookApi):
+        export_parallel_min_rows = 10
+
+    # 主键跨度大但只有几行
+    sparse = Book.objects.filter(title__in=["book0", "book199"]).order_by("pk")
+    assert Small.parallel_export_rows(sparse) is None
+    assert Small.parallel_export_rows(Book.objects.order_by("pk")) is not None
+    assert ParallelBookApi.parallel_export_rows(Book.objects.order_by("pk")[:50]) is None
+    assert BookApi.parallel_export_rows(Book.objects.order_by("pk")) is None
+
+
+def test_format_chunk_round_trips_pickle(bench_db):
+    # 与进程池相同：任务经过 pickle 后在 format_chunk 中重建查询
+    query = Book.objects.filter(title__contains="book1").prefetch_related("review_set").order_by("-pk")
+    fieldset = FieldSet({"id", "title", "review_set"})
+    tasks = list(chunk_tasks(query, pk_ranges(query, 40, "-pk"), fieldset, None, 16, "-pk"))
+    assert len(tasks) > 1
+    rows = [row for task in tasks for row in format_chunk(pickle.loads(pickle.dumps(task)))]
+    assert rows == [json_row(book, fieldset) for book in query]
+
+    xls_fields = ["title", "id"]
+    tasks = chunk_tasks(query, pk_ranges(query, 40, "-pk"), None, xls_fields, 16, "-pk")
+    rows = [row for task in tasks for row in format_chunk(pickle.loads(pickle.dumps(task)))]
+    assert rows == [[book.title, book.id] for book in query]
@@ -0,0 +1,177 @@
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from revolver_api.api import Api
+from revolver_api.async_api import AsyncApi
+from revolver_api.pagination import HasMoreCount
+from revolver_api.route import Router
+from revolver_api.testing import assert_max_queries, assert_route_max_queries
+from tests.benchapp.models import Author, Book, Review
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+class AuthorApi(Api):
+    model = Author
+
+
+class NPlusOneApi(Api):
+    model = Book
+
+    def optimize_query(self, query, fieldset=None):
+        return query
+
+
+def get(user, **params):
+    request = factory.get("/", params)
+    request.user = user
+    return request
+
+
+def make_router():
+    router = Router()
+    router.query_debug = True
+    router.server_timing = True
+    BookApi().register(router, "books")
+    AuthorApi().register(router, "authors")
+    NPlusOneApi().register(router, "slow_books")
+    return router
+
+
+def test_list_queries_do_not_grow_with_size(bench_db):
+    router = make_router()
+    for size in ("5", "50"):
+        response = assert_route_max_queries(router, get(bench_db, size=size), "books", 3)
+        assert response["X-DB-Queries"] == "3"
+        assert "X-DB-Repeated-Queries" not in response
+    assert_route_max_queries(router, get(bench_db, size="20"), "authors", 3)
+    assert_route_max_queries(router, get(bench_db, id="1"), "books.detail", 2)
+    assert_route_max_queries(router, get(bench_db), "books.export", 5)
+
+
+class ForeignBookApi(Api):
+    model = Book
+    serialize_with_foreign = True
+
+
+def query_count(func) -> int:
+    with CaptureQueriesContext(connection) as captured:
+        func()
+    return len(captured.captured_queries)
+
+
+def test_relation_lookups_keep_query_count_constant(bench_db):
+    # 关联数据由 select_related / prefetch_related 一次取出，查询次数和行数无关
+    for api in (BookApi(), ForeignBookApi()):
+        counts = {
+            size: query_count(lambda: api.list(get(bench_db, size=size)))
+            for size in ("1", "10", "100")
+        }
+        assert len(set(counts.values())) == 1, counts
+
+    def nested(size):
+        select, prefetch = Book.relation_lookups(with_foreign=True, with_related=True)
+        books = Book.objects.select_related(*select).prefetch_related(*prefetch)[:size]
+        return lambda: [book.sample_to_json(with_foreign=True, with_related=True) for book in books]
+
+    assert query_count(nested(5)) == query_count(nested(50))
+    assert query_count(nested(50)) < 10
+
+
+def test_reverse_relations_without_attribute_are_skipped(bench_db):
+    # 反向外键的属性名是 book_set / review_set，和原实现一致不输出 book: None
+    author = Author.objects.first()
+    data = author.sample_to_json(with_foreign=True, with_related=False)
+    assert "book" not in data and "user" in data
+    assert "review" not in Book.objects.first().sample_to_json(with_foreign=True, with_related=False)
+
+
+class HasMoreBookApi(Api):
+    model = Book
+    count_strategy = HasMoreCount()
+
+
+class AsyncHasMoreBookApi(AsyncApi):
+    model = Book
+    count_strategy = HasMoreCount()
+
+
+def count_statements(func, token="COUNT(") -> list:
+    with CaptureQueriesContext(connection) as captured:
+        func()
+    return [query["sql"] for query in captured.captured_queries if token in query["sql"]]
+
+
+def test_list_counts_only_for_exact_pages(bench_db):
+    # 总数和最大更新时间只在页码分页 + ExactCount 时一起聚合，其他情况由当前页计算 ETag，不扫描全表
+    assert len(count_statements(lambda: BookApi().list(get(bench_db, size="5")))) == 1
+    for token in ("COUNT(", "MAX("):
+        assert count_statements(lambda: BookApi().list(get(bench_db, size="5", cursor="")), token) == []
+        assert count_statements(lambda: HasMoreBookApi().list(get(bench_db, size="5")), token) == []
+        assert count_statements(
+            lambda: async_to_sync(AsyncHasMoreBookApi().list)(get(bench_db, size="5")), token
+        ) == []
+
+
+class LimitedBookApi(Api):
+    model = Book
+    related_limit = 2
+
+
+def test_related_arrays_are_limited(bench_db):
+    empty = Book.objects.create(title="limited-empty")
+    try:
+        for size in ("5", "50"):
+            with CaptureQueriesContext(connection) as captured:
+                response = LimitedBookApi().list(get(bench_db, size=size, order_by="id_asc"))
+            # 聚合、当前页、限量的评论各一次
+            assert len(captured.captured_queries) == 3
+            rows = json.loads(response.content)["data"]["list"]
+            assert len(rows) == int(size)
+            for row in rows:
+                bodies = list(Review.objects.filter(book_id=row["id"]).order_by("-created_at", "-pk").values_list("body", flat=True))
+                assert row["review"] == bodies[:2]
+                assert row["review_count"] == len(bodies) == 3
+        response = LimitedBookApi().list(get(bench_db, title="limited-empty"))
+        row = json.loads(response.content)["data"]["list"][0]
+        assert row["review"] == [] and row["review_count"] == 0
+    finally:
+        empty.delete()
+
+
+def test_n_plus_one_is_reported(bench_db, caplog):
+    router = make_router()
+    with caplog.at_level(logging.WARNING, logger="revolver_api"):
+        response = router.handler(get(bench_db, size="10"), "slow_books")
+    assert int(response["X-DB-Queries"]) > 10
+    assert response["X-DB-Repeated-Queries"] == "1"
+    assert "db;dur=" in response["Server-Timing"]
+    assert any("N+1" in record.getMessage() for record in caplog.records)
+
+
+def test_assert_max_queries_fails_over_limit(bench_db):
+    try:
+        with assert_max_queries(1):
+            list(Book.objects.all()[:1])
+            list(Author.objects.all()[:1])
+    except AssertionError as e:
+        assert "超过上限 1" in str(e)
+    else:
+        raise AssertionError("assert_max_queries 没有失败")
+
+
+def test_server_timing_follows_debug(bench_db):
+    router = Router()
+    BookApi().register(router, "books")
+    assert "Server-Timing" not in router.handler(get(bench_db), "books")
+    with override_settings(DEBUG=True):
+        assert "handler;dur=" in router.handler(get(bench_db), "books")["Server-Timing"]
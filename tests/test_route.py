@@ -0,0 +1,72 @@
+import json
+
+from django.test import RequestFactory
+
+from revolver_api.api import Api
+from revolver_api.response import ApiJsonResponse
+from revolver_api.route import Router
+from tests.benchapp.models import Book
+
+factory = RequestFactory()
+
+
+class BookApi(Api):
+    model = Book
+
+
+def call(router, method, path, user=None):
+    request = getattr(factory, method)("/")
+    request.user = user
+    return router.handler(request, path)
+
+
+def test_head_uses_get_routes(bench_db):
+    router = Router()
+    router.get("items/<int:id>")(lambda request, id: ApiJsonResponse.success(id))
+    router.get("static")(lambda request: ApiJsonResponse.success("ok"))
+    BookApi().register(router, "books")
+
+    for path in ("items/3", "static", "books"):
+        get = call(router, "get", path, bench_db)
+        head = call(router, "head", path, bench_db)
+        assert head.status_code == get.status_code == 200, path
+        assert head.content == b""
+        assert head["Content-Length"] == str(len(get.content))
+    assert call(router, "post", "static").status_code == 405
+
+
+def test_method_mismatch_keeps_scanning_dynamic_routes():
+    router = Router()
+    router.post("items/<int:id>")(lambda request, id: ApiJsonResponse.success("post"))
+    router.get("items/<str:name>")(lambda request, name: ApiJsonResponse.success(name))
+
+    assert json.loads(call(router, "get", "items/7").content)["data"] == "7"
+    assert json.loads(call(router, "post", "items/7").content)["data"] == "post"
+    response = call(router, "delete", "items/7")
+    assert response.status_code == 405
+    assert response["Allow"] == "GET, HEAD, POST"
+    assert call(router, "get", "missing/7").status_code == 404
+
+
+def test_static_method_mismatch_falls_through_to_dynamic_routes():
+    router = Router()
+    router.get("posts/new")(lambda request: ApiJsonResponse.success("form"))
+    router.post("posts/<str:name>")(lambda request, name: ApiJsonResponse.success(name))
+
+    assert json.loads(call(router, "get", "posts/new").content)["data"] == "form"
+    assert json.loads(call(router, "post", "posts/new").content)["data"] == "new"
+    response = call(router, "delete", "posts/new")
+    assert response.status_code == 405
+    assert response["Allow"] == "GET, HEAD, POST"
+
+
+def test_handler_can_be_called_on_the_class():
+    router = Router()
+    router.get("legacy/<int:id>")(lambda request, id: ApiJsonResponse.success(id))
+    # 旧写法：路由在所有 Router 之间共享
+    assert json.loads(call(Router, "get", "legacy/5").content)["data"] == 5
+    assert Router.handler.__name__ == "handler"
+    assert call(Router, "get", "legacy/missing").status_code == 404
+    router.get("legacy/added")(lambda request: ApiJsonResponse.success("added"))
+    assert json.loads(call(Router, "get", "legacy/added").content)["data"] == "added"
+    assert json.loads(call(router, "get", "legacy/added").content)["data"] == "added"
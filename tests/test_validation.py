@@ -0,0 +1,83 @@
+import json
+
+from django.test import RequestFactory
+
+from revolver_api import validation
+from revolver_api.api import Rule, check_rules, validator
+from revolver_api.response import ApiJsonResponse
+from revolver_api.validation import compile_rules
+
+factory = RequestFactory()
+
+
+def test_required_and_optional_empty_values():
+    compiled = compile_rules([
+        Rule(name="name", message="name 不能为空"),
+        Rule(name="note", required=False),
+    ])
+    cleaned, errors = compiled({"name": "x", "note": ""})
+    assert errors == []
+    assert cleaned == {"name": "x", "note": ""}
+    _, errors = compiled({"name": ""})
+    assert errors == [{"name": "name", "message": "name 不能为空"}]
+    assert check_rules([Rule(name="note", required=False)], {"note": ""}) is None
+
+
+def test_all_constraints_and_coercion():
+    compiled = compile_rules([
+        Rule(name="page", required=False).number().set_min(1).set_max(100),
+        Rule(name="size", required=False, type="int", default=10),
+        Rule(name="kind", required=False).set_choices(["a", "b"]),
+        Rule(name="code", required=False).set_length(2, 4),
+        Rule(name="flag", required=False, type="bool"),
+        Rule(name="even", required=False, type="int").set_validator(lambda value: value % 2 == 0),
+    ])
+    cleaned, errors = compiled({"page": "3", "kind": "a", "code": "abc", "flag": "true", "even": "4", "extra": "x"})
+    assert errors == []
+    assert cleaned == {"page": 3, "size": 10, "kind": "a", "code": "abc", "flag": True, "even": 4, "extra": "x"}
+    _, errors = compiled({"page": "0", "kind": "z", "code": "a", "flag": "maybe", "even": "3"})
+    assert [error["name"] for error in errors] == ["page", "kind", "code", "flag", "even"]
+    _, errors = compiled({"page": "x"})
+    assert errors[0]["message"] == "page 必须是数字"
+
+
+def test_untyped_rule_keeps_value():
+    cleaned, errors = compile_rules([Rule(name="price")])({"price": 12.5})
+    assert errors == [] and cleaned["price"] == 12.5
+
+
+def test_validator_returns_all_errors_and_cleaned_data():
+    @validator([
+        Rule(name="page").number().set_min(1),
+        Rule(name="kind").set_choices(["a"]),
+    ])
+    def view(request):
+        return ApiJsonResponse.success(request.valid_data)
+
+    data = json.loads(view(factory.get("/", {"page": "2", "kind": "a"})).content)
+    assert data["data"] == {"page": 2, "kind": "a"}
+    data = json.loads(view(factory.get("/", {"page": "0", "kind": "b"})).content)
+    assert len(data["data"]["errors"]) == 2
+
+
+def test_rules_are_compiled_once(monkeypatch):
+    compiled, checked = [], []
+    compile_rule = validation.compile_rule
+    monkeypatch.setattr(validation, "compile_rule", lambda rule: compiled.append(rule.name) or compile_rule(rule))
+
+    def even(value):
+        checked.append(value)
+        return value % 2 == 0
+
+    @validator([
+        Rule(name="page", required=False).number().set_min(1),
+        Rule(name="even", required=False, type="int").set_validator(even),
+    ])
+    def view(request):
+        return ApiJsonResponse.success(request.valid_data)
+
+    for _ in range(5):
+        assert view(factory.get("/", {"page": "2", "even": "4"})).status_code == 200
+    # 装饰时编译一次，之后每个请求每条规则只检查一次
+    assert compiled == ["page", "even"]
+    assert checked == [4] * 5